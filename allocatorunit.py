@@ -2,12 +2,15 @@ from __future__ import annotations
 import pickle
 import copy
 import random
-from typing import Optional, Iterable
+import time
+from typing import Optional, Iterable, Iterator
 
 import networkx as nx
+import numpy as np
 
-from mcc import mcc
-from cpp_modules import crossing_flows, slot_allocation
+from shortest_paths import ShortestPathTable
+from cpp_modules import FlowSet
+import lower_bound
 
 #----------------------------------------------------------------------------------------
 def slot_encrypt(slot_id: int) -> int:
@@ -17,6 +20,47 @@ def slot_encrypt(slot_id: int) -> int:
 def slot_decrypt(encripted_slot_id: int) -> int:
     return -(encripted_slot_id + 1)
 
+#----------------------------------------------------------------------------------------
+if hasattr(int, 'bit_count'):
+    bit_count = int.bit_count
+else: # before Python 3.10
+    def bit_count(bits: int) -> int:
+        return bin(bits).count('1')
+
+#----------------------------------------------------------------------------------------
+def path2edge_bits(path: tuple[int], edge2id: dict[tuple[int, int], int]) -> int:
+    bits = 0
+    for edge in zip(path[:-1], path[1:]):
+        bits |= 1 << edge2id[edge]
+    return bits
+
+#----------------------------------------------------------------------------------------
+def bit_indices(bits: int) -> list[int]:
+    indices = list()
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+#----------------------------------------------------------------------------------------
+# kinds of zobrist keys
+ZOBRIST_NODE = 0 # (ZOBRIST_NODE, vNode_id, rNode_id)
+ZOBRIST_PATH = 1 # (ZOBRIST_PATH, pair_id, path)
+ZOBRIST_SLOT = 2 # (ZOBRIST_SLOT, flow_id, slot_id)
+_MASK64 = (1 << 64) - 1
+
+def zobrist_key(item: tuple[int, int, int | tuple[int]]) -> int:
+    '''
+    64-bit pseudo-random key of item (made by the splitmix64 finalizer). 
+    Since the hash of a tuple of ints does not depend on PYTHONHASHSEED, the key is 
+    the same in every process (e.g. the workers of the GAs).
+    '''
+    x = hash(item) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return x ^ (x >> 31)
+
 #----------------------------------------------------------------------------------------
 class Pair:
     def __init__(self, pair_id: int, src: int, dst: int, flow_id: int):
@@ -51,7 +95,9 @@ class Flow:
         self.flow_id = flow_id
         self.pair_list = pair_list
         self.slot_id: Optional[int] = None
-        self.flow_graph: Optional[nx.DiGraph] = None
+        self._flow_graph: Optional[nx.DiGraph] = None # see flow_graph
+        self._flow_graph_paths: Optional[tuple[Optional[tuple[int]]]] = None
+        self.edge_bits: int = 0 # OR of the edge bits of the paths of pair_list
         self.allocating: bool = True
     
     ##-----------------------------------------------------------------------------------
@@ -64,14 +110,25 @@ class Flow:
     def is_encrypted_cvid(cls, cvid: int) -> bool:
         return cvid < 0
     
+    ##-----------------------------------------------------------------------------------
+    @property
+    def flow_graph(self) -> nx.DiGraph:
+        # made from the paths when it is used first after they have changed 
+        # (the slot allocations use edge_bits instead)
+        if self._flow_graph_paths != tuple(pair.path for pair in self.pair_list):
+            self.make_flow_graph(None_acceptance=True)
+        return self._flow_graph
+
     ##-----------------------------------------------------------------------------------
     def make_flow_graph(self, None_acceptance: bool = False):
-        self.flow_graph = nx.DiGraph()
+        flow_graph = nx.DiGraph()
         for pair in self.pair_list:
             path = pair.path
             if None_acceptance and path is None:
                 continue
-            nx.add_path(self.flow_graph, path)
+            nx.add_path(flow_graph, path)
+        self._flow_graph = flow_graph
+        self._flow_graph_paths = tuple(pair.path for pair in self.pair_list)
     
     ##-----------------------------------------------------------------------------------
     def _hasher(self) -> int:
@@ -147,6 +204,12 @@ class App:
         return hash((self.app_id, 
                      tuple(vNode._hasher() for vNode in self.vNode_list)))
     
+    ##-----------------------------------------------------------------------------------
+    def is_applied(self) -> bool:
+        return not (any(vNode.allocating for vNode in self.vNode_list) 
+                    or any(flow.allocating for flow in self.flow_list) 
+                    or any(pair.allocating for pair in self.pair_list))
+    
     ##-----------------------------------------------------------------------------------
     def __eq__(self, other: App) -> bool:
         return (self.app_id == other.app_id) \
@@ -154,9 +217,325 @@ class App:
                and (self.flow_list == other.flow_list) \
                and (self.pair_list == other.pair_list)
 
+#----------------------------------------------------------------------------------------
+class IndexedSet:
+    '''
+    Set of ints with O(1) add, discard and random choice
+    '''
+    def __init__(self, items: Iterable[int] = ()):
+        self.items: list[int] = list()
+        self.index: dict[int, int] = dict() # item |-> position in self.items
+        for item in items:
+            self.add(item)
+    
+    ##-----------------------------------------------------------------------------------
+    def add(self, item: int):
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+    
+    ##-----------------------------------------------------------------------------------
+    def discard(self, item: int):
+        i = self.index.pop(item, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.index[last] = i
+    
+    ##-----------------------------------------------------------------------------------
+    def choice(self) -> int:
+        return random.choice(self.items)
+    
+    ##-----------------------------------------------------------------------------------
+    def __contains__(self, item: int) -> bool:
+        return item in self.index
+    
+    ##-----------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.items)
+    
+    ##-----------------------------------------------------------------------------------
+    def __iter__(self):
+        return iter(self.items)
+    
+    ##-----------------------------------------------------------------------------------
+    def __deepcopy__(self, memo) -> IndexedSet:
+        indexed_set = IndexedSet()
+        indexed_set.items = self.items.copy()
+        indexed_set.index = self.index.copy()
+        return indexed_set
+
+#----------------------------------------------------------------------------------------
+class SlotCounter:
+    '''
+    Index of the switches used by each flow for AllocatorUnit.get_avg_slot_num().
+    A flow is re-indexed only when its slot_id or its paths change, and the average 
+    is recomputed only when some flow has been re-indexed.
+    '''
+    def __init__(self):
+        self.flow2key: dict[int, tuple[Optional[int], tuple[Optional[tuple[int]]]]] = dict()
+        self.flow2switches: dict[int, frozenset[int]] = dict()
+        self.avg_slot_num: Optional[float] = None
+    
+    ##-----------------------------------------------------------------------------------
+    def update(self, 
+               flow_dict: dict[int, Flow], 
+               switch_nodes: set[int], 
+               flow_ids: Optional[Iterable[int]] = None):
+        # only flow_ids are checked if given (the other flows must not have changed)
+        items = flow_dict.items() if flow_ids is None \
+                else ((flow_id, flow_dict[flow_id]) for flow_id in flow_ids)
+        for flow_id, flow in items:
+            paths = tuple(pair.path for pair in flow.pair_list)
+            key = (flow.slot_id, paths)
+            old_key = self.flow2key.get(flow_id)
+            if old_key == key:
+                continue
+            if (old_key is None) or (old_key[1] != paths):
+                self.flow2switches[flow_id] \
+                    = frozenset(n for path in paths if path is not None 
+                                for n in path if n in switch_nodes)
+            self.flow2key[flow_id] = key
+            self.avg_slot_num = None
+        
+        # forget removed flows
+        if len(self.flow2key) != len(flow_dict):
+            for flow_id in self.flow2key.keys() - flow_dict.keys():
+                del self.flow2key[flow_id]
+                del self.flow2switches[flow_id]
+            self.avg_slot_num = None
+
+    ##-----------------------------------------------------------------------------------
+    def get_avg_slot_num(self, 
+                         flow_dict: dict[int, Flow], 
+                         switch_nodes: set[int], 
+                         flow_ids: Optional[Iterable[int]] = None) -> float:
+        self.update(flow_dict, switch_nodes, flow_ids)
+        if self.avg_slot_num is not None:
+            return self.avg_slot_num
+
+        # the flows are visited in descending order of slot_id (stable for flow_dict)
+        # and every switch of a flow gets the largest number of slots among them
+        switch2slots = dict.fromkeys(switch_nodes, 0)
+        for flow_id in sorted(flow_dict, key=lambda flow_id: -flow_dict[flow_id].slot_id):
+            switches = self.flow2switches[flow_id]
+            slots = max([flow_dict[flow_id].slot_id + 1] 
+                        + [switch2slots[sw] for sw in switches])
+            for sw in switches:
+                switch2slots[sw] = slots
+        
+        self.avg_slot_num = sum(switch2slots.values()) / len(switch2slots)
+        return self.avg_slot_num
+
+    ##-----------------------------------------------------------------------------------
+    def __deepcopy__(self, memo) -> SlotCounter:
+        counter = SlotCounter()
+        counter.flow2key = self.flow2key.copy()
+        counter.flow2switches = self.flow2switches.copy()
+        counter.avg_slot_num = self.avg_slot_num
+        return counter
+
+#----------------------------------------------------------------------------------------
+class CliqueIndex:
+    '''
+    Index of the maximal cliques of the slot graph (the conflict graph of cvids) for 
+    AllocatorUnit.find_maximal_cliques_of_slot_graph() and clique_census(). 
+    Only the cliques around the flows whose edges have changed are updated, and the 
+    index is rebuilt when flows are added or removed or their cvids change.
+    '''
+    def __init__(self):
+        self.flow2key: dict[int, tuple[int, int]] = dict() # flow_id |-> (cvid, edge_bits)
+        self.adj: dict[int, set[int]] = dict() # cvid |-> adjacent cvids
+        self.cliques: set[frozenset[int]] = set()
+        self.node2cliques: dict[int, set[frozenset[int]]] = dict()
+        self.size2count: dict[int, int] = dict() # clique size |-> # of cliques
+    
+    ##-----------------------------------------------------------------------------------
+    def _add(self, clique: frozenset[int]):
+        self.cliques.add(clique)
+        for v in clique:
+            self.node2cliques[v].add(clique)
+        self.size2count[len(clique)] = self.size2count.get(len(clique), 0) + 1
+    
+    ##-----------------------------------------------------------------------------------
+    def _discard(self, clique: frozenset[int]):
+        if clique not in self.cliques:
+            return
+        self.cliques.remove(clique)
+        for v in clique:
+            self.node2cliques[v].discard(clique)
+        self.size2count[len(clique)] -= 1
+        if self.size2count[len(clique)] == 0:
+            del self.size2count[len(clique)]
+
+    ##-----------------------------------------------------------------------------------
+    def _bron_kerbosch(self, r: set[int], p: set[int], x: set[int]
+                       ) -> Iterator[frozenset[int]]:
+        # maximal cliques containing r whose other vertices are in p and not in x
+        if not p and not x:
+            yield frozenset(r)
+            return
+        pivot = max(p | x, key=lambda u: len(p & self.adj[u]))
+        for v in list(p - self.adj[pivot]):
+            yield from self._bron_kerbosch(r | {v}, p & self.adj[v], x & self.adj[v])
+            p.remove(v)
+            x.add(v)
+
+    ##-----------------------------------------------------------------------------------
+    def rebuild(self, au: AllocatorUnit):
+        graph = au.slot_graph()
+        self.flow2key = {flow_id: (flow.cvid, flow.edge_bits) 
+                         for flow_id, flow in au.flow_dict.items()}
+        self.adj = {v: set(graph[v]) for v in graph.nodes}
+        self.cliques = set()
+        self.node2cliques = {v: set() for v in graph.nodes}
+        self.size2count = dict()
+        for clique in nx.find_cliques(graph):
+            self._add(frozenset(clique))
+
+    ##-----------------------------------------------------------------------------------
+    def update(self, au: AllocatorUnit):
+        flow_dict = au.flow_dict
+        changed = [flow for flow_id, flow in flow_dict.items() 
+                   if self.flow2key.get(flow_id) != (flow.cvid, flow.edge_bits)]
+        if (not changed) and (len(self.flow2key) == len(flow_dict)):
+            return
+        
+        # rebuild if the cvids have changed (the allocating flows have their own cvids)
+        if (len(self.flow2key) != len(flow_dict)) \
+           or any((not flow.allocating) or (flow.flow_id not in self.flow2key)
+                  or (self.flow2key[flow.flow_id][0] != flow.cvid) for flow in changed):
+            self.rebuild(au)
+            return
+
+        # replace the edges of the changed cvids
+        changed_cvids = [flow.cvid for flow in changed]
+        for d in changed_cvids:
+            for v in self.adj[d]:
+                self.adj[v].discard(d)
+            self.adj[d] = set()
+        for flow in changed:
+            for flow_id in au.conflict_graph.neighbors(flow.flow_id):
+                v = flow_dict[flow_id].cvid
+                if v != flow.cvid:
+                    self.adj[flow.cvid].add(v)
+                    self.adj[v].add(flow.cvid)
+            self.flow2key[flow.flow_id] = (flow.cvid, flow.edge_bits)
+        
+        # the cliques containing the changed cvids are found again
+        removed = set().union(*(self.node2cliques[d] for d in changed_cvids))
+        for clique in removed:
+            self._discard(clique)
+        for i, d in enumerate(changed_cvids):
+            done = set(changed_cvids[:i])
+            for clique in list(self._bron_kerbosch({d}, self.adj[d] - done, 
+                                                   self.adj[d] & done)):
+                self._add(clique)
+        
+        # the other cliques are not maximal if they are extended by a changed cvid
+        changed_cvid_set = set(changed_cvids)
+        for d in changed_cvids:
+            for v in self.adj[d] - changed_cvid_set:
+                for clique in list(self.node2cliques[v]):
+                    if (not clique & changed_cvid_set) and (clique <= self.adj[d]):
+                        self._discard(clique)
+        
+        # and the rest of a removed clique can be maximal by itself
+        for clique in removed:
+            rest = clique - changed_cvid_set
+            if rest and (rest not in self.cliques) \
+               and not set.intersection(*(self.adj[v] for v in rest)):
+                self._add(rest)
+
+    ##-----------------------------------------------------------------------------------
+    def census(self) -> tuple[int, int]:
+        # (size of the maximum cliques, # of them)
+        if not self.size2count:
+            return 0, 0
+        size = max(self.size2count)
+        return size, self.size2count[size]
+
+    ##-----------------------------------------------------------------------------------
+    def __deepcopy__(self, memo) -> CliqueIndex:
+        # the cliques (frozensets) are shared
+        index = CliqueIndex()
+        index.flow2key = self.flow2key.copy()
+        index.adj = {v: adj.copy() for v, adj in self.adj.items()}
+        index.cliques = self.cliques.copy()
+        index.node2cliques = {v: cliques.copy() for v, cliques in self.node2cliques.items()}
+        index.size2count = self.size2count.copy()
+        return index
+
+#----------------------------------------------------------------------------------------
+class Genome:
+    '''
+    Flat representation of the allocating state of an AllocatorUnit.
+    rNode_ids[i] is the rNode_id of vNode_ids[i], path_indices[i] is the index of the 
+    path of pair_ids[i] in st_path_table[src][dst], and slot_ids[i] is the slot_id of 
+    flow_ids[i]. -1 means None.
+    '''
+    def __init__(self, 
+                 vNode_ids: np.ndarray, 
+                 rNode_ids: np.ndarray, 
+                 pair_ids: np.ndarray, 
+                 path_indices: np.ndarray, 
+                 flow_ids: np.ndarray, 
+                 slot_ids: np.ndarray):
+        self.vNode_ids = vNode_ids
+        self.rNode_ids = rNode_ids
+        self.pair_ids = pair_ids
+        self.path_indices = path_indices
+        self.flow_ids = flow_ids
+        self.slot_ids = slot_ids
+    
+    ##-----------------------------------------------------------------------------------
+    def copy(self) -> Genome:
+        # the id arrays are never modified, so that they are shared
+        return Genome(self.vNode_ids, self.rNode_ids.copy(), 
+                      self.pair_ids, self.path_indices.copy(), 
+                      self.flow_ids, self.slot_ids.copy())
+
+    ##-----------------------------------------------------------------------------------
+    def __hash__(self) -> int:
+        return hash((self.rNode_ids.tobytes(), 
+                     self.path_indices.tobytes(), 
+                     self.slot_ids.tobytes()))
+
+    ##-----------------------------------------------------------------------------------
+    def __eq__(self, other: Genome) -> bool:
+        return np.array_equal(self.vNode_ids, other.vNode_ids) \
+               and np.array_equal(self.rNode_ids, other.rNode_ids) \
+               and np.array_equal(self.pair_ids, other.pair_ids) \
+               and np.array_equal(self.path_indices, other.path_indices) \
+               and np.array_equal(self.flow_ids, other.flow_ids) \
+               and np.array_equal(self.slot_ids, other.slot_ids)
+
+#----------------------------------------------------------------------------------------
+def _int32_array(values: Iterable[Optional[int]], count: int) -> np.ndarray:
+    return np.fromiter((-1 if v is None else v for v in values), 
+                       dtype=np.int32, count=count)
+
+#----------------------------------------------------------------------------------------
+def _shallow_copy(obj: VNode | Flow | Pair) -> VNode | Flow | Pair:
+    new = object.__new__(obj.__class__)
+    new.__dict__.update(obj.__dict__)
+    return new
+
 #----------------------------------------------------------------------------------------
 class AllocatorUnit:
-    def __init__(self, seed: nx.DiGraph | AllocatorUnit | bytes | str = None):
+    # coloring strategies of greedy_slot_allocation() (see cpp_modules.slot_allocation)
+    SLOT_STRATEGIES = ('welsh_powell', 'dsatur', 'rlf', 'random')
+    # attributes that never change during a search (shared by clone())
+    _SHARED_ATTRS = ('topology', 'core_nodes', 'switch_nodes', 'st_path_table', 
+                     'edge2id', 'path2bits', 'allocating_vNode_ids')
+    # attributes that hold the apps (copied by clone())
+    _APP_ATTRS = ('vNode_dict', 'flow_dict', 'pair_dict', 'app_dict')
+
+    def __init__(self, 
+                 seed: nx.DiGraph | AllocatorUnit | bytes | str = None, 
+                 max_paths_per_pair: Optional[int] = None):
         if isinstance(seed, nx.DiGraph):
             ## topology
             self.topology = seed # the topology for this allocator
@@ -170,18 +549,36 @@ class AllocatorUnit:
                                          if module == "core"}
             self.switch_nodes: set[int] = set(seed.nodes) - self.core_nodes
             ## shortest path list
-            self.st_path_table: dict[int, dict[int, tuple[tuple[int]]]] = dict() # st_path_table[src][dst] = [path0, path1, ...]
-
-            # create st-path list
-            self.st_path_table \
-            = {src: 
-                  {dst: 
-                      tuple(
-                          tuple(p[0:-1]) if seed.edges[p[-2], p[-1]]["multi_ejection"]
-                          else tuple(p)
-                          for p in nx.all_shortest_paths(seed, src, dst))
-                   for dst in self.core_nodes if dst != src} 
-               for src in self.core_nodes}
+            # st_path_table[src][dst] = [path0, path1, ...] (enumerated lazily)
+            self.st_path_table = ShortestPathTable(seed, self.core_nodes, 
+                                                   max_paths_per_pair)
+            ## edge ids and edge bits of paths (bit i means the edge whose id is i)
+            self.edge2id: dict[tuple[int, int], int] \
+            = {edge: i for i, edge in enumerate(seed.edges)}
+            self.path2bits: dict[tuple[int], int] = dict() # cache of path_edge_bits()
+            ## index for get_avg_slot_num()
+            self.slot_counter = SlotCounter()
+            ## index for find_maximal_cliques_of_slot_graph() and clique_census()
+            self.clique_index = CliqueIndex()
+            ## crossings between flows (flows are registered with their edge ids)
+            self.conflict_graph = FlowSet()
+            ## coloring strategy of greedy_slot_allocation() (see SLOT_STRATEGIES)
+            self.slot_strategy: str = 'welsh_powell'
+            ## incremental slot allocation (see slot_allocation())
+            # greedy_slot_allocation() every recoloring_interval calls (<= 0: always in
+            # slot_allocation(), never in swap_delta() and path_delta())
+            self.recoloring_interval: int = 0
+            self.slot_allocation_count: int = 0
+            self.dirty_flow_ids: set[int] = set() # flows whose edges have changed
+            ## indexes of nodes (see index_nodes())
+            self.allocating_vNode_ids: tuple[int] = tuple()
+            self.temp_allocated_rNodes: dict[int, int] = dict()
+            self.empty_rNodes = IndexedSet(sorted(self.core_nodes))
+            ## undo log of the transaction (None: no transaction, see begin())
+            self.undo_log: Optional[list[tuple]] = None
+            ## zobrist hashes (XOR of the keys of all rNode_ids, paths and slot_ids)
+            self.zobrist_hash: int = 0 # rNode_ids, paths and slot_ids
+            self.node_zobrist_hash: int = 0 # rNode_ids only
         
         elif isinstance(seed, (AllocatorUnit, bytes, str)):
             if isinstance(seed, AllocatorUnit):
@@ -204,34 +601,79 @@ class AllocatorUnit:
             self.switch_nodes = base.switch_nodes
             ## shortest path list
             self.st_path_table = base.st_path_table
+            self.edge2id = base.edge2id
+            self.path2bits = base.path2bits
+            ## index for get_avg_slot_num()
+            self.slot_counter = base.slot_counter
+            self.clique_index = base.clique_index
+            ## crossings between flows
+            self.conflict_graph = base.conflict_graph
+            self.slot_strategy = base.slot_strategy
+            ## incremental slot allocation
+            self.recoloring_interval = base.recoloring_interval
+            self.slot_allocation_count = base.slot_allocation_count
+            self.dirty_flow_ids = base.dirty_flow_ids
+            ## indexes of nodes
+            self.allocating_vNode_ids = base.allocating_vNode_ids
+            self.temp_allocated_rNodes = base.temp_allocated_rNodes
+            self.empty_rNodes = base.empty_rNodes
+            ## undo log of the transaction
+            self.undo_log = base.undo_log
+            ## zobrist hashes
+            self.zobrist_hash = base.zobrist_hash
+            self.node_zobrist_hash = base.node_zobrist_hash
 
         else:
             raise ValueError("The argument type must be 'networkx.DiGraph', "
                              "'AllocatorUnit', 'bytes', or 'str'.")
 
+    ##-----------------------------------------------------------------------------------
+    def index_nodes(self):
+        '''
+        Rebuild the indexes of nodes. 
+        They are kept up to date by node_allocation() and node_deallocation() 
+        and must be rebuilt when the allocating status of vNodes changes.
+        '''
+        self.allocating_vNode_ids = tuple(vNode.vNode_id for vNode in self.vNode_dict.values()
+                                          if vNode.allocating)
+        self.temp_allocated_rNodes = {vNode.rNode_id: vNode.vNode_id 
+                                      for vNode in self.vNode_dict.values()
+                                      if vNode.allocating and vNode.rNode_id is not None}
+        used = {vNode.rNode_id 
+                for vNode in self.vNode_dict.values() if vNode.rNode_id is not None}
+        self.empty_rNodes = IndexedSet(sorted(self.core_nodes - used))
+
     ##-----------------------------------------------------------------------------------
     @property
     def allocating_vNode_list(self) -> list[VNode]:
-        return [vNode for vNode in self.vNode_dict.values() if vNode.allocating]
+        return [self.vNode_dict[vNode_id] for vNode_id in self.allocating_vNode_ids]
 
     ##-----------------------------------------------------------------------------------
     @property
     def allocating_pair_list(self) -> list[Pair]:
         return [pair for pair in self.pair_dict.values() if pair.allocating]
     
+    ##-----------------------------------------------------------------------------------
+    @property
+    def allocating_flow_list(self) -> list[Flow]:
+        return [flow for flow in self.flow_dict.values() if flow.allocating]
+    
     ##-----------------------------------------------------------------------------------
     @property
     def temp_allocated_rNode_dict(self) -> dict[int, int]:
-        return {vNode.rNode_id: vNode.vNode_id
-                for vNode in self.vNode_dict.values()
-                if vNode.allocating and vNode.rNode_id is not None}
+        # rNode_id |-> vNode_id (read only)
+        return self.temp_allocated_rNodes
 
     ##-----------------------------------------------------------------------------------
     @property
     def empty_rNode_set(self) -> set[int]:
-        used = {vNode.rNode_id 
-                for vNode in self.vNode_dict.values() if vNode.rNode_id is not None}
-        return self.core_nodes - used
+        return set(self.empty_rNodes)
+
+    ##-----------------------------------------------------------------------------------
+    @property
+    def empty_rNode_list(self) -> list[int]:
+        # in the order of the index (random.choice() of this is reproducible)
+        return list(self.empty_rNodes)
 
     ##-----------------------------------------------------------------------------------
     def add_app(self, app: App) -> bool:
@@ -249,11 +691,17 @@ class AllocatorUnit:
         # add flows
         for flow in app.flow_list:
             self.flow_dict[flow.flow_id] = flow
+            self.conflict_graph.update(flow.flow_id, flow.cvid, 
+                                       bit_indices(flow.edge_bits))
+            self.dirty_flow_ids.add(flow.flow_id)
         
         # add pairs
         for pair in app.pair_list:
             self.pair_dict[pair.pair_id] = pair
         
+        self.index_nodes()
+        self._toggle_zobrist(app)
+        
         return True
     
     ##-----------------------------------------------------------------------------------
@@ -272,9 +720,15 @@ class AllocatorUnit:
                           if pair_id not in remove_pair_id_set}
         
         # remove flows
+        for flow in app.flow_list:
+            self.conflict_graph.remove(flow.flow_id)
+            self.dirty_flow_ids.discard(flow.flow_id)
         remove_flow_id_set = {flow.flow_id for flow in app.flow_list}
         self.flow_dict = {flow_id: flow for flow_id, flow in self.flow_dict.items()
                           if flow_id not in remove_flow_id_set}
+        
+        self.index_nodes()
+        self._toggle_zobrist(app)
 
     ##-----------------------------------------------------------------------------------
     def consistenty_checker(self):
@@ -283,6 +737,12 @@ class AllocatorUnit:
                            if vNode.rNode_id is not None]
         assert sorted(assigned_rNodes) == sorted(set(assigned_rNodes))
 
+        # check for the indexes of nodes
+        assert set(self.empty_rNodes) == self.core_nodes - set(assigned_rNodes)
+        assert self.temp_allocated_rNodes \
+               == {vNode.rNode_id: vNode.vNode_id for vNode in self.vNode_dict.values()
+                   if vNode.allocating and vNode.rNode_id is not None}
+
         # check for path consistency
         for pair in self.pair_dict.values():
             src = pair.src_vNode.rNode_id
@@ -309,19 +769,56 @@ class AllocatorUnit:
             if pair.path is not None:
                 pair.allocating = False
         
-        # disable the allocating status of pairs
+        # disable the allocating status of flows
         for flow in self.flow_dict.values():
-            if flow.slot_id is not None:
+            if flow.allocating and (flow.slot_id is not None):
                 flow.allocating = False
                 flow.make_flow_graph()
+                self.conflict_graph.set_cvid(flow.flow_id, flow.cvid)
+        
+        self.index_nodes()
 
     ##-----------------------------------------------------------------------------------
-    def pair_allocation(self, pair_id: int, path: tuple[int]):
-        # update path
-        self.pair_dict[pair_id].path = path
+    def path_edge_bits(self, path: tuple[int]) -> int:
+        bits = self.path2bits.get(path)
+        if bits is None:
+            bits = path2edge_bits(path, self.edge2id)
+            self.path2bits[path] = bits
+        return bits
     
     ##-----------------------------------------------------------------------------------
-    def random_pair_allocation(self, pair_id: int):
+    def update_edge_bits(self, flow: Flow):
+        bits = 0
+        for pair in flow.pair_list:
+            if pair.path is not None:
+                bits |= self.path_edge_bits(pair.path)
+        if bits != flow.edge_bits:
+            self.conflict_graph.update(flow.flow_id, flow.cvid, bit_indices(bits))
+            flow.edge_bits = bits
+            self.dirty_flow_ids.add(flow.flow_id)
+
+    ##-----------------------------------------------------------------------------------
+    def update_flows(self, pairs: Iterable[Pair]):
+        # update_edge_bits() of each owner flow of the pairs (once for each flow)
+        flows = {pair.owner.flow_id: pair.owner for pair in pairs}
+        for flow in flows.values():
+            self.update_edge_bits(flow)
+
+    ##-----------------------------------------------------------------------------------
+    def pair_allocation(self, pair_id: int, path: tuple[int], update_flow: bool = True):
+        # update path (the edges of the owner flow are updated later if not update_flow)
+        pair = self.pair_dict[pair_id]
+        if self.undo_log is not None:
+            self.undo_log.append(('pair', pair_id, pair.path))
+        if pair.path is not None:
+            self.zobrist_hash ^= zobrist_key((ZOBRIST_PATH, pair_id, pair.path))
+        self.zobrist_hash ^= zobrist_key((ZOBRIST_PATH, pair_id, path))
+        pair.path = path
+        if update_flow:
+            self.update_edge_bits(pair.owner)
+    
+    ##-----------------------------------------------------------------------------------
+    def random_pair_allocation(self, pair_id: int, update_flow: bool = True):
         # pick up src and dst rNode_id
         pair = self.pair_dict[pair_id]
         src = pair.src_vNode.rNode_id
@@ -331,12 +828,19 @@ class AllocatorUnit:
         path = random.choice(self.st_path_table[src][dst])
 
         # update
-        self.pair_allocation(pair_id, path)
+        self.pair_allocation(pair_id, path, update_flow)
 
     ##-----------------------------------------------------------------------------------
-    def pair_deallocation(self, pair_id: int):
+    def pair_deallocation(self, pair_id: int, update_flow: bool = True):
         # modify the correspond pair and abstract the path
-        self.pair_dict[pair_id].path = None
+        pair = self.pair_dict[pair_id]
+        if self.undo_log is not None:
+            self.undo_log.append(('pair', pair_id, pair.path))
+        if pair.path is not None:
+            self.zobrist_hash ^= zobrist_key((ZOBRIST_PATH, pair_id, pair.path))
+        pair.path = None
+        if update_flow:
+            self.update_edge_bits(pair.owner)
 
     ##-----------------------------------------------------------------------------------
     def node_allocation(self, 
@@ -345,75 +849,235 @@ class AllocatorUnit:
                         with_pair_allocation: bool = True):
         # temporary node allocation
         vNode = self.vNode_dict[vNode_id]
-        vNode.rNode_id = rNode_id
+        if self.undo_log is not None:
+            self.undo_log.append(('node', vNode_id, vNode.rNode_id))
+        if vNode.rNode_id is not None:
+            self._release_rNode(vNode)
+        self._set_rNode_id(vNode, rNode_id)
+        self.empty_rNodes.discard(rNode_id)
+        if vNode.allocating:
+            self.temp_allocated_rNodes[rNode_id] = vNode_id
 
         if with_pair_allocation:
             # temporary send-path allocation
             for send_pair in vNode.send_pair_list:
                 if send_pair.dst_vNode.rNode_id is not None:
-                    self.random_pair_allocation(send_pair.pair_id)
+                    self.random_pair_allocation(send_pair.pair_id, False)
 
             # temporary recv-path allocation
             for recv_pair in vNode.recv_pair_list:
                 if recv_pair.src_vNode.rNode_id is not None:
-                    self.random_pair_allocation(recv_pair.pair_id)
+                    self.random_pair_allocation(recv_pair.pair_id, False)
+            
+            # the edges of each flow are updated once
+            self.update_flows(vNode.pair_list)
     
     ##-----------------------------------------------------------------------------------
     def random_node_allocation(self, vNode_id: int, with_pair_allocation: bool = True):
         # pick up an empty rNove
-        map_rNode_id = random.choice(list(self.empty_rNode_set))
+        map_rNode_id = self.empty_rNodes.choice()
         self.node_allocation(vNode_id, map_rNode_id, with_pair_allocation)
 
+    ##-----------------------------------------------------------------------------------
+    def _set_rNode_id(self, vNode: VNode, rNode_id: Optional[int]):
+        # update rNode_id with the zobrist hashes
+        key = 0
+        if vNode.rNode_id is not None:
+            key ^= zobrist_key((ZOBRIST_NODE, vNode.vNode_id, vNode.rNode_id))
+        if rNode_id is not None:
+            key ^= zobrist_key((ZOBRIST_NODE, vNode.vNode_id, rNode_id))
+        self.zobrist_hash ^= key
+        self.node_zobrist_hash ^= key
+        vNode.rNode_id = rNode_id
+
+    ##-----------------------------------------------------------------------------------
+    def _set_slot_id(self, flow: Flow, slot_id: Optional[int]):
+        # update slot_id with the zobrist hash
+        if flow.slot_id is not None:
+            self.zobrist_hash ^= zobrist_key((ZOBRIST_SLOT, flow.flow_id, flow.slot_id))
+        if slot_id is not None:
+            self.zobrist_hash ^= zobrist_key((ZOBRIST_SLOT, flow.flow_id, slot_id))
+        flow.slot_id = slot_id
+
+    ##-----------------------------------------------------------------------------------
+    def _toggle_zobrist(self, app: App):
+        # add (or remove) the keys of the rNode_ids, paths and slot_ids of the app
+        node_hash = 0
+        for vNode in app.vNode_list:
+            if vNode.rNode_id is not None:
+                node_hash ^= zobrist_key((ZOBRIST_NODE, vNode.vNode_id, vNode.rNode_id))
+        self.node_zobrist_hash ^= node_hash
+        self.zobrist_hash ^= node_hash
+        for pair in app.pair_list:
+            if pair.path is not None:
+                self.zobrist_hash ^= zobrist_key((ZOBRIST_PATH, pair.pair_id, pair.path))
+        for flow in app.flow_list:
+            if flow.slot_id is not None:
+                self.zobrist_hash ^= zobrist_key((ZOBRIST_SLOT, flow.flow_id, flow.slot_id))
+
+    ##-----------------------------------------------------------------------------------
+    def _release_rNode(self, vNode: VNode):
+        # the rNode becomes empty unless another allocating vNode has taken it
+        rNode_id = vNode.rNode_id
+        if self.temp_allocated_rNodes.get(rNode_id, vNode.vNode_id) == vNode.vNode_id:
+            self.temp_allocated_rNodes.pop(rNode_id, None)
+            self.empty_rNodes.add(rNode_id)
+
     ##-----------------------------------------------------------------------------------
     def node_deallocation(self, vNode_id: int, with_pair_deallocation: bool = True):
         # modify the correspond vNode and abstract the rNode_id
         vNode = self.vNode_dict[vNode_id]
-        vNode.rNode_id = None
+        if self.undo_log is not None:
+            self.undo_log.append(('node', vNode_id, vNode.rNode_id))
+        if vNode.rNode_id is not None:
+            self._release_rNode(vNode)
+        self._set_rNode_id(vNode, None)
 
         if with_pair_deallocation:
             # pair deallocation
             for pair in vNode.pair_list:
                 if pair.path is not None:
-                    self.pair_deallocation(pair.pair_id)
+                    self.pair_deallocation(pair.pair_id, False)
+            self.update_flows(vNode.pair_list)
     
+    ##-----------------------------------------------------------------------------------
+    def _log_slot(self, flow: Flow):
+        if self.undo_log is not None:
+            self.undo_log.append(('slot', flow.flow_id, flow.slot_id))
+
+    ##-----------------------------------------------------------------------------------
+    def begin(self):
+        '''
+        Begin a transaction. The changes of nodes, pairs and slots after this are 
+        recorded until commit() or rollback(), so that a move can be applied to this 
+        unit itself (instead of its copy) and reverted if it is rejected.
+        '''
+        if self.undo_log is not None:
+            raise ValueError("A transaction has already begun.")
+        self.undo_log = [('state', frozenset(self.dirty_flow_ids), 
+                          self.slot_allocation_count)]
+
+    ##-----------------------------------------------------------------------------------
+    def commit(self):
+        # keep the changes of the transaction
+        if self.undo_log is None:
+            raise ValueError("No transaction has begun.")
+        self.undo_log = None
+
+    ##-----------------------------------------------------------------------------------
+    def rollback(self):
+        # revert the changes of the transaction in reverse order
+        undo_log = self.undo_log
+        if undo_log is None:
+            raise ValueError("No transaction has begun.")
+        self.undo_log = None
+
+        # only the oldest records of each pair and flow are needed 
+        # (e.g. repair operators try all the candidate paths of a pair)
+        paths: dict[int, Optional[tuple[int]]] = dict()
+        slots: dict[int, Optional[int]] = dict()
+        for entry in reversed(undo_log):
+            if entry[0] == 'node':
+                _, vNode_id, rNode_id = entry
+                if rNode_id is None:
+                    self.node_deallocation(vNode_id, False)
+                else:
+                    self.node_allocation(vNode_id, rNode_id, False)
+            elif entry[0] == 'pair':
+                paths[entry[1]] = entry[2]
+            elif entry[0] == 'slot':
+                slots[entry[1]] = entry[2]
+
+        changed_pairs = list()
+        for pair_id, path in paths.items():
+            if self.pair_dict[pair_id].path != path:
+                if path is None:
+                    self.pair_deallocation(pair_id, False)
+                else:
+                    self.pair_allocation(pair_id, path, False)
+                changed_pairs.append(self.pair_dict[pair_id])
+        self.update_flows(changed_pairs)
+
+        for flow_id, slot_id in slots.items():
+            self._set_slot_id(self.flow_dict[flow_id], slot_id)
+
+        # the flows to be re-slotted and the count of the slot allocations are also 
+        # reverted (a rejected move does not change when the next recoloring is done)
+        _, dirty_flow_ids, self.slot_allocation_count = undo_log[0]
+        self.dirty_flow_ids = set(dirty_flow_ids)
+
     ##-----------------------------------------------------------------------------------
     def crossing_flows(self) -> set[tuple[int, int]]:
-        flows = [(f.cvid, f.flow_graph.edges) for f in self.flow_dict.values()]
-        return crossing_flows(flows)
+        # (cvid0, cvid1) such that the flow of cvid0 precedes that of cvid1 in flow_dict
+        return self.conflict_graph.crossing_flows()
     
     ##-----------------------------------------------------------------------------------
-    def find_maximal_cliques_of_slot_graph(self) -> list[list[int]]:
-        # construct graphs of flows in allocating
-        for flow in self.flow_dict.values():
-            if flow.allocating:
-                flow.make_flow_graph()
-        # find maximal cliques
-        edges = self.crossing_flows()
-        node_set = {flow.cvid for flow in self.flow_dict.values()}
-        graph = nx.Graph()
-        graph.add_nodes_from(node_set)
-        graph.add_edges_from(edges)
-        return list(nx.find_cliques(graph))
+    def crossings_for_a_flow(self, flow_id: int) -> int:
+        # the number of cvids whose flows share an edge with the flow
+        return self.conflict_graph.crossings_for_a_flow(flow_id)
 
     ##-----------------------------------------------------------------------------------
-    def optimal_slot_allocation(self):
-        # construct graphs of flows in allocating
-        for flow in self.flow_dict.values():
-            if flow.allocating:
-                flow.make_flow_graph()
-        
-        # get mcc
-        edges = self.crossing_flows()
-        node_set = {flow.cvid for flow in self.flow_dict.values()}
+    def flow_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        (cvids, flow_offsets, edge_ids) of the flows in flow_dict as int32 arrays for
+        cpp_modules.*_csr(). The edge ids of the i-th flow are
+        edge_ids[flow_offsets[i]:flow_offsets[i+1]].
+        '''
+        flows = list(self.flow_dict.values())
+        edge_lists = [bit_indices(flow.edge_bits) for flow in flows]
+        cvids = _int32_array((flow.cvid for flow in flows), len(flows))
+        flow_offsets = np.zeros(len(flows) + 1, dtype=np.int32)
+        np.cumsum([len(edges) for edges in edge_lists], out=flow_offsets[1:])
+        edge_ids = _int32_array((e for edges in edge_lists for e in edges),
+                                int(flow_offsets[-1]))
+        return cvids, flow_offsets, edge_ids
+
+    ##-----------------------------------------------------------------------------------
+    def score_paths(self, pair_id: int, paths: Iterable[tuple[int]]
+                    ) -> list[tuple[int, int]]:
+        '''
+        (crossings_for_a_flow(), # of edges of the flow) of the owner flow of the pair
+        for each path, as if the pair were allocated to the path (nothing is changed).
+        The native scoring releases the GIL and holds the lock of the FlowSet, so that
+        calls from several threads overlap. The other state of this unit has no lock
+        and must not be changed by another thread meanwhile.
+        '''
+        pair = self.pair_dict[pair_id]
+        flow = pair.owner
+        base = None # the registered edges of the flow
+        if pair.path is not None:
+            bits = 0
+            for other in flow.pair_list:
+                if (other is not pair) and (other.path is not None):
+                    bits |= self.path_edge_bits(other.path)
+            base = bit_indices(bits)
+        candidates = [[self.edge2id[edge] for edge in zip(path[:-1], path[1:])] 
+                      for path in paths]
+        return self.conflict_graph.score_candidates(flow.flow_id, candidates, base)
+
+    ##-----------------------------------------------------------------------------------
+    def slot_graph(self) -> nx.Graph:
+        # the conflict graph of cvids
         graph = nx.Graph()
-        graph.add_nodes_from(node_set)
-        graph.add_edges_from(edges)
-        result = mcc(graph)
+        graph.add_nodes_from({flow.cvid for flow in self.flow_dict.values()})
+        graph.add_edges_from(self.crossing_flows())
+        return graph
+    
+    ##-----------------------------------------------------------------------------------
+    def find_maximal_cliques_of_slot_graph(self) -> list[list[int]]:
+        # maximal cliques (the clique_index is updated around the changed flows)
+        self.clique_index.update(self)
+        return [list(clique) for clique in self.clique_index.cliques]
 
-        # convert mcc style (list[set[int]]) to coloring style (dict[int, int])
-        coloring = {cvid: i for i, id_set in enumerate(result) for cvid in id_set}
-        
-       # Leave previously assigned slot_id's as they are.
+    ##-----------------------------------------------------------------------------------
+    def clique_census(self) -> tuple[int, int]:
+        # (size of the maximum cliques, # of them) of the slot graph
+        self.clique_index.update(self)
+        return self.clique_index.census()
+
+    ##-----------------------------------------------------------------------------------
+    def _assign_coloring(self, coloring: dict[int, int]):
+        # Leave previously assigned slot_id's as they are.
         convert = {slot_id: slot_decrypt(cvid) 
                    for cvid, slot_id in coloring.items() if Flow.is_encrypted_cvid(cvid)}
         pre_convert = set(coloring.values()) - set(convert.keys())
@@ -421,7 +1085,7 @@ class AllocatorUnit:
 
         # sort result by the number of branches in the flow graph
         def edge_weight(s: int):
-            return sum([self.flow_dict[cvid].flow_graph.number_of_edges()
+            return sum([bit_count(self.flow_dict[cvid].edge_bits)
                         for cvid, slot_id in coloring.items() if slot_id == s])
         pre_convert = sorted(pre_convert, key=edge_weight, reverse=True)
 
@@ -431,41 +1095,239 @@ class AllocatorUnit:
         # assign converted slot_id
         for cvid, slot_id in coloring.items():
             if not Flow.is_encrypted_cvid(cvid):
-                self.flow_dict[cvid].slot_id = convert[slot_id]
+                self._set_slot_id(self.flow_dict[cvid], convert[slot_id])
+
+    ##-----------------------------------------------------------------------------------
+    def optimal_slot_allocation(self, 
+                                deadline: Optional[float] = None, 
+                                node_limit: int = 0) -> tuple[int, int, bool]:
+        '''
+        Minimum coloring of the conflict graph by branch and bound until deadline 
+        (in time.time(), None: no limit) or node_limit search nodes (<= 0: no limit).
+        The coloring by self.slot_strategy is taken if no better one is found.
+        Return (# of slots, the lower bound by a clique, whether it is optimal).
+        '''
+        # the flows in allocating are registered in the conflict graph by their edges
+        flows = self.allocating_flow_list
+        self._check_paths(flows, False)
+        for flow in flows:
+            self._log_slot(flow)
+        
+        # greedy coloring (fallback)
+        seed = random.getrandbits(32) if self.slot_strategy == 'random' else 0
+        coloring = self.conflict_graph.slot_allocation(self.slot_strategy, seed=seed)
+        slot_num = len(set(coloring.values()))
+
+        # exact coloring within the budget
+        time_limit = 0.0
+        if deadline is not None:
+            time_limit = deadline - time.time()
+            if time_limit <= 0:
+                node_limit = 1
+        exact, proven, lower_bound \
+        = self.conflict_graph.exact_slot_allocation(time_limit, node_limit)
+        exact_slot_num = len(set(exact.values()))
+        if exact_slot_num < slot_num:
+            coloring = exact
+            slot_num = exact_slot_num
+        proven = proven or (slot_num == lower_bound)
+
+        self._assign_coloring(coloring)
+        self.dirty_flow_ids.clear()
+        return slot_num, lower_bound, proven
     
     ##-----------------------------------------------------------------------------------
-    def greedy_slot_allocation(self, None_acceptance: bool = False):
-        # construct graphs of flows in allocating
-        for flow in self.flow_dict.values():
-            if flow.allocating:
-                flow.make_flow_graph(None_acceptance)
+    @staticmethod
+    def _check_paths(flows: Iterable[Flow], None_acceptance: bool):
+        # the flows to be slotted must have all their paths unless None_acceptance
+        if None_acceptance:
+            return
+        for flow in flows:
+            for pair in flow.pair_list:
+                if pair.path is None:
+                    raise ValueError("The pair {} of the flow {} has no path."
+                                     .format(pair.pair_id, flow.flow_id))
+
+    ##-----------------------------------------------------------------------------------
+    def set_slot_strategy(self, slot_strategy: Optional[str]):
+        # coloring strategy of greedy_slot_allocation() (None: unchanged)
+        if slot_strategy is None:
+            return
+        if slot_strategy not in self.SLOT_STRATEGIES:
+            raise ValueError("Invalid slot allocation strategy.")
+        self.slot_strategy = slot_strategy
+
+    ##-----------------------------------------------------------------------------------
+    def greedy_slot_allocation(self, 
+                               None_acceptance: bool = False, 
+                               strategy: Optional[str] = None):
+        # the flows in allocating are registered in the conflict graph by their edges
+        flows = self.allocating_flow_list
+        self._check_paths(flows, None_acceptance)
+        for flow in flows:
+            self._log_slot(flow)
         
-        # get coloring
-        flows = [(f.cvid, f.flow_graph.edges) for f in self.flow_dict.values()]
-        coloring: dict[int, int] = slot_allocation(flows)
+        # get coloring (by self.slot_strategy if strategy is None)
+        if strategy is None:
+            strategy = self.slot_strategy
+        seed = random.getrandbits(32) if strategy == 'random' else 0
+        coloring: dict[int, int] \
+        = self.conflict_graph.slot_allocation(strategy, seed=seed)
+        self._assign_coloring(coloring)
+        self.dirty_flow_ids.clear()
+    
+    ##-----------------------------------------------------------------------------------
+    def local_slot_allocation(self, 
+                              flow_ids: Iterable[int], 
+                              None_acceptance: bool = False):
+        '''
+        Re-slot only the allocating flows of flow_ids (the slot_ids of the other flows 
+        are kept) by DSATUR seeded by the slot_ids of their crossing flows: the flow 
+        with the most distinct slot_ids among its crossing flows takes the smallest 
+        free slot_id first (ties are broken by the number of crossing flows).
+        '''
+        flows = {flow_id: self.flow_dict[flow_id] for flow_id in flow_ids}
+        self.dirty_flow_ids.difference_update(flows)
+        flows = {flow_id: flow for flow_id, flow in flows.items() if flow.allocating}
+        self._check_paths(flows.values(), None_acceptance)
+        for flow in flows.values():
+            self._log_slot(flow)
+            self._set_slot_id(flow, None)
         
-        # Leave previously assigned slot_id's as they are.
-        convert = {slot_id: slot_decrypt(cvid) 
-                   for cvid, slot_id in coloring.items() if Flow.is_encrypted_cvid(cvid)}
-        pre_convert = set(coloring.values()) - set(convert.keys())
-        post_convert = set(coloring.values()) - set(convert.values())
+        neighbors = {flow_id: self.conflict_graph.neighbors(flow_id) for flow_id in flows}
+        used = {flow_id: {self.flow_dict[n].slot_id for n in neighbors[flow_id]} - {None}
+                for flow_id in flows}
+        while flows:
+            flow_id = max(flows, key=lambda f: (len(used[f]), len(neighbors[f])))
+            slot_id = 0
+            while slot_id in used[flow_id]:
+                slot_id += 1
+            self._set_slot_id(flows.pop(flow_id), slot_id)
+            for n in neighbors[flow_id]:
+                if n in flows:
+                    used[n].add(slot_id)
 
-        # sort result by the number of branches in the flow graph
-        def edge_weight(s: int):
-            return sum([self.flow_dict[cvid].flow_graph.number_of_edges()
-                        for cvid, slot_id in coloring.items() if slot_id == s])
-        pre_convert = sorted(pre_convert, key=edge_weight, reverse=True)
+    ##-----------------------------------------------------------------------------------
+    def slot_allocation(self, None_acceptance: bool = False):
+        '''
+        Slot allocation after a local move. If self.recoloring_interval > 0, only the 
+        flows whose edges have changed (and the new flows) are re-slotted by 
+        repair_slot_allocation(). Otherwise, this is greedy_slot_allocation().
+        '''
+        if self.recoloring_interval <= 0:
+            self.greedy_slot_allocation(None_acceptance)
+        else:
+            self.repair_slot_allocation(self.dirty_flow_ids, None_acceptance)
 
-        for old, new in zip(pre_convert, sorted(post_convert)):
-            convert[old] = new
+    ##-----------------------------------------------------------------------------------
+    def repair_slot_allocation(self, 
+                               flow_ids: Iterable[int], 
+                               None_acceptance: bool = False) -> bool:
+        '''
+        local_slot_allocation() of flow_ids, or greedy_slot_allocation() every 
+        self.recoloring_interval calls (if > 0) or if the local one needs more slots 
+        than before. Return True if greedy_slot_allocation() is done.
+        '''
+        self.slot_allocation_count += 1
+        if (self.recoloring_interval > 0) \
+           and (self.slot_allocation_count % self.recoloring_interval == 0):
+            self.greedy_slot_allocation(None_acceptance)
+            return True
+        
+        slot_num = max((flow.slot_id + 1 for flow in self.flow_dict.values() 
+                        if flow.slot_id is not None), default=0)
+        flows = [self.flow_dict[flow_id] for flow_id in flow_ids]
+        self.local_slot_allocation([flow.flow_id for flow in flows], None_acceptance)
+        if any(flow.slot_id >= slot_num for flow in flows if flow.allocating):
+            self.greedy_slot_allocation(None_acceptance)
+            return True
+        return False
 
-        # assign converted slot_id
-        for cvid, slot_id in coloring.items():
-            if not Flow.is_encrypted_cvid(cvid):
-                self.flow_dict[cvid].slot_id = convert[slot_id]
+    ##-----------------------------------------------------------------------------------
+    def swap_delta(self, 
+                   vNode_id: int, 
+                   rNode_id: int, 
+                   paths: Optional[dict[int, tuple[int]]] = None) -> tuple[float, int]:
+        '''
+        Move vNode_id to rNode_id (swapped with the vNode on rNode_id if any) with random
+        paths like oplib.node_swap() (or with paths: pair_id |-> path of the pairs of 
+        the moved vNodes). Only the flows of the moved vNodes (and the dirty flows) are 
+        re-slotted by repair_slot_allocation() and evaluated, unless it falls back to 
+        greedy_slot_allocation(). Return the deltas of (get_avg_slot_num(), get_total_communication_flow_edges()). 
+        Call this in a transaction to reject the move by rollback().
+        '''
+        before = self.get_avg_slot_num()
+
+        # the moved vNodes and their flows
+        vNode_ids = [vNode_id]
+        other = self.temp_allocated_rNodes.get(rNode_id, vNode_id)
+        if other != vNode_id:
+            vNode_ids.append(other)
+        flows = {pair.owner.flow_id: pair.owner for vid in vNode_ids 
+                 for pair in self.vNode_dict[vid].pair_list}
+        old_edges = sum(bit_count(flow.edge_bits) for flow in flows.values())
+
+        # move vNode_id to rNode_id (and the vNode on rNode_id to the old rNode_id)
+        with_pair_allocation = paths is None
+        rNode_id0 = self.vNode_dict[vNode_id].rNode_id
+        self.node_deallocation(vNode_id)
+        if other != vNode_id:
+            self.node_deallocation(other)
+            self.node_allocation(other, rNode_id0, with_pair_allocation)
+        self.node_allocation(vNode_id, rNode_id, with_pair_allocation)
+        if not with_pair_allocation:
+            for pair_id, path in paths.items():
+                self.pair_allocation(pair_id, path, False)
+            self.update_flows(self.pair_dict[pair_id] for pair_id in paths)
+
+        return self._local_delta(flows, before, old_edges)
+
+    ##-----------------------------------------------------------------------------------
+    def path_delta(self, pair_id: int, path: tuple[int]) -> tuple[float, int]:
+        '''
+        pair_allocation(pair_id, path) and re-slot the owner flow like swap_delta().
+        Return the deltas of (get_avg_slot_num(), get_total_communication_flow_edges()).
+        '''
+        before = self.get_avg_slot_num()
+        flow = self.pair_dict[pair_id].owner
+        old_edges = bit_count(flow.edge_bits)
+        self.pair_allocation(pair_id, path)
+        return self._local_delta({flow.flow_id: flow}, before, old_edges)
+
+    ##-----------------------------------------------------------------------------------
+    def _local_delta(self, 
+                     flows: dict[int, Flow], 
+                     before: float, 
+                     old_edges: int) -> tuple[float, int]:
+        # re-slot and evaluate only the changed flows (all the flows are evaluated if 
+        # they are re-slotted by greedy_slot_allocation())
+        flow_ids = self.dirty_flow_ids | flows.keys()
+        if self.repair_slot_allocation(flow_ids):
+            flow_ids = None
+        new_edges = sum(bit_count(flow.edge_bits) for flow in flows.values())
+        after = self.slot_counter.get_avg_slot_num(self.flow_dict, self.switch_nodes, 
+                                                   flow_ids)
+        return after - before, new_edges - old_edges
+
+    ##-----------------------------------------------------------------------------------
+    def get_avg_slot_num(self, check: bool = False) -> float:
+        avg_slot_num = self.slot_counter.get_avg_slot_num(self.flow_dict, self.switch_nodes)
+        if check:
+            full = self.recompute_avg_slot_num()
+            assert avg_slot_num == full, \
+                "slot_counter: {}, full recomputation: {}".format(avg_slot_num, full)
+        return avg_slot_num
+    
+    ##-----------------------------------------------------------------------------------
+    def slot_lower_bound(self) -> float:
+        # a lower bound of get_avg_slot_num() over all allocations (see lower_bound.py)
+        return lower_bound.slot_lower_bound(self)
     
     ##-----------------------------------------------------------------------------------
-    def get_avg_slot_num(self) -> float:
+    def recompute_avg_slot_num(self) -> float:
+        '''
+        Compute get_avg_slot_num() from scratch without the slot_counter (for checking)
+        '''
         switch2slots = {sw: 0 for sw in self.switch_nodes}
         slot_id_set = {flow.slot_id for flow in self.flow_dict.values()}
         slot_id2flow_id_list \
@@ -499,8 +1361,7 @@ class AllocatorUnit:
 
     ##-----------------------------------------------------------------------------------
     def get_total_communication_flow_edges(self) -> int:
-        return sum([flow.flow_graph.number_of_edges() 
-                    for flow in self.flow_dict.values()])
+        return sum([bit_count(flow.edge_bits) for flow in self.flow_dict.values()])
     
     ##-----------------------------------------------------------------------------------
     def get_crossing_flows_num(self) -> int:
@@ -518,6 +1379,57 @@ class AllocatorUnit:
                           for pair in self.pair_dict.values()])
         return (total_hops / len(self.pair_dict))
     
+    ##-----------------------------------------------------------------------------------
+    def to_genome(self) -> Genome:
+        vNodes = self.allocating_vNode_list
+        pairs = self.allocating_pair_list
+        flows = self.allocating_flow_list
+
+        def path_index(pair: Pair) -> Optional[int]:
+            if pair.path is None:
+                return None
+            src = pair.src_vNode.rNode_id
+            dst = pair.dst_vNode.rNode_id
+            return self.st_path_table[src][dst].index(pair.path)
+        path_indices = _int32_array((path_index(pair) for pair in pairs), len(pairs))
+
+        return Genome(_int32_array((vNode.vNode_id for vNode in vNodes), len(vNodes)), 
+                      _int32_array((vNode.rNode_id for vNode in vNodes), len(vNodes)), 
+                      _int32_array((pair.pair_id for pair in pairs), len(pairs)), 
+                      path_indices, 
+                      _int32_array((flow.flow_id for flow in flows), len(flows)), 
+                      _int32_array((flow.slot_id for flow in flows), len(flows)))
+    
+    ##-----------------------------------------------------------------------------------
+    def set_genome(self, genome: Genome):
+        '''
+        Restore the state recorded by to_genome() of this unit or of its clone
+        '''
+        # nodes
+        for vNode_id, rNode_id in zip(genome.vNode_ids.tolist(), 
+                                      genome.rNode_ids.tolist()):
+            if rNode_id < 0:
+                self.node_deallocation(vNode_id, False)
+            else:
+                self.node_allocation(vNode_id, rNode_id, False)
+        
+        # paths
+        for pair_id, index in zip(genome.pair_ids.tolist(), 
+                                  genome.path_indices.tolist()):
+            if index < 0:
+                self.pair_deallocation(pair_id)
+            else:
+                pair = self.pair_dict[pair_id]
+                src = pair.src_vNode.rNode_id
+                dst = pair.dst_vNode.rNode_id
+                self.pair_allocation(pair_id, self.st_path_table[src][dst][index])
+        
+        # slots
+        for flow_id, slot_id in zip(genome.flow_ids.tolist(), genome.slot_ids.tolist()):
+            flow = self.flow_dict[flow_id]
+            self._log_slot(flow)
+            self._set_slot_id(flow, None if slot_id < 0 else slot_id)
+
     ##-----------------------------------------------------------------------------------
     def dumps(self, protocol: int = pickle.HIGHEST_PROTOCOL) -> bytes:
         return pickle.dumps(self, protocol)
@@ -582,19 +1494,28 @@ class AllocatorUnit:
     def _hasher(self) -> int:
         '''
         This method is assumed to be used ONLY for AllocatorUnit.unique()
+        (the units must have the same topology and apps)
         '''
-        return hash((tuple(self.topology.nodes), 
-                     tuple(self.topology.edges),
-                     tuple(app._hasher() for app in self.app_dict.values())))
+        return self.zobrist_hash
     
     ##-----------------------------------------------------------------------------------
     def _mini_hasher(self) -> int:
         '''
         This method is assumed to be used ONLY for AllocatorUnit.unique()
+        (the units must have the same topology and apps)
         '''
-        return hash((tuple(self.topology.nodes), 
-                     tuple(self.topology.edges),
-                     tuple(app._mini_hasher() for app in self.app_dict.values())))
+        return self.node_zobrist_hash
+    
+    ##-----------------------------------------------------------------------------------
+    def recompute_zobrist_hash(self) -> tuple[int, int]:
+        # (zobrist_hash, node_zobrist_hash) recomputed from scratch (for checking)
+        hashes = (self.zobrist_hash, self.node_zobrist_hash)
+        self.zobrist_hash, self.node_zobrist_hash = 0, 0
+        for app in self.app_dict.values():
+            self._toggle_zobrist(app)
+        hashes, (self.zobrist_hash, self.node_zobrist_hash) \
+        = (self.zobrist_hash, self.node_zobrist_hash), hashes
+        return hashes
     
     ##-----------------------------------------------------------------------------------
     @staticmethod
@@ -609,6 +1530,69 @@ class AllocatorUnit:
                and (intersection.number_of_nodes() == self.topology.number_of_nodes()) \
                and (self.app_dict == other.app_dict)
 
+    ##-----------------------------------------------------------------------------------
+    def clone(self, share_static: bool = True, memo: Optional[dict] = None
+              ) -> AllocatorUnit:
+        '''
+        Copy this unit as a new solution.
+        If share_static is True, the topology, the node sets, the shortest path table 
+        and the already-applied apps are shared by reference, and only the 
+        per-solution state (rNode_id, path, slot_id, ...) of the other apps is copied.
+        Otherwise, the whole unit is pickled and unpickled.
+        '''
+        if not share_static:
+            return self.loads(self.dumps())
+
+        if memo is None:
+            memo = dict()
+        cls = self.__class__
+        unit = cls.__new__(cls)
+        memo[id(self)] = unit
+
+        # share the static attributes and copy the others (e.g. Individual.fitness)
+        for key, value in self.__dict__.items():
+            if key in AllocatorUnit._SHARED_ATTRS:
+                unit.__dict__[key] = value
+            elif key not in AllocatorUnit._APP_ATTRS:
+                unit.__dict__[key] = copy.deepcopy(value, memo)
+
+        # copy apps that are not applied yet
+        obj_map: dict[int, VNode | Flow | Pair] = dict()
+        unit.app_dict = dict()
+        for app_id, app in self.app_dict.items():
+            if app.is_applied():
+                unit.app_dict[app_id] = app
+                continue
+            for obj in app.vNode_list + app.flow_list + app.pair_list:
+                obj_map[id(obj)] = _shallow_copy(obj)
+            for pair in app.pair_list:
+                new_pair: Pair = obj_map[id(pair)]
+                new_pair.src_vNode = obj_map[id(pair.src_vNode)]
+                new_pair.dst_vNode = obj_map[id(pair.dst_vNode)]
+                new_pair.owner = obj_map[id(pair.owner)]
+            for vNode in app.vNode_list:
+                new_vNode: VNode = obj_map[id(vNode)]
+                new_vNode.send_pair_list = [obj_map[id(p)] for p in vNode.send_pair_list]
+                new_vNode.recv_pair_list = [obj_map[id(p)] for p in vNode.recv_pair_list]
+            for flow in app.flow_list:
+                # _flow_graph is always replaced (never modified) by make_flow_graph(), 
+                # so that it can be shared until the copy rebuilds it.
+                obj_map[id(flow)].pair_list = [obj_map[id(p)] for p in flow.pair_list]
+            unit.app_dict[app_id] = App(app_id, 
+                                        [obj_map[id(v)] for v in app.vNode_list], 
+                                        [obj_map[id(f)] for f in app.flow_list], 
+                                        [obj_map[id(p)] for p in app.pair_list])
+
+        # dictionaries (vNode, pair, flow)
+        unit.vNode_dict = {vNode_id: obj_map.get(id(vNode), vNode) 
+                           for vNode_id, vNode in self.vNode_dict.items()}
+        unit.flow_dict = {flow_id: obj_map.get(id(flow), flow) 
+                          for flow_id, flow in self.flow_dict.items()}
+        unit.pair_dict = {pair_id: obj_map.get(id(pair), pair) 
+                          for pair_id, pair in self.pair_dict.items()}
+
+        return unit
+
     ##-----------------------------------------------------------------------------------
     def __deepcopy__(self, memo) -> AllocatorUnit:
-        return self.loads(self.dumps())
+        return self.clone(memo=memo)
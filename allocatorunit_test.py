@@ -0,0 +1,293 @@
+import random
+
+import networkx as nx
+
+from board_allocator import BoardAllocator
+from allocatorunit import AllocatorUnit, bit_indices
+import oplib
+from cpp_modules import crossing_flows_csr, crossings_for_a_flow_csr
+
+TOPOLOGY_FILE = 'fic-topo-file-cross.txt'
+APP_FILES = ['exp_random/fft_16.txt', 'exp_random/a2a_16.txt', 'exp_random/fork_16.txt']
+
+#----------------------------------------------------------------------------------------
+def initial_solutions(seed: int = 0):
+    # (app file, an initial solution) of each app
+    for app_file in APP_FILES:
+        random.seed(seed)
+        ba = BoardAllocator(TOPOLOGY_FILE, False)
+        ba.load_app(app_file)
+        yield app_file, oplib.generate_initial_solution(ba.au)
+
+#----------------------------------------------------------------------------------------
+def test_slot_counter_check_mode():
+    # the slot counter agrees with the full recomputation after every move
+    for app_file, au in initial_solutions():
+        assert au.get_avg_slot_num(check=True) == au.recompute_avg_slot_num()
+        for _ in range(50):
+            au = oplib.node_swap(au, inplace=True)
+            au.get_avg_slot_num(check=True)
+
+    # and the check mode detects a stale counter
+    au.slot_counter.avg_slot_num = au.get_avg_slot_num() + 1
+    try:
+        au.get_avg_slot_num(check=True)
+    except AssertionError:
+        pass
+    else:
+        assert False, "a stale slot counter is not detected"
+
+#----------------------------------------------------------------------------------------
+def allocation_state(au: AllocatorUnit) -> tuple:
+    # rNode_ids, paths and slot_ids of the allocating vNodes, pairs and flows
+    return ({vNode.vNode_id: vNode.rNode_id for vNode in au.allocating_vNode_list},
+            {pair.pair_id: pair.path for pair in au.allocating_pair_list},
+            {flow.flow_id: flow.slot_id for flow in au.allocating_flow_list})
+
+#----------------------------------------------------------------------------------------
+def test_genome_round_trip():
+    for app_file, au in initial_solutions():
+        genome = au.to_genome()
+        state = allocation_state(au)
+        avg_slot_num = au.get_avg_slot_num()
+        assert genome == genome.copy() and hash(genome) == hash(genome.copy())
+
+        # restored after some moves
+        for _ in range(20):
+            au = oplib.node_swap(au, inplace=True)
+        au.set_genome(genome)
+        assert allocation_state(au) == state
+        assert au.to_genome() == genome
+        assert au.get_avg_slot_num(check=True) == avg_slot_num
+        assert au.consistenty_checker()
+
+        # restored on a clone of another solution
+        other = oplib.generate_initial_solution(au)
+        other.set_genome(genome)
+        assert allocation_state(other) == state
+        assert other.to_genome() == genome
+
+#----------------------------------------------------------------------------------------
+def full_state(au: AllocatorUnit) -> tuple:
+    # allocation_state() and the states derived from it
+    return (allocation_state(au),
+            {flow.flow_id: (flow.edge_bits, set(au.conflict_graph.neighbors(flow.flow_id)),
+                            sorted(flow.flow_graph.edges))
+             for flow in au.allocating_flow_list},
+            set(au.empty_rNodes), dict(au.temp_allocated_rNode_dict),
+            set(au.dirty_flow_ids),
+            au.get_avg_slot_num(check=True), au.get_total_communication_flow_edges())
+
+#----------------------------------------------------------------------------------------
+def test_transaction():
+    for app_file, au in initial_solutions():
+        for i in range(30):
+            state = full_state(au)
+            au.begin()
+            try:
+                au.begin()
+            except ValueError:
+                pass
+            else:
+                assert False, "nested transactions are not rejected"
+            if i % 3 == 0:
+                oplib.node_swap(au, inplace=True)
+            elif i % 3 == 1:
+                oplib.break_and_repair(au, 2, inplace=True)
+            else:
+                oplib.break_and_repair2(au, inplace=True)
+
+            # rollback restores the state exactly, and commit keeps the move
+            au.rollback()
+            assert full_state(au) == state
+            assert au.consistenty_checker()
+            au.begin()
+            oplib.node_swap(au, inplace=True)
+            moved = full_state(au)
+            au.commit()
+            assert full_state(au) == moved
+
+        for end in (au.commit, au.rollback):
+            try:
+                end()
+            except ValueError:
+                pass
+            else:
+                assert False, "{} without a transaction".format(end.__name__)
+
+#----------------------------------------------------------------------------------------
+def test_clone():
+    # an applied app and an app in allocating
+    random.seed(0)
+    ba = BoardAllocator(TOPOLOGY_FILE, False)
+    ba.load_app('examples/fft4_app_flow.txt')
+    ba.au = oplib.generate_initial_solution(ba.au)
+    ba.au.apply()
+    ba.load_app(APP_FILES[2])
+    au = oplib.generate_initial_solution(ba.au)
+    applied, allocating = au.app_dict.values()
+    assert applied.is_applied() and not allocating.is_applied()
+
+    # only the static attributes and the applied app are shared
+    unit = au.clone()
+    for key, value in au.__dict__.items():
+        if key in AllocatorUnit._SHARED_ATTRS:
+            assert unit.__dict__[key] is value, key
+        elif not isinstance(value, (int, float, str, type(None))):
+            assert unit.__dict__[key] is not value, key
+    assert unit.app_dict[applied.app_id] is applied
+    objects = allocating.vNode_list + allocating.flow_list + allocating.pair_list
+    assert all(unit_obj is not obj and unit_obj == obj
+               for unit_obj, obj in zip(unit.app_dict[allocating.app_id].vNode_list
+                                        + unit.app_dict[allocating.app_id].flow_list
+                                        + unit.app_dict[allocating.app_id].pair_list,
+                                        objects))
+
+    # the moves of the clone leave the original as it is
+    state = full_state(au)
+    hashes = (au.zobrist_hash, au.node_zobrist_hash)
+    for i in range(30):
+        if i % 2 == 0:
+            oplib.node_swap(unit, inplace=True)
+        else:
+            oplib.break_and_repair2(unit, inplace=True)
+    assert allocation_state(unit) != allocation_state(au)
+    assert full_state(au) == state
+    assert (au.zobrist_hash, au.node_zobrist_hash) == hashes
+    assert au.consistenty_checker() and unit.consistenty_checker()
+
+#----------------------------------------------------------------------------------------
+def test_zobrist_hash():
+    for app_file, au in initial_solutions():
+        genome = au.to_genome()
+        hashes = (au.zobrist_hash, au.node_zobrist_hash)
+        assert au.recompute_zobrist_hash() == hashes
+
+        # the incremental hashes agree with the recomputation after every move
+        for i in range(30):
+            au.begin()
+            oplib.node_swap(au, inplace=True)
+            assert au.recompute_zobrist_hash() == (au.zobrist_hash, au.node_zobrist_hash)
+            if i % 2 == 0:
+                au.rollback()
+            else:
+                au.commit()
+            assert au.recompute_zobrist_hash() == (au.zobrist_hash, au.node_zobrist_hash)
+
+        # the same state has the same hashes in any unit
+        other = oplib.generate_initial_solution(au)
+        other.set_genome(genome)
+        au.set_genome(genome)
+        assert (au.zobrist_hash, au.node_zobrist_hash) == hashes
+        assert (other.zobrist_hash, other.node_zobrist_hash) == hashes
+        assert len(AllocatorUnit.unique([au, other])) == 1
+
+#----------------------------------------------------------------------------------------
+def test_flow_arrays():
+    # the CSR arrays give the same conflict graph as the resident FlowSet
+    undirected = lambda pairs: {frozenset(p) for p in pairs if p[0] != p[1]}
+    for app_file, au in initial_solutions():
+        cvids, flow_offsets, edge_ids = au.flow_arrays()
+        assert undirected(crossing_flows_csr(cvids, flow_offsets, edge_ids).tolist()) \
+               == undirected(au.crossing_flows())
+        for i, flow in enumerate(au.flow_dict.values()):
+            target = edge_ids[flow_offsets[i]:flow_offsets[i + 1]]
+            assert crossings_for_a_flow_csr(flow.cvid, target, 
+                                            cvids, flow_offsets, edge_ids) \
+                   == au.crossings_for_a_flow(flow.flow_id)
+
+#----------------------------------------------------------------------------------------
+def test_flow_graph():
+    # the flow graphs made on demand agree with the edge bits after every move
+    for app_file, au in initial_solutions():
+        id2edge = {i: edge for edge, i in au.edge2id.items()}
+        for i in range(30):
+            if i % 2 == 0:
+                oplib.node_swap(au, inplace=True)
+            else:
+                oplib.break_and_repair2(au, inplace=True)
+            for flow in au.flow_dict.values():
+                assert set(flow.flow_graph.edges) \
+                       == {id2edge[e] for e in bit_indices(flow.edge_bits)}
+            assert au.get_total_communication_flow_edges() \
+                   == sum(flow.flow_graph.number_of_edges() for flow in au.flow_dict.values())
+
+#----------------------------------------------------------------------------------------
+def test_swap_delta():
+    # the deltas agree with the full evaluation with and without the periodic 
+    # recoloring, and rollback() restores the count of the slot allocations
+    for recoloring_interval in (0, 7):
+        for app_file, au in initial_solutions():
+            au.recoloring_interval = recoloring_interval
+            for _ in range(30):
+                avg_slot_num = au.get_avg_slot_num()
+                edges = au.get_total_communication_flow_edges()
+                count = au.slot_allocation_count
+                au.begin()
+                delta_slots, delta_edges = oplib.node_swap_delta(au)
+                assert abs(au.get_avg_slot_num(check=True) - avg_slot_num 
+                           - delta_slots) < 1e-9
+                assert au.get_total_communication_flow_edges() - edges == delta_edges
+                au.rollback()
+                assert au.slot_allocation_count == count
+
+#----------------------------------------------------------------------------------------
+def test_clique_index():
+    # the indexed maximal cliques agree with nx.find_cliques() after random moves
+    rand = random.Random(0)
+    for app_file, au in initial_solutions():
+        for i in range(40):
+            au.begin()
+            if i % 3 == 0:
+                oplib.node_swap(au, inplace=True)
+            elif i % 3 == 1:
+                pair = rand.choice(au.allocating_pair_list)
+                src, dst = pair.src_vNode.rNode_id, pair.dst_vNode.rNode_id
+                au.path_delta(pair.pair_id, rand.choice(au.st_path_table[src][dst]))
+            else:
+                oplib.break_and_repair2(au, inplace=True)
+            if rand.random() < 0.3:
+                au.rollback()
+            else:
+                au.commit()
+            cliques = {frozenset(c) for c in nx.find_cliques(au.slot_graph())}
+            assert {frozenset(c) for c in au.find_maximal_cliques_of_slot_graph()} \
+                   == cliques
+            size = max(map(len, cliques))
+            assert au.clique_census() == (size, sum(len(c) == size for c in cliques))
+
+#----------------------------------------------------------------------------------------
+def test_best_improvement_scans():
+    # the scans leave the unit as it is, and their best moves are reproduced
+    for app_file, au in initial_solutions():
+        for max_candidates in (None, 4):
+            state = full_state(au)
+            vNode_id = au.allocating_vNode_list[0].vNode_id
+            moves = oplib.scan_node_swaps(au, vNode_id, 3, max_candidates)
+            assert full_state(au) == state
+            assert 0 < len(moves) <= 3 and moves == sorted(moves, key=lambda m: m[:2])
+            delta_slots, delta_edges, rNode_id, paths = moves[0]
+            au.begin()
+            assert au.swap_delta(vNode_id, rNode_id, paths) == (delta_slots, delta_edges)
+            assert abs(au.get_avg_slot_num(check=True) - state[-2] - delta_slots) < 1e-9
+            assert au.get_total_communication_flow_edges() - state[-1] == delta_edges
+            au.rollback()
+
+            flow_id = au.allocating_flow_list[0].flow_id
+            moves = oplib.scan_flow_paths(au, flow_id, 3, max_candidates)
+            assert full_state(au) == state
+            assert len(moves) <= 3 and moves == sorted(moves, key=lambda m: m[:2])
+            for delta_slots, delta_edges, pair_id, path in moves[:1]:
+                au.begin()
+                assert au.path_delta(pair_id, path) == (delta_slots, delta_edges)
+                assert au.get_total_communication_flow_edges() - state[-1] == delta_edges
+                au.rollback()
+
+#----------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            print("===Checking {}===".format(name[len('test_'):]))
+            test()
+            print("Successed!")
+            print()
@@ -10,7 +10,8 @@ from allocatorunit import AllocatorUnit
 def alns(au: AllocatorUnit, 
          max_execution_time: float, 
          enable_log: bool = True, 
-         for_exp: bool = False) -> AllocatorUnit:
+         for_exp: bool = False, 
+         best_improvement: bool = False) -> AllocatorUnit:
     # probability changer
     p_range = min(2, len(au.allocating_vNode_list)) + 1 # normalization value
 
@@ -25,22 +26,37 @@ def alns(au: AllocatorUnit,
     best = oplib.generate_initial_solution(au)
     best_slot_num = best.get_avg_slot_num()
     best_total_hops = best.get_total_communication_flow_edges()
+    lower_bound = best.slot_lower_bound() # stop when best_slot_num reaches it
     print("{:>6}th loop: slots: {}, "
                              "hops: {}".format(loops, best_slot_num, 
                                                       best_total_hops))
 
-    while time.time() - start_time < max_execution_time:
+    while (time.time() - start_time < max_execution_time) \
+          and (best_slot_num > lower_bound):
         loops += 1
 
-        # break and repair
+        # break and repair (in a transaction of best), where the best path of a random 
+        # flow is taken instead of break_and_repair2() if best_improvement
         if random.random() < (1 - ((time.time() - start_time) / max_execution_time)):
             target_node_num = random.randrange(1, p_range)
-            au = oplib.break_and_repair(best, target_node_num)
+            best.begin()
+            au = oplib.break_and_repair(best, target_node_num, inplace=True)
+        elif best_improvement:
+            flow_id = random.choice(best.allocating_flow_list).flow_id
+            moves = oplib.scan_flow_paths(best, flow_id)
+            if not moves:
+                continue
+            _, _, pair_id, path = moves[0]
+            best.begin()
+            best.path_delta(pair_id, path)
+            au = best
         else:
-            au = oplib.break_and_repair2(best)
+            best.begin()
+            au = oplib.break_and_repair2(best, inplace=True)
 
         # evaluation
         if for_exp and (time.time() - start_time > max_execution_time):
+            best.rollback()
             break
         slot_num = au.get_avg_slot_num()
         total_hops = au.get_total_communication_flow_edges()
@@ -48,7 +64,7 @@ def alns(au: AllocatorUnit,
             print("{:>6}th loop: update for slot decrease (slots: {} -> {}, "
                              "hops: {} -> {})".format(loops, best_slot_num, slot_num, 
                                                       best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_slot_change += 1
@@ -57,14 +73,18 @@ def alns(au: AllocatorUnit,
                              "(slots: {} -> {}, hops: {} -> {})"
                              .format(loops, best_slot_num, slot_num, 
                                      best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_total_hops_change += 1
+        else:
+            best.rollback()
 
     # logs
     if enable_log:
         print("# of loops: {}".format(loops))
+        print("lower bound of slots: {}{}".format(
+              lower_bound, " (reached)" if best_slot_num <= lower_bound else ""))
         print("# of updates for slot decrease: {}".format(cnt_slot_change))
         print("# of updates for total slot decrease: {}".format(cnt_total_hops_change))
         print("# of slots: {}".format(best.get_max_slot_num()))
@@ -93,13 +113,17 @@ def alns_only_pairs(au: AllocatorUnit,
     best = oplib.generate_initial_solution(au)
     best_slot_num = best.get_avg_slot_num()
     best_total_hops = best.get_total_communication_flow_edges()
+    lower_bound = best.slot_lower_bound() # stop when best_slot_num reaches it
 
-    while time.time() - start_time < max_execution_time:
+    while (time.time() - start_time < max_execution_time) \
+          and (best_slot_num > lower_bound):
         loops += 1
 
         # break and repair
         target_pair_num = random.randrange(1, len(au.allocating_pair_list))
-        au = oplib.break_and_repair(best, target_pair_num, target='pair')
+        best.begin()
+        au = oplib.break_and_repair(best, target_pair_num, target='pair', 
+                                    inplace=True)
 
         # evaluation
         slot_num = au.get_avg_slot_num()
@@ -108,7 +132,7 @@ def alns_only_pairs(au: AllocatorUnit,
             updatelog.append("{:>6}th loop: update for slot decrease (slots: {} -> {}, "
                              "hops: {} -> {})".format(loops, best_slot_num, slot_num, 
                                                       best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_slot_change += 1
@@ -117,14 +141,18 @@ def alns_only_pairs(au: AllocatorUnit,
                              "(slots: {} -> {}, hops: {} -> {})"
                              .format(loops, best_slot_num, slot_num, 
                                      best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_total_hops_change += 1
+        else:
+            best.rollback()
 
     # logs
     if enable_log:
         print("# of loops: {}".format(loops))
+        print("lower bound of slots: {}{}".format(
+              lower_bound, " (reached)" if best_slot_num <= lower_bound else ""))
         print("# of updates for slot decrease: {}".format(cnt_slot_change))
         print("# of updates for total slot decrease: {}".format(cnt_total_hops_change))
         print("# of slots: {}".format(best.get_max_slot_num()))
@@ -138,7 +166,9 @@ def alns_only_pairs(au: AllocatorUnit,
 #----------------------------------------------------------------------------------------
 def alns2(au: AllocatorUnit, 
           max_execution_time: float, 
-          enable_log: bool = True) -> AllocatorUnit:
+          enable_log: bool = True, 
+          delta_evaluation: bool = True, 
+          best_improvement: bool = False) -> AllocatorUnit:
     # probability changer
     p_range = 2 # normalization value
 
@@ -155,37 +185,59 @@ def alns2(au: AllocatorUnit,
     best = oplib.generate_initial_solution(au)
     best_slot_num = best.get_avg_slot_num()
     best_total_hops = best.get_total_communication_flow_edges()
+    lower_bound = best.slot_lower_bound() # stop when best_slot_num reaches it
 
-    while time.time() - start_time < max_execution_time:
+    while (time.time() - start_time < max_execution_time) \
+          and (best_slot_num > lower_bound):
         loops += 1
 
-        # execute node_swap
-        au = oplib.node_swap(best)
+        # execute node_swap (only the swapped flows are evaluated if delta_evaluation, 
+        # and the best swap of a random vNode is taken if best_improvement)
+        if best_improvement:
+            vNode_id = random.choice(best.allocating_vNode_list).vNode_id
+            moves = oplib.scan_node_swaps(best, vNode_id)
+            if not moves:
+                continue
+            _, _, rNode_id, paths = moves[0]
+            best.begin()
+            delta_slots, delta_hops = best.swap_delta(vNode_id, rNode_id, paths)
+        elif delta_evaluation:
+            best.begin()
+            delta_slots, delta_hops = oplib.node_swap_delta(best)
+        else:
+            best.begin()
+            au = oplib.node_swap(best, inplace=True)
+            delta_slots = au.get_avg_slot_num() - best_slot_num
+            delta_hops = au.get_total_communication_flow_edges() - best_total_hops
 
         # evaluation
-        slot_num = au.get_avg_slot_num()
-        total_hops = au.get_total_communication_flow_edges()
-        if slot_num < best_slot_num:
+        slot_num = best_slot_num + delta_slots
+        total_hops = best_total_hops + delta_hops
+        if delta_slots < 0:
             updatelog.append("{:>6}th loop: update for slot decrease (slots: {} -> {}, "
                              "hops: {} -> {})".format(loops, best_slot_num, slot_num, 
                                                       best_total_hops, total_hops))
-            best = au
-            best_slot_num = slot_num
+            best.commit()
+            best_slot_num = best.get_avg_slot_num()
             best_total_hops = total_hops
             cnt_slot_change += 1
-        elif (slot_num == best_slot_num) and (total_hops < best_total_hops):
+        elif (delta_slots == 0) and (delta_hops < 0):
             updatelog.append("{:>6}th loop: update for total hops decrease "
                              "(slots: {} -> {}, hops: {} -> {})"
                              .format(loops, best_slot_num, slot_num, 
                                      best_total_hops, total_hops))
-            best = au
-            best_slot_num = slot_num
+            best.commit()
+            best_slot_num = best.get_avg_slot_num()
             best_total_hops = total_hops
             cnt_total_hops_change += 1
+        else:
+            best.rollback()
 
     # logs
     if enable_log:
         print("# of loops: {}".format(loops))
+        print("lower bound of slots: {}{}".format(
+              lower_bound, " (reached)" if best_slot_num <= lower_bound else ""))
         print("# of updates for slot decrease: {}".format(cnt_slot_change))
         print("# of updates for total slot decrease: {}".format(cnt_total_hops_change))
         print("# of slots: {}".format(best.get_max_slot_num()))
@@ -217,19 +269,19 @@ def alns_test(au: AllocatorUnit,
         best = copy.deepcopy(au)
     best_slot_num = best.get_avg_slot_num()
     best_total_hops = best.get_total_communication_flow_edges()
-    maximals = best.find_maximal_cliques_of_slot_graph()
-    best_clieque_size = len(max(maximals, key=len))
-    maximals = [c for c in maximals if len(c) == best_clieque_size]
-    best_max_clieque_size_num = len(maximals)
+    lower_bound = best.slot_lower_bound() # stop when best_slot_num reaches it
+    best_clieque_size, best_max_clieque_size_num = best.clique_census()
     if enable_log:
         print("# of slots: {}, clique size: {}, # of max clieques: {}, # of edges: {}"
               .format(best_slot_num, best_clieque_size, best_max_clieque_size_num, best_total_hops))
 
-    while time.time() - start_time < max_execution_time:
+    while (time.time() - start_time < max_execution_time) \
+          and (best_slot_num > lower_bound):
         loops += 1
         
         # execute node_swap
-        au = oplib.break_a_maximal_clique_and_repair(best)
+        best.begin()
+        au = oplib.break_a_maximal_clique_and_repair(best, inplace=True)
         
         # evaluation
         slot_num = au.get_avg_slot_num()
@@ -238,7 +290,7 @@ def alns_test(au: AllocatorUnit,
             updatelog.append("{:>6}th loop: update for slot decrease (slots: {} -> {}, "
                              "hops: {} -> {})".format(loops, best_slot_num, slot_num, 
                                                       best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_slot_change += 1
@@ -247,14 +299,18 @@ def alns_test(au: AllocatorUnit,
                              "(slots: {} -> {}, hops: {} -> {})"
                              .format(loops, best_slot_num, slot_num, 
                                      best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_total_hops_change += 1
+        else:
+            best.rollback()
 
     # logs
     if enable_log:
         print("# of loops: {}".format(loops))
+        print("lower bound of slots: {}{}".format(
+              lower_bound, " (reached)" if best_slot_num <= lower_bound else ""))
         print("# of updates for slot decrease: {}".format(cnt_slot_change))
         print("# of updates for total slot decrease: {}".format(cnt_total_hops_change))
         print("# of slots: {}".format(best.get_max_slot_num()))
@@ -286,27 +342,24 @@ def alns_test2(au: AllocatorUnit,
         best = copy.deepcopy(au)
     best_slot_num = best.get_avg_slot_num()
     best_total_hops = best.get_total_communication_flow_edges()
-    maximals = best.find_maximal_cliques_of_slot_graph()
-    best_clieque_size = len(max(maximals, key=len))
-    maximals = [c for c in maximals if len(c) == best_clieque_size]
-    best_max_clieque_size_num = len(maximals)
+    lower_bound = best.slot_lower_bound() # stop when best_slot_num reaches it
+    best_clieque_size, best_max_clieque_size_num = best.clique_census()
     if enable_log:
         print("# of slots: {}, clique size: {}, # of max clieques: {}, # of edges: {}"
               .format(best_slot_num, best_clieque_size, best_max_clieque_size_num, best_total_hops))
 
-    while time.time() - start_time < max_execution_time:
+    while (time.time() - start_time < max_execution_time) \
+          and (best_slot_num > lower_bound):
         loops += 1
-        au = oplib.break_a_maximal_clique_and_repair(best)
+        best.begin()
+        au = oplib.break_a_maximal_clique_and_repair(best, inplace=True)
         slot_num = au.get_avg_slot_num()
         total_hops = au.get_total_communication_flow_edges()
         #print("# of slots: {}, # of flows' edges: {}".format(slot_num, total_hops))
-        maximals = au.find_maximal_cliques_of_slot_graph()
-        clieque_size = len(max(maximals, key=len))
-        maximals = [c for c in maximals if len(c) == clieque_size]
-        max_clieque_size_num = len(maximals)
+        clieque_size, max_clieque_size_num = au.clique_census()
 
         if slot_num < best_slot_num:
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_clieque_size = clieque_size
             best_max_clieque_size_num = max_clieque_size_num
@@ -315,7 +368,7 @@ def alns_test2(au: AllocatorUnit,
                 print("'# of slots: {}', clique size: {}, # of max clieques: {}, # of edges: {}"
                       .format(best_slot_num, best_clieque_size, best_max_clieque_size_num, best_total_hops))
         elif slot_num == best_slot_num and (clieque_size < best_clieque_size):
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_clieque_size = clieque_size
             best_max_clieque_size_num = max_clieque_size_num
@@ -324,7 +377,7 @@ def alns_test2(au: AllocatorUnit,
                 print("# of slots: {}, 'clique size: {}', # of max clieques: {}, # of edges: {}"
                       .format(best_slot_num, best_clieque_size, best_max_clieque_size_num, best_total_hops))
         elif slot_num == best_slot_num and (clieque_size == best_clieque_size) and (max_clieque_size_num < best_max_clieque_size_num):
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_clieque_size = clieque_size
             best_max_clieque_size_num = max_clieque_size_num
@@ -333,7 +386,7 @@ def alns_test2(au: AllocatorUnit,
                 print("# of slots: {}, clique size: {}, '# of max clieques: {}', # of edges: {}"
                       .format(best_slot_num, best_clieque_size, best_max_clieque_size_num, best_total_hops))
         elif slot_num == best_slot_num and (clieque_size == best_clieque_size) and (max_clieque_size_num == best_max_clieque_size_num) and (total_hops < best_total_hops):
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_clieque_size = clieque_size
             best_max_clieque_size_num = max_clieque_size_num
@@ -341,10 +394,14 @@ def alns_test2(au: AllocatorUnit,
             if enable_log:
                 print("# of slots: {}, clique size: {}, # of max clieques: {}, '# of edges: {}'"
                       .format(best_slot_num, best_clieque_size, best_max_clieque_size_num, best_total_hops))
+        else:
+            best.rollback()
 
     # logs
     if enable_log:
         print("# of loops: {}".format(loops))
+        print("lower bound of slots: {}{}".format(
+              lower_bound, " (reached)" if best_slot_num <= lower_bound else ""))
         print("# of updates for slot decrease: {}".format(cnt_slot_change))
         print("# of updates for total slot decrease: {}".format(cnt_total_hops_change))
         print("# of slots: {}".format(best.get_max_slot_num()))
@@ -376,13 +433,16 @@ def alns_assist(au: AllocatorUnit,
         best = copy.deepcopy(au)
     best_slot_num = best.get_avg_slot_num()
     best_total_hops = best.get_total_communication_flow_edges()
+    lower_bound = best.slot_lower_bound() # stop when best_slot_num reaches it
     if enable_log:
         print("# of slots: {}, # of edges: {}"
               .format(best_slot_num, best_total_hops))
 
-    while time.time() - start_time < max_execution_time:
+    while (time.time() - start_time < max_execution_time) \
+          and (best_slot_num > lower_bound):
         loops += 1
-        au = oplib.break_nodes_and_repair(best)
+        best.begin()
+        au = oplib.break_nodes_and_repair(best, inplace=True)
         slot_num = au.get_avg_slot_num()
         total_hops = au.get_total_communication_flow_edges()
 
@@ -393,7 +453,7 @@ def alns_assist(au: AllocatorUnit,
             print("{:>6}th loop: update for slot decrease (slots: {} -> {}, "
                              "hops: {} -> {})".format(loops, best_slot_num, slot_num, 
                                                       best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_slot_change += 1
@@ -402,10 +462,12 @@ def alns_assist(au: AllocatorUnit,
                              "(slots: {} -> {}, hops: {} -> {})"
                              .format(loops, best_slot_num, slot_num, 
                                      best_total_hops, total_hops))
-            best = au
+            best.commit()
             best_slot_num = slot_num
             best_total_hops = total_hops
             cnt_total_hops_change += 1
+        else:
+            best.rollback()
         
         #loops += 1
         #
@@ -436,6 +498,8 @@ def alns_assist(au: AllocatorUnit,
     # logs
     if enable_log:
         print("# of loops: {}".format(loops))
+        print("lower bound of slots: {}{}".format(
+              lower_bound, " (reached)" if best_slot_num <= lower_bound else ""))
         print("# of updates for slot decrease: {}".format(cnt_slot_change))
         print("# of updates for total slot decrease: {}".format(cnt_total_hops_change))
         print("# of slots: {}".format(best.get_max_slot_num()))
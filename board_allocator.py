@@ -2,6 +2,7 @@ from __future__ import annotations
 import argparse
 import json
 import sys
+import time
 import os
 import os.path
 import shutil
@@ -23,6 +24,7 @@ import matplotlib.pyplot as plt
 # my library
 from allocatorunit import AllocatorUnit, App, Pair, VNode, Flow
 import alns
+import oplib
 from nsga2 import NSGA2
 from ncga import NCGA
 from spea2 import SPEA2
@@ -92,7 +94,10 @@ class AppVirtualizer:
 
 #----------------------------------------------------------------------------------------
 class BoardAllocator:
-    def __init__(self, topologyFile: str, multi_ejection: bool = False):
+    def __init__(self, 
+                 topologyFile: str, 
+                 multi_ejection: bool = False, 
+                 max_paths_per_pair: Optional[int] = None):
         # define variable
         ## Allocator Unit
         self.au: Optional[AllocatorUnit] = None
@@ -158,7 +163,7 @@ class BoardAllocator:
         #plt.show()
         
         # make allocatorunit
-        self.au = AllocatorUnit(topology)
+        self.au = AllocatorUnit(topology, max_paths_per_pair)
 
     # genaration of vNode_id: it is used only when you create a new VNode
     ##-----------------------------------------------------------------------------------
@@ -269,9 +274,28 @@ class BoardAllocator:
     def run_optimization(self, 
                          max_execution_time: float, 
                          method: str, 
-                         process_num: int = 1):
-        # type: (float, str, int) -> None
+                         process_num: int = 1, 
+                         slot_strategy: Optional[str] = None, 
+                         polish_time: float = 0.0, 
+                         recoloring_interval: int = 0, 
+                         start_num: int = 1, 
+                         start_time_slice: float = 0.0):
+        # type: (float, str, int, Optional[str], bool, float, int, int, float) -> None
         print("selected method: {}".format(method))
+        # coloring strategy of the slot allocation (inherited by every solution)
+        self.au.set_slot_strategy(slot_strategy)
+        # incremental slot allocation of the local moves (see AllocatorUnit.slot_allocation)
+        self.au.recoloring_interval = recoloring_interval
+        # start from the best of start_num initial solutions made in start_time_slice
+        # (the GAs make their initial populations by themselves)
+        if (start_num > 1) and (method.lower() in ('2-opt', 'alns', 'alns_test')):
+            start_time = time.time()
+            initializer = oplib.initialize_by_assist if method.lower() == 'alns_test' \
+                          else oplib.generate_initial_solution
+            self.au, = oplib.multi_start(self.au, initializer, start_num, 
+                                         start_time_slice, process_num)
+            max_execution_time -= time.time() - start_time
+            print("initial solution: the best of up to {} starts".format(start_num))
         if method.lower() == '2-opt':
             self.au = alns.alns2(self.au, max_execution_time)
         elif method.lower() == 'alns':
@@ -292,37 +316,64 @@ class BoardAllocator:
             hall_of_fame = spea2.run(max_execution_time, process_num)
         else:
             raise ValueError("Invalid optimization method name.")
+        # the GAs leave self.au as it is, so that a solution is picked from hall_of_fame
+        if method.lower() in ('nsga2', 'ncga', 'spea2'):
+            self.au = self._pick_from_hof(hall_of_fame)
+        
+        # minimize the number of slots exactly (kept if avg # of slots is not worse)
+        if polish_time > 0:
+            avg_slot_num = self.au.get_avg_slot_num()
+            self.au.begin()
+            slot_num, lower_bound, proven \
+            = self.au.optimal_slot_allocation(time.time() + polish_time)
+            kept = self.au.get_avg_slot_num() <= avg_slot_num
+            if kept:
+                self.au.commit()
+            else:
+                self.au.rollback()
+            print("optimal slot allocation: {} slots (lower bound: {}, {}, {})".format(
+                  slot_num, lower_bound, "optimal" if proven else "not proven", 
+                  "kept" if kept else "discarded"))
         
         self.au.apply()
     
     ##-----------------------------------------------------------------------------------
-    def two_opt(self, execution_time: float):
+    def two_opt(self, execution_time: float, slot_strategy: Optional[str] = None):
+        self.au.set_slot_strategy(slot_strategy)
         self.au = alns.alns2(self.au, execution_time)
         self.au.apply()
     
     ##-----------------------------------------------------------------------------------
-    def alns(self, execution_time: float, for_exp: bool = False):
+    def alns(self, 
+             execution_time: float, 
+             for_exp: bool = False, 
+             slot_strategy: Optional[str] = None):
+        self.au.set_slot_strategy(slot_strategy)
         self.au = alns.alns(self.au, execution_time, for_exp=for_exp)
         self.au.apply()
         return self.au
 
     ##-----------------------------------------------------------------------------------
-    def alns_test(self, execution_time: float):
+    def alns_test(self, execution_time: float, slot_strategy: Optional[str] = None):
+        self.au.set_slot_strategy(slot_strategy)
         self.au = alns.alns_test(self.au, execution_time)
         self.au.apply()
     
     ##-----------------------------------------------------------------------------------
-    def alns_test2(self, execution_time: float):
+    def alns_test2(self, execution_time: float, slot_strategy: Optional[str] = None):
+        self.au.set_slot_strategy(slot_strategy)
         self.au = alns.alns_test2(self.au, execution_time)
         self.au.apply()
 
     ##-----------------------------------------------------------------------------------
-    def alns_assist(self, execution_time: float):
+    def alns_assist(self, execution_time: float, slot_strategy: Optional[str] = None):
+        self.au.set_slot_strategy(slot_strategy)
         self.au = alns.alns_assist(self.au, execution_time)
         self.au.apply()
     
     ##-----------------------------------------------------------------------------------
-    def sa(self, execution_time: float):
+    def sa(self, execution_time: float, slot_strategy: Optional[str] = None):
+        self.au.set_slot_strategy(slot_strategy)
         self.au = sa.sa(self.au, execution_time)
         self.au.apply()
     
@@ -334,9 +385,11 @@ class BoardAllocator:
               mutation_pb: float = 0.2, 
               archive_size: int = 40, 
               offspring_size: Optional[int] = None, 
-              for_exp: bool = False) -> tools.ParetoFront:
+              for_exp: bool = False, 
+              slot_strategy: Optional[str] = None) -> tools.ParetoFront:
         seed = self.au.dumps()
-        nsga2 = NSGA2(seed, mate_pb, mutation_pb, archive_size, offspring_size)
+        nsga2 = NSGA2(seed, mate_pb, mutation_pb, archive_size, offspring_size, 
+                      slot_strategy)
         hall_of_fame = nsga2.run(execution_time, process_num, for_exp=for_exp)
 
         return hall_of_fame
@@ -348,9 +401,11 @@ class BoardAllocator:
               mate_pb: float = 1, 
               mutation_pb: float = 0.3, 
               archive_size: int = 40, 
-              offspring_size: Optional[int] = None) -> tools.ParetoFront:
+              offspring_size: Optional[int] = None, 
+              slot_strategy: Optional[str] = None) -> tools.ParetoFront:
         seed = self.au.dumps()
-        spea2 = SPEA2(seed, mate_pb, mutation_pb, archive_size, offspring_size)
+        spea2 = SPEA2(seed, mate_pb, mutation_pb, archive_size, offspring_size, 
+                      slot_strategy)
         hall_of_fame = spea2.run(execution_time, process_num)
 
         return hall_of_fame
@@ -363,16 +418,18 @@ class BoardAllocator:
              mutation_pb: float = 0.3, 
              archive_size: int = 40, 
              offspring_size: Optional[int] = None, 
-             sort_method: str = 'cyclic'):
+             sort_method: str = 'cyclic', 
+             slot_strategy: Optional[str] = None):
         seed = self.au.dumps()
         ncga = NCGA(seed, mate_pb, mutation_pb, archive_size, 
-                    offspring_size, sort_method)
+                    offspring_size, sort_method, slot_strategy)
         hall_of_fame = ncga.run(execution_time, process_num)
 
         return hall_of_fame
 
     ##-----------------------------------------------------------------------------------
-    def select_from_hof(self, hof: tools.HallOfFame, index: Optional[int] = None):
+    def _pick_from_hof(self, hof: tools.HallOfFame, index: Optional[int] = None
+                       ) -> Individual:
         if index is None:
             index = 0
             best = hof[index].fitness.values[0] * Evaluator.weights()[0]
@@ -381,8 +438,11 @@ class BoardAllocator:
                 score = ind.fitness.values[0] * Evaluator.weights()[0]
                 if score > best:
                     index = i
+        return hof[index]
 
-        self.au: Individual = hof[index]
+    ##-----------------------------------------------------------------------------------
+    def select_from_hof(self, hof: tools.HallOfFame, index: Optional[int] = None):
+        self.au: Individual = self._pick_from_hof(hof, index)
         self.au.apply()
         return self.au
 
@@ -0,0 +1,64 @@
+import random
+
+from board_allocator import BoardAllocator
+from allocatorunit import AllocatorUnit
+
+TOPOLOGY_FILE = 'fic-topo-file-cross.txt'
+APP_FILE = 'exp_random/fork_16.txt'
+
+#----------------------------------------------------------------------------------------
+def board_allocator(seed: int = 0) -> BoardAllocator:
+    random.seed(seed)
+    ba = BoardAllocator(TOPOLOGY_FILE, False)
+    ba.load_app(APP_FILE)
+    return ba
+
+#----------------------------------------------------------------------------------------
+def valid_coloring(au: AllocatorUnit) -> bool:
+    # every allocating flow has a slot_id different from those of its crossing flows
+    return all(flow.slot_id is not None
+               and all(au.flow_dict[other].slot_id != flow.slot_id
+                       for other in au.conflict_graph.neighbors(flow.flow_id))
+               for flow in au.allocating_flow_list)
+
+#----------------------------------------------------------------------------------------
+def test_slot_strategy():
+    # the strategy given to the optimizers is used by all their solutions
+    for strategy in AllocatorUnit.SLOT_STRATEGIES:
+        ba = board_allocator()
+        hall_of_fame = ba.nsga2(1, archive_size=8, slot_strategy=strategy)
+        assert len(hall_of_fame) > 0
+        for ind in hall_of_fame:
+            assert ind.slot_strategy == strategy and valid_coloring(ind)
+
+        ba = board_allocator()
+        ba.alns(1, slot_strategy=strategy)
+        assert ba.au.slot_strategy == strategy
+
+    try:
+        board_allocator().two_opt(1, slot_strategy='unknown')
+    except ValueError:
+        pass
+    else:
+        assert False, "an invalid strategy is not rejected"
+
+#----------------------------------------------------------------------------------------
+def test_polish_after_ga():
+    # the solution picked from the hall of fame is polished and applied
+    for method in ('nsga2', 'ncga', 'spea2'):
+        ba = board_allocator()
+        ba.run_optimization(1, method, polish_time=0.5)
+        assert all(not flow.allocating and flow.slot_id is not None
+                   for flow in ba.au.flow_dict.values())
+        assert all(ba.au.flow_dict[other].slot_id != flow.slot_id
+                   for flow in ba.au.flow_dict.values()
+                   for other in ba.au.conflict_graph.neighbors(flow.flow_id))
+
+#----------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            print("===Checking {}===".format(name[len('test_'):]))
+            test()
+            print("Successed!")
+            print()
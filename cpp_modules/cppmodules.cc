@@ -2,117 +2,634 @@
 
 #include <set>
 #include <vector>
+#include <string>
+#include <random>
+#include <chrono>
+#include <cstring>
+#include <mutex>
+#include <shared_mutex>
 #include <algorithm>
+#include <iterator>
 #include <unordered_set>
 #include <unordered_map>
 
 class Flow {
 public:
     int cvid;
-    std::set<std::pair<int, int>> edges;
+    std::vector<std::pair<int, int>> edges; // without duplication
 
-    Flow(int c, std::set<std::pair<int, int>>& e): cvid(c), edges(e) { }
+    Flow(int c): cvid(c) { }
 };
 
-class Vdeg {
-public:
-    int index;
-    int deg;
-
-    Vdeg(int i, int d): index(i), deg(d) { }
+// key of an edge for the inverted index
+static inline long long edge_key(const std::pair<int, int>& e) {
+    return ((long long)e.first << 32) | (unsigned int)e.second;
+}
 
-    bool operator<(const Vdeg& v) {
-        return this->deg < v.deg;
+// parse (cvid, edges) where edges is an iterable of (u, v)
+static int parse_flow(PyObject* ftuple, std::vector<Flow>& flows) {
+    PyObject* j = PyObject_GetIter(ftuple);
+    if (j == NULL) {
+        return -1;
     }
-};
-
-static PyObject* cpp_crossing_flows(PyObject*, PyObject* args) {
-    PyObject* flow_tuples = NULL;
-    if (!PyArg_ParseTuple(args, "O", &flow_tuples)) {
-        return NULL;
+    PyObject* fid = PyIter_Next(j);
+    if (fid == NULL || !PyLong_Check(fid)) {
+        Py_XDECREF(fid);
+        Py_DECREF(j);
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(PyExc_TypeError, "invalid flow_id");
+        }
+        return -1;
     }
+    Flow flow(PyLong_AsLong(fid));
+    Py_DECREF(fid);
 
-    // make flows
-    std::vector<Flow> flows;
-    if (flow_tuples == NULL) {
-        PyErr_SetString(PyExc_TypeError, "no flows");
-        return NULL;
+    PyObject* pyedges = PyIter_Next(j);
+    Py_DECREF(j);
+    if (pyedges == NULL) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(PyExc_TypeError, "no edges");
+        }
+        return -1;
+    }
+    PyObject* k = PyObject_GetIter(pyedges);
+    Py_DECREF(pyedges);
+    if (k == NULL) {
+        return -1;
+    }
+    std::unordered_set<long long> seen;
+    PyObject* eo;
+    while ((eo = PyIter_Next(k))) {
+        PyObject* l = PyObject_GetIter(eo);
+        Py_DECREF(eo);
+        if (l == NULL) {
+            Py_DECREF(k);
+            return -1;
+        }
+        std::vector<int> e;
+        PyObject* vo;
+        while ((vo = PyIter_Next(l))) {
+            if (!PyLong_Check(vo)) {
+                Py_DECREF(vo);
+                Py_DECREF(l);
+                Py_DECREF(k);
+                PyErr_SetString(PyExc_TypeError, "invalid graph");
+                return -1;
+            }
+            e.push_back(PyLong_AsLong(vo));
+            Py_DECREF(vo);
+        }
+        Py_DECREF(l);
+        if (e.size() != 2) {
+            Py_DECREF(k);
+            if (!PyErr_Occurred()) {
+                PyErr_SetString(PyExc_TypeError, "invalid graph");
+            }
+            return -1;
+        }
+        std::pair<int, int> edge = std::make_pair(e[0], e[1]);
+        if (seen.insert(edge_key(edge)).second) {
+            flow.edges.push_back(edge);
+        }
     }
+    Py_DECREF(k);
+    if (PyErr_Occurred()) {
+        return -1;
+    }
+    flows.push_back(flow);
+    return 0;
+}
+
+// parse an iterable of (cvid, edges)
+static int parse_flows(PyObject* flow_tuples, std::vector<Flow>& flows) {
     PyObject* i = PyObject_GetIter(flow_tuples);
     if (i == NULL) {
-        return NULL;
+        return -1;
     }
     PyObject* ftuple;
     while ((ftuple = PyIter_Next(i))) {
-        PyObject* j = PyObject_GetIter(ftuple);
-        if (j == NULL) {
-            return NULL;
+        int error = parse_flow(ftuple, flows);
+        Py_DECREF(ftuple);
+        if (error < 0) {
+            Py_DECREF(i);
+            return -1;
         }
+    }
+    Py_DECREF(i);
+    return PyErr_Occurred() ? -1 : 0;
+}
 
-        int flow_id;
-        PyObject* fid = PyIter_Next(j);
-        if (!PyLong_Check(fid)) {
-            Py_DECREF(fid);
-            PyErr_SetString(PyExc_TypeError, "invalid flow_id");
-            return NULL;
+// pairs (i, j) (i < j) of indexes of flows sharing at least one edge
+// from the inverted index: edge -> indexes of the flows using it (in increasing order)
+template <class Key>
+static std::vector<std::pair<int, int>> 
+index_to_pairs(const std::unordered_map<Key, std::vector<int>>& edge2flows) {
+    std::unordered_set<long long> seen;
+    std::vector<std::pair<int, int>> pairs;
+    for (const auto& item : edge2flows) {
+        const std::vector<int>& users = item.second;
+        for (size_t a = 0; a < users.size(); ++a) {
+            for (size_t b = a + 1; b < users.size(); ++b) {
+                std::pair<int, int> p = std::make_pair(users[a], users[b]);
+                if (seen.insert(edge_key(p)).second) {
+                    pairs.push_back(p);
+                }
+            }
         }
-        flow_id = PyLong_AsLong(fid);
-        Py_DECREF(fid);
+    }
+    return pairs;
+}
 
-        std::set<std::pair<int, int>> edges;
-        PyObject* pyedges = PyIter_Next(j);
-        PyObject* k = PyObject_GetIter(pyedges);
-        if (k == NULL) {
-            return NULL;
+static std::vector<std::pair<int, int>> crossing_pairs(const std::vector<Flow>& flows) {
+    std::unordered_map<long long, std::vector<int>> edge2flows;
+    for (size_t i = 0; i < flows.size(); ++i) {
+        for (const auto& e : flows[i].edges) {
+            edge2flows[edge_key(e)].push_back(i);
         }
-        PyObject* eo;
-        while ((eo = PyIter_Next(k))) {
-            PyObject* l = PyObject_GetIter(eo);
-            if (l == NULL) {
-                return NULL;
+    }
+    return index_to_pairs(edge2flows);
+}
+
+// conflict graph of cvids from the crossing pairs of flows (with cvids flow_cvids)
+// vertices are cvids indexed in the order of their first appearance
+static std::vector<std::vector<int>> 
+cvid_graph(const std::vector<int>& flow_cvids, 
+           const std::vector<std::pair<int, int>>& pairs, 
+           std::vector<int>& cvids, 
+           std::vector<int>& flow2vertex) {
+    std::unordered_map<int, int> cvid2vertex;
+    for (int cvid : flow_cvids) {
+        auto found = cvid2vertex.emplace(cvid, cvids.size()).first;
+        if (found->second == (int)cvids.size()) {
+            cvids.push_back(cvid);
+        }
+        flow2vertex.push_back(found->second);
+    }
+
+    std::vector<std::vector<int>> graph(cvids.size());
+    for (const auto& p : pairs) {
+        int v = flow2vertex[p.first];
+        int w = flow2vertex[p.second];
+        if (v != w) {
+            graph[v].push_back(w);
+            graph[w].push_back(v);
+        }
+    }
+    for (auto& adj : graph) {
+        std::sort(adj.begin(), adj.end());
+        adj.erase(std::unique(adj.begin(), adj.end()), adj.end());
+    }
+    return graph;
+}
+
+// greedy coloring of the vertices in the order
+static std::vector<int> greedy_coloring(const std::vector<std::vector<int>>& graph, 
+                                        const std::vector<int>& order) {
+    std::vector<int> coloring(graph.size(), -1);
+    std::vector<char> used;
+    for (int v : order) {
+        used.assign(graph[v].size() + 1, 0);
+        for (int w : graph[v]) {
+            if (coloring[w] >= 0 && coloring[w] < (int)used.size()) {
+                used[coloring[w]] = 1;
+            }
+        }
+        int color_id = 0;
+        while (used[color_id]) {
+            ++color_id;
+        }
+        coloring[v] = color_id;
+    }
+    return coloring;
+}
+
+static int color_num(const std::vector<int>& coloring) {
+    return coloring.empty() ? 0 : *std::max_element(coloring.begin(), coloring.end()) + 1;
+}
+
+// Welsh-Powell graph coloring algorithm (ties are broken by the vertex index)
+static std::vector<int> welsh_powell(const std::vector<std::vector<int>>& graph) {
+    std::vector<int> vertices(graph.size());
+    for (size_t v = 0; v < vertices.size(); ++v) {
+        vertices[v] = v;
+    }
+    std::stable_sort(vertices.begin(), vertices.end(), [&graph](int v, int w) {
+        return graph[v].size() > graph[w].size();
+    });
+    return greedy_coloring(graph, vertices);
+}
+
+// DSATUR: color the vertex with the most distinct neighbour colors first
+// (ties are broken by the degree and then by the vertex index)
+static std::vector<int> dsatur(const std::vector<std::vector<int>>& graph) {
+    size_t n = graph.size();
+    std::vector<int> coloring(n, -1);
+    std::vector<std::vector<char>> neighbour_colors(n); // [v][color] = used by adj
+    std::vector<int> saturation(n, 0);
+    std::vector<char> used;
+    for (size_t step = 0; step < n; ++step) {
+        int v = -1;
+        for (size_t u = 0; u < n; ++u) {
+            if (coloring[u] < 0 
+                && (v < 0 || saturation[u] > saturation[v] 
+                    || (saturation[u] == saturation[v] 
+                        && graph[u].size() > graph[v].size()))) {
+                v = u;
+            }
+        }
+        int color_id = 0;
+        while (color_id < (int)neighbour_colors[v].size() 
+               && neighbour_colors[v][color_id]) {
+            ++color_id;
+        }
+        coloring[v] = color_id;
+        for (int w : graph[v]) {
+            std::vector<char>& colors = neighbour_colors[w];
+            if ((int)colors.size() <= color_id) {
+                colors.resize(color_id + 1, 0);
             }
-            std::vector<int> e;
-            PyObject* vo;
-            while ((vo = PyIter_Next(l))) {
-                if (!PyLong_Check(vo)) {
-                    Py_DECREF(vo);
-                    PyErr_SetString(PyExc_TypeError, "invalid graph");
-                    return NULL;
+            if (!colors[color_id]) {
+                colors[color_id] = 1;
+                ++saturation[w];
+            }
+        }
+    }
+    return coloring;
+}
+
+// RLF (recursive largest first): build one color class at a time
+static std::vector<int> rlf(const std::vector<std::vector<int>>& graph) {
+    size_t n = graph.size();
+    std::vector<int> coloring(n, -1);
+    // state: 0 = uncolored candidate, 1 = uncolored but adjacent to the class, 
+    //        2 = colored
+    std::vector<char> state(n, 0);
+    size_t colored = 0;
+    for (int color_id = 0; colored < n; ++color_id) {
+        for (size_t v = 0; v < n; ++v) {
+            if (state[v] == 1) {
+                state[v] = 0;
+            }
+        }
+        // the first vertex has the most uncolored neighbours
+        std::vector<int> deg_u(n, 0); // # of neighbours in the candidates
+        std::vector<int> deg_w(n, 0); // # of neighbours adjacent to the class
+        int v = -1;
+        for (size_t u = 0; u < n; ++u) {
+            if (state[u] != 0) {
+                continue;
+            }
+            for (int w : graph[u]) {
+                if (state[w] == 0) {
+                    ++deg_u[u];
+                }
+            }
+            if (v < 0 || deg_u[u] > deg_u[v]) {
+                v = u;
+            }
+        }
+        while (v >= 0) {
+            coloring[v] = color_id;
+            state[v] = 2;
+            ++colored;
+            for (int w : graph[v]) {
+                if (state[w] == 0) {
+                    state[w] = 1;
+                    for (int x : graph[w]) {
+                        --deg_u[x];
+                        ++deg_w[x];
+                    }
+                }
+            }
+            for (int w : graph[v]) {
+                --deg_u[w];
+            }
+            // the next vertex has the most neighbours adjacent to the class
+            // (ties are broken by the fewest neighbours in the candidates)
+            v = -1;
+            for (size_t u = 0; u < n; ++u) {
+                if (state[u] == 0 
+                    && (v < 0 || deg_w[u] > deg_w[v] 
+                        || (deg_w[u] == deg_w[v] && deg_u[u] < deg_u[v]))) {
+                    v = u;
                 }
-                e.push_back(PyLong_AsLong(vo));
-                Py_DECREF(vo);
             }
-            assert(e.size() == 2);
-            edges.insert(std::make_pair(e[0], e[1]));
-            Py_DECREF(l);
-            Py_DECREF(eo);
         }
-        Py_DECREF(k);
-        Py_DECREF(pyedges);
-        
-        Flow flow(flow_id, edges);
-        flows.push_back(flow);
+    }
+    return coloring;
+}
 
-        Py_DECREF(j);
-        Py_DECREF(ftuple);
+// the best of Welsh-Powell and (trials - 1) random orders
+static std::vector<int> random_orders(const std::vector<std::vector<int>>& graph, 
+                                      int trials, 
+                                      unsigned long seed) {
+    std::vector<int> best = welsh_powell(graph);
+    int best_num = color_num(best);
+    std::mt19937 rng(seed);
+    std::vector<int> order(graph.size());
+    for (size_t v = 0; v < order.size(); ++v) {
+        order[v] = v;
+    }
+    for (int t = 1; t < trials; ++t) {
+        std::shuffle(order.begin(), order.end(), rng);
+        std::vector<int> coloring = greedy_coloring(graph, order);
+        int num = color_num(coloring);
+        if (num < best_num) {
+            best.swap(coloring);
+            best_num = num;
+        }
+    }
+    return best;
+}
+
+// a large clique found greedily from each vertex (a lower bound of the # of colors)
+static std::vector<int> greedy_clique(const std::vector<std::vector<int>>& graph) {
+    std::vector<int> best;
+    for (size_t v = 0; v < graph.size(); ++v) {
+        if (graph[v].size() + 1 <= best.size()) {
+            continue;
+        }
+        // add the neighbours of v in decreasing order of the degree
+        std::vector<int> candidates(graph[v]);
+        std::stable_sort(candidates.begin(), candidates.end(), [&graph](int u, int w) {
+            return graph[u].size() > graph[w].size();
+        });
+        std::vector<int> clique(1, v);
+        for (int u : candidates) {
+            bool adjacent = true;
+            for (int w : clique) {
+                if (!std::binary_search(graph[u].begin(), graph[u].end(), w)) {
+                    adjacent = false;
+                    break;
+                }
+            }
+            if (adjacent) {
+                clique.push_back(u);
+            }
+        }
+        if (clique.size() > best.size()) {
+            best.swap(clique);
+        }
+    }
+    return best;
+}
+
+// branch and bound exact coloring with DSATUR branching
+// (the adjacency lists must be sorted)
+class ExactColoring {
+public:
+    const std::vector<std::vector<int>>& graph;
+    long long node_limit; // <= 0: unlimited
+    double time_limit; // <= 0: unlimited
+    std::vector<int> best; // the best coloring so far
+    int best_num;
+    int lower_bound;
+    long long nodes = 0;
+    bool aborted = false;
+
+    ExactColoring(const std::vector<std::vector<int>>& g, long long nl, double tl)
+    : graph(g), node_limit(nl), time_limit(tl) { }
+
+    // the coloring is optimal if the search is not aborted
+    bool solve() {
+        start = std::chrono::steady_clock::now();
+        size_t n = graph.size();
+        best = dsatur(graph);
+        best_num = color_num(best);
+        std::vector<int> clique = greedy_clique(graph);
+        lower_bound = clique.size();
+        if (best_num <= lower_bound) {
+            return true;
+        }
+
+        // the vertices of the clique are colored in advance (symmetry breaking)
+        coloring.assign(n, -1);
+        counts.assign(n, std::vector<int>(best_num, 0));
+        saturation.assign(n, 0);
+        for (size_t c = 0; c < clique.size(); ++c) {
+            assign(clique[c], c);
+        }
+        search(clique.size(), clique.size());
+        return !aborted;
+    }
+
+private:
+    std::chrono::steady_clock::time_point start;
+    std::vector<int> coloring; // -1: uncolored
+    std::vector<std::vector<int>> counts; // [v][color] = # of neighbours of the color
+    std::vector<int> saturation;
+
+    void assign(int v, int color_id) {
+        coloring[v] = color_id;
+        for (int w : graph[v]) {
+            if (counts[w][color_id]++ == 0) {
+                ++saturation[w];
+            }
+        }
+    }
+
+    void unassign(int v) {
+        int color_id = coloring[v];
+        coloring[v] = -1;
+        for (int w : graph[v]) {
+            if (--counts[w][color_id] == 0) {
+                --saturation[w];
+            }
+        }
+    }
+
+    bool over_budget() {
+        ++nodes;
+        if (node_limit > 0 && nodes > node_limit) {
+            return true;
+        }
+        if (time_limit > 0 && (nodes & 1023) == 0) {
+            std::chrono::duration<double> elapsed 
+            = std::chrono::steady_clock::now() - start;
+            return elapsed.count() > time_limit;
+        }
+        return false;
+    }
+
+    void search(size_t colored, int used) {
+        if (used >= best_num || best_num <= lower_bound || aborted) {
+            return;
+        }
+        if (over_budget()) {
+            aborted = true;
+            return;
+        }
+        if (colored == graph.size()) {
+            best = coloring;
+            best_num = used;
+            return;
+        }
+
+        // the uncolored vertex with the most distinct neighbour colors
+        int v = -1;
+        for (size_t u = 0; u < graph.size(); ++u) {
+            if (coloring[u] < 0 
+                && (v < 0 || saturation[u] > saturation[v] 
+                    || (saturation[u] == saturation[v] 
+                        && graph[u].size() > graph[v].size()))) {
+                v = u;
+            }
+        }
+
+        // the used colors and then a new color
+        for (int color_id = 0; color_id <= used && color_id + 1 < best_num; ++color_id) {
+            if (counts[v][color_id] == 0) {
+                assign(v, color_id);
+                search(colored + 1, std::max(used, color_id + 1));
+                unassign(v);
+                if (used >= best_num || best_num <= lower_bound || aborted) {
+                    return;
+                }
+            }
+        }
+    }
+};
+
+// calls, seconds and total # of colors for each strategy
+class ColoringStat {
+public:
+    long long calls = 0;
+    double seconds = 0.0;
+    long long colors = 0;
+};
+static std::unordered_map<std::string, ColoringStat> coloring_stats;
+
+// coloring strategies
+enum Strategy { WELSH_POWELL, DSATUR, RLF, RANDOM, STRATEGY_NUM };
+static const char* strategy_names[STRATEGY_NUM] = {"welsh_powell", "dsatur", "rlf", "random"};
+
+// id of the strategy (-1 with ValueError if the strategy or trials is invalid)
+static int parse_strategy(const char* strategy, int trials) {
+    for (int id = 0; id < STRATEGY_NUM; ++id) {
+        if (strcmp(strategy, strategy_names[id]) == 0) {
+            if (id == RANDOM && trials < 1) {
+                PyErr_SetString(PyExc_ValueError, "trials must be a natural number.");
+                return -1;
+            }
+            return id;
+        }
+    }
+    PyErr_Format(PyExc_ValueError, "'%s' is an invalid strategy.", strategy);
+    return -1;
+}
+
+// color the graph by the strategy and return the elapsed seconds
+// (no Python API is used, so that this can run without the GIL)
+static double color_graph(const std::vector<std::vector<int>>& graph, 
+                          int strategy, 
+                          int trials, 
+                          unsigned long seed, 
+                          std::vector<int>& coloring) {
+    auto start = std::chrono::steady_clock::now();
+    switch (strategy) {
+    case DSATUR:
+        coloring = dsatur(graph);
+        break;
+    case RLF:
+        coloring = rlf(graph);
+        break;
+    case RANDOM:
+        coloring = random_orders(graph, trials, seed);
+        break;
+    default:
+        coloring = welsh_powell(graph);
+    }
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+    return elapsed.count();
+}
+
+// record the statistics of a coloring (with the GIL)
+static void record_coloring(const char* name, 
+                            double seconds, 
+                            const std::vector<int>& coloring) {
+    ColoringStat& stat = coloring_stats[name];
+    stat.calls += 1;
+    stat.seconds += seconds;
+    stat.colors += color_num(coloring);
+}
+
+static PyObject* cpp_slot_allocation_stats(PyObject*, PyObject* args) {
+    int reset = 0;
+    if (!PyArg_ParseTuple(args, "|p", &reset)) {
+        return NULL;
+    }
+    PyObject* stats = PyDict_New();
+    if (stats == NULL) {
+        return NULL;
+    }
+    for (const auto& item : coloring_stats) {
+        PyObject* value = Py_BuildValue("(LdL)", item.second.calls, 
+                                        item.second.seconds, item.second.colors);
+        if (value == NULL || PyDict_SetItemString(stats, item.first.c_str(), value) < 0) {
+            Py_XDECREF(value);
+            Py_DECREF(stats);
+            return NULL;
+        }
+        Py_DECREF(value);
+    }
+    if (reset) {
+        coloring_stats.clear();
+    }
+    return stats;
+}
+
+// {cvids[v]: coloring[v]}
+static PyObject* coloring_to_dict(const std::vector<int>& cvids, 
+                                  const std::vector<int>& coloring) {
+    PyObject* pycoloring = PyDict_New();
+    if (pycoloring == NULL) {
+        return NULL;
+    }
+    for (size_t v = 0; v < cvids.size(); ++v) {
+        PyObject* key = PyLong_FromLong(cvids[v]);
+        PyObject* value = PyLong_FromLong(coloring[v]);
+        if (key == NULL || value == NULL || PyDict_SetItem(pycoloring, key, value) < 0) {
+            Py_XDECREF(key);
+            Py_XDECREF(value);
+            Py_DECREF(pycoloring);
+            return NULL;
+        }
+        Py_DECREF(key);
+        Py_DECREF(value);
+    }
+    return pycoloring;
+}
+
+static PyObject* cpp_crossing_flows(PyObject*, PyObject* args) {
+    PyObject* flow_tuples = NULL;
+    if (!PyArg_ParseTuple(args, "O", &flow_tuples)) {
+        return NULL;
+    }
+
+    // make flows
+    std::vector<Flow> flows;
+    if (parse_flows(flow_tuples, flows) < 0) {
+        return NULL;
     }
-    Py_DECREF(i);
+
+    std::vector<std::pair<int, int>> pairs;
+    Py_BEGIN_ALLOW_THREADS
+    pairs = crossing_pairs(flows);
+    Py_END_ALLOW_THREADS
 
     // create edge set
     PyObject* crossings = PySet_New(NULL);
-    std::vector<Flow>::iterator i_iter, j_iter;
-    for (i_iter = flows.begin(); i_iter != flows.end(); ++i_iter) {
-        for (j_iter = std::next(i_iter); j_iter != flows.end(); ++j_iter) {
-            std::set<std::pair<int, int>> intersection_set, i_set, j_set;
-            i_set = i_iter->edges;
-            j_set = j_iter->edges;
-            std::set_intersection(i_set.begin(), i_set.end(), 
-                                  j_set.begin(), j_set.end(), 
-                                  std::inserter(intersection_set, intersection_set.end()));
-            if (intersection_set.size()) {
-                PySet_Add(crossings, Py_BuildValue("(ii)", i_iter->cvid, j_iter->cvid));
-            }
+    if (crossings == NULL) {
+        return NULL;
+    }
+    for (const auto& p : pairs) {
+        PyObject* edge = Py_BuildValue("(ii)", flows[p.first].cvid, flows[p.second].cvid);
+        if (edge == NULL || PySet_Add(crossings, edge) < 0) {
+            Py_XDECREF(edge);
+            Py_DECREF(crossings);
+            return NULL;
         }
+        Py_DECREF(edge);
     }
 
     return crossings;
@@ -125,292 +642,989 @@ static PyObject* cpp_crossings_for_a_flow(PyObject*, PyObject* args) {
         return NULL;
     }
 
-    // make target_flow
-    Flow* target_flow;
-    if (target_flow_tuple == NULL) {
-        PyErr_SetString(PyExc_TypeError, "no flows");
+    // make target_flow and flows
+    std::vector<Flow> target;
+    std::vector<Flow> flows;
+    if (parse_flow(target_flow_tuple, target) < 0 || parse_flows(flow_tuples, flows) < 0) {
         return NULL;
     }
-    PyObject* i = PyObject_GetIter(target_flow_tuple);
-    if (i == NULL) {
+
+    // create crossing flow_id set
+    std::unordered_set<int> crossings;
+    Py_BEGIN_ALLOW_THREADS
+    std::unordered_set<long long> target_edges;
+    for (const auto& e : target[0].edges) {
+        target_edges.insert(edge_key(e));
+    }
+    for (const auto& flow : flows) {
+        if (target[0].cvid == flow.cvid || crossings.count(flow.cvid)) {
+            continue;
+        }
+        for (const auto& e : flow.edges) {
+            if (target_edges.count(edge_key(e))) {
+                crossings.insert(flow.cvid);
+                break;
+            }
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    return Py_BuildValue("i", crossings.size());
+}
+
+static PyObject* cpp_slot_allocation(PyObject*, PyObject* args, PyObject* kwargs) {
+    static const char* keywords[] = {"flows", "strategy", "trials", "seed", NULL};
+    PyObject* flow_tuples = NULL;
+    const char* strategy = "welsh_powell";
+    int trials = 16;
+    unsigned long seed = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|sik", (char**)keywords, 
+                                     &flow_tuples, &strategy, &trials, &seed)) {
         return NULL;
     }
 
-    int flow_id;
-    PyObject* fid = PyIter_Next(i);
-    if (!PyLong_Check(fid)) {
-        Py_DECREF(fid);
-        PyErr_SetString(PyExc_TypeError, "invalid flow_id");
+    int strategy_id = parse_strategy(strategy, trials);
+    if (strategy_id < 0) {
         return NULL;
     }
-    flow_id = PyLong_AsLong(fid);
-    Py_DECREF(fid);
 
-    std::set<std::pair<int, int>> edges;
-    PyObject* pyedges = PyIter_Next(i);
-    PyObject* j = PyObject_GetIter(pyedges);
-    if (j == NULL) {
+    // make flows
+    std::vector<Flow> flows;
+    if (parse_flows(flow_tuples, flows) < 0) {
         return NULL;
     }
-    PyObject* eo;
-    while ((eo = PyIter_Next(j))) {
-        PyObject* k = PyObject_GetIter(eo);
-        if (k == NULL) {
-            return NULL;
+
+    // create graph and color it
+    std::vector<int> flow_cvids, cvids, flow2vertex, coloring;
+    double seconds;
+    Py_BEGIN_ALLOW_THREADS
+    for (const auto& flow : flows) {
+        flow_cvids.push_back(flow.cvid);
+    }
+    std::vector<std::vector<int>> graph 
+    = cvid_graph(flow_cvids, crossing_pairs(flows), cvids, flow2vertex);
+    seconds = color_graph(graph, strategy_id, trials, seed, coloring);
+    Py_END_ALLOW_THREADS
+
+    record_coloring(strategy_names[strategy_id], seconds, coloring);
+    return coloring_to_dict(cvids, coloring);
+}
+
+class ExactResult {
+public:
+    std::vector<int> coloring;
+    bool proven;
+    int lower_bound; // the size of the clique found
+    double seconds;
+};
+
+static ExactResult exact_coloring(const std::vector<std::vector<int>>& graph, 
+                                  double time_limit, 
+                                  long long node_limit) {
+    auto start = std::chrono::steady_clock::now();
+    ExactColoring solver(graph, node_limit, time_limit);
+    ExactResult result;
+    result.proven = solver.solve();
+    result.lower_bound = solver.lower_bound;
+    result.coloring.swap(solver.best);
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+    result.seconds = elapsed.count();
+    return result;
+}
+
+// ({cvid: color}, proven, lower_bound) (with the GIL)
+static PyObject* exact_result(const std::vector<int>& cvids, const ExactResult& result) {
+    record_coloring("exact", result.seconds, result.coloring);
+    PyObject* coloring = coloring_to_dict(cvids, result.coloring);
+    if (coloring == NULL) {
+        return NULL;
+    }
+    return Py_BuildValue("(NOi)", coloring, result.proven ? Py_True : Py_False, 
+                         result.lower_bound);
+}
+
+static PyObject* cpp_exact_slot_allocation(PyObject*, PyObject* args, PyObject* kwargs) {
+    static const char* keywords[] = {"flows", "time_limit", "node_limit", NULL};
+    PyObject* flow_tuples = NULL;
+    double time_limit = 0.0;
+    long long node_limit = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|dL", (char**)keywords, 
+                                     &flow_tuples, &time_limit, &node_limit)) {
+        return NULL;
+    }
+    std::vector<Flow> flows;
+    if (parse_flows(flow_tuples, flows) < 0) {
+        return NULL;
+    }
+
+    std::vector<int> flow_cvids, cvids, flow2vertex;
+    ExactResult result;
+    Py_BEGIN_ALLOW_THREADS
+    for (const auto& flow : flows) {
+        flow_cvids.push_back(flow.cvid);
+    }
+    std::vector<std::vector<int>> graph 
+    = cvid_graph(flow_cvids, crossing_pairs(flows), cvids, flow2vertex);
+    result = exact_coloring(graph, time_limit, node_limit);
+    Py_END_ALLOW_THREADS
+
+    return exact_result(cvids, result);
+}
+
+//----------------------------------------------------------------------------------------
+// CSR variants: flows are given as int32 buffers (e.g. numpy arrays) of
+// cvids[i], flow_offsets[i] (n + 1 items) and edge_ids[flow_offsets[i]:flow_offsets[i+1]]
+// and the results are numpy arrays
+//----------------------------------------------------------------------------------------
+class Int32Buffer {
+public:
+    Py_buffer view;
+    bool acquired = false;
+    const int* data = NULL;
+    Py_ssize_t size = 0;
+
+    ~Int32Buffer() {
+        if (acquired) {
+            PyBuffer_Release(&view);
         }
-        std::vector<int> e;
-        PyObject* vo;
-        while ((vo = PyIter_Next(k))) {
-            if (!PyLong_Check(vo)) {
-                Py_DECREF(vo);
-                PyErr_SetString(PyExc_TypeError, "invalid graph");
-                return NULL;
+    }
+
+    int get(PyObject* obj, const char* name) {
+        if (PyObject_GetBuffer(obj, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+            return -1;
+        }
+        acquired = true;
+        const char* format = view.format == NULL ? "B" : view.format;
+        if (format[0] == '@' || format[0] == '=' || format[0] == '<') {
+            ++format;
+        }
+        if (view.itemsize != sizeof(int) || (strcmp(format, "i") && strcmp(format, "l"))) {
+            PyErr_Format(PyExc_TypeError, "%s must be a contiguous int32 array.", name);
+            return -1;
+        }
+        data = (const int*)view.buf;
+        size = view.len / view.itemsize;
+        return 0;
+    }
+};
+
+class CSRFlows {
+public:
+    Int32Buffer cvids;
+    Int32Buffer offsets;
+    Int32Buffer edge_ids;
+
+    Py_ssize_t size() const {
+        return cvids.size;
+    }
+
+    const int* begin(Py_ssize_t i) const {
+        return edge_ids.data + offsets.data[i];
+    }
+
+    const int* end(Py_ssize_t i) const {
+        return edge_ids.data + offsets.data[i + 1];
+    }
+
+    int get(PyObject* cvids_obj, PyObject* offsets_obj, PyObject* edge_ids_obj) {
+        if (cvids.get(cvids_obj, "cvids") < 0 
+            || offsets.get(offsets_obj, "flow_offsets") < 0 
+            || edge_ids.get(edge_ids_obj, "edge_ids") < 0) {
+            return -1;
+        }
+        if (offsets.size != cvids.size + 1 || offsets.data[0] != 0 
+            || offsets.data[cvids.size] != edge_ids.size) {
+            PyErr_SetString(PyExc_ValueError, "invalid flow_offsets");
+            return -1;
+        }
+        for (Py_ssize_t i = 0; i < cvids.size; ++i) {
+            if (offsets.data[i] > offsets.data[i + 1]) {
+                PyErr_SetString(PyExc_ValueError, "invalid flow_offsets");
+                return -1;
             }
-            e.push_back(PyLong_AsLong(vo));
-            Py_DECREF(vo);
         }
-        assert(e.size() == 2);
-        edges.insert(std::make_pair(e[0], e[1]));
-        Py_DECREF(k);
-        Py_DECREF(eo);
+        return 0;
     }
-    target_flow = new Flow(flow_id, edges);
-    Py_DECREF(j);
-    Py_DECREF(pyedges);
 
-    Py_DECREF(i);
+    std::vector<std::pair<int, int>> crossing_pairs() const {
+        std::unordered_map<int, std::vector<int>> edge2flows;
+        for (Py_ssize_t i = 0; i < size(); ++i) {
+            for (const int* e = begin(i); e != end(i); ++e) {
+                std::vector<int>& users = edge2flows[*e];
+                if (users.empty() || users.back() != (int)i) { // duplicated edge ids
+                    users.push_back((int)i);
+                }
+            }
+        }
+        return index_to_pairs(edge2flows);
+    }
+};
 
-    // make flows
-    std::vector<Flow> flows;
-    if (flow_tuples == NULL) {
-        PyErr_SetString(PyExc_TypeError, "no flows");
+// numpy.frombuffer(values, dtype=int32).reshape(-1, columns)
+static PyObject* to_ndarray(const std::vector<int>& values, int columns) {
+    static PyObject* numpy = NULL;
+    if (numpy == NULL) {
+        numpy = PyImport_ImportModule("numpy");
+        if (numpy == NULL) {
+            return NULL;
+        }
+    }
+    PyObject* buffer = PyByteArray_FromStringAndSize((const char*)values.data(), 
+                                                     values.size() * sizeof(int));
+    if (buffer == NULL) {
         return NULL;
     }
-    i = PyObject_GetIter(flow_tuples);
-    if (i == NULL) {
+    PyObject* array = PyObject_CallMethod(numpy, "frombuffer", "Os", buffer, "int32");
+    Py_DECREF(buffer);
+    if (array == NULL || columns == 1) {
+        return array;
+    }
+    PyObject* reshaped = PyObject_CallMethod(array, "reshape", "(ii)", -1, columns);
+    Py_DECREF(array);
+    return reshaped;
+}
+
+static PyObject* cpp_crossing_flows_csr(PyObject*, PyObject* args) {
+    PyObject *cvids_obj, *offsets_obj, *edge_ids_obj;
+    if (!PyArg_ParseTuple(args, "OOO", &cvids_obj, &offsets_obj, &edge_ids_obj)) {
+        return NULL;
+    }
+    CSRFlows flows;
+    if (flows.get(cvids_obj, offsets_obj, edge_ids_obj) < 0) {
         return NULL;
     }
-    PyObject* ftuple;
-    while ((ftuple = PyIter_Next(i))) {
-        PyObject* j = PyObject_GetIter(ftuple);
-        if (j == NULL) {
-            return NULL;
-        }
 
-        int flow_id;
-        PyObject* fid = PyIter_Next(j);
-        if (!PyLong_Check(fid)) {
-            Py_DECREF(fid);
-            PyErr_SetString(PyExc_TypeError, "invalid flow_id");
-            return NULL;
+    // (cvid, cvid) pairs without duplication
+    std::vector<int> crossings;
+    Py_BEGIN_ALLOW_THREADS
+    std::unordered_set<long long> seen;
+    for (const auto& p : flows.crossing_pairs()) {
+        std::pair<int, int> c(flows.cvids.data[p.first], flows.cvids.data[p.second]);
+        if (seen.insert(edge_key(c)).second) {
+            crossings.push_back(c.first);
+            crossings.push_back(c.second);
         }
-        flow_id = PyLong_AsLong(fid);
-        Py_DECREF(fid);
+    }
+    Py_END_ALLOW_THREADS
+    return to_ndarray(crossings, 2);
+}
 
-        std::set<std::pair<int, int>> edges;
-        PyObject* pyedges = PyIter_Next(j);
-        PyObject* k = PyObject_GetIter(pyedges);
-        if (k == NULL) {
-            return NULL;
+static PyObject* cpp_crossings_for_a_flow_csr(PyObject*, PyObject* args) {
+    int target_cvid;
+    PyObject *target_obj, *cvids_obj, *offsets_obj, *edge_ids_obj;
+    if (!PyArg_ParseTuple(args, "iOOOO", &target_cvid, &target_obj, 
+                          &cvids_obj, &offsets_obj, &edge_ids_obj)) {
+        return NULL;
+    }
+    Int32Buffer target;
+    CSRFlows flows;
+    if (target.get(target_obj, "target_edge_ids") < 0 
+        || flows.get(cvids_obj, offsets_obj, edge_ids_obj) < 0) {
+        return NULL;
+    }
+    std::unordered_set<int> crossings;
+    Py_BEGIN_ALLOW_THREADS
+    std::unordered_set<int> target_edges(target.data, target.data + target.size);
+    for (Py_ssize_t i = 0; i < flows.size(); ++i) {
+        int cvid = flows.cvids.data[i];
+        if (cvid == target_cvid || crossings.count(cvid)) {
+            continue;
         }
-        PyObject* eo;
-        while ((eo = PyIter_Next(k))) {
-            PyObject* l = PyObject_GetIter(eo);
-            if (l == NULL) {
-                return NULL;
+        for (const int* e = flows.begin(i); e != flows.end(i); ++e) {
+            if (target_edges.count(*e)) {
+                crossings.insert(cvid);
+                break;
             }
-            std::vector<int> e;
-            PyObject* vo;
-            while ((vo = PyIter_Next(l))) {
-                if (!PyLong_Check(vo)) {
-                    Py_DECREF(vo);
-                    PyErr_SetString(PyExc_TypeError, "invalid graph");
-                    return NULL;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    return Py_BuildValue("i", crossings.size());
+}
+
+static PyObject* cpp_slot_allocation_csr(PyObject*, PyObject* args, PyObject* kwargs) {
+    static const char* keywords[] = {"cvids", "flow_offsets", "edge_ids", 
+                                     "strategy", "trials", "seed", NULL};
+    PyObject *cvids_obj, *offsets_obj, *edge_ids_obj;
+    const char* strategy = "welsh_powell";
+    int trials = 16;
+    unsigned long seed = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|sik", (char**)keywords, 
+                                     &cvids_obj, &offsets_obj, &edge_ids_obj, 
+                                     &strategy, &trials, &seed)) {
+        return NULL;
+    }
+    int strategy_id = parse_strategy(strategy, trials);
+    CSRFlows flows;
+    if (strategy_id < 0 || flows.get(cvids_obj, offsets_obj, edge_ids_obj) < 0) {
+        return NULL;
+    }
+
+    std::vector<int> cvids, flow2vertex, coloring, slots;
+    double seconds;
+    Py_BEGIN_ALLOW_THREADS
+    std::vector<int> flow_cvids(flows.cvids.data, flows.cvids.data + flows.size());
+    std::vector<std::vector<int>> graph 
+    = cvid_graph(flow_cvids, flows.crossing_pairs(), cvids, flow2vertex);
+    seconds = color_graph(graph, strategy_id, trials, seed, coloring);
+
+    // slot_id of each flow
+    for (int v : flow2vertex) {
+        slots.push_back(coloring[v]);
+    }
+    Py_END_ALLOW_THREADS
+
+    record_coloring(strategy_names[strategy_id], seconds, coloring);
+    return to_ndarray(slots, 1);
+}
+
+//----------------------------------------------------------------------------------------
+// FlowSet: the conflict graph of flows kept resident across calls
+//----------------------------------------------------------------------------------------
+class FlowState {
+public:
+    int cvid;
+    long long order; // flows are ordered by the time they were added first
+    std::vector<int> edges; // sorted edge ids
+    std::unordered_map<int, int> adj; // other flow_id -> # of edges shared with it
+
+    FlowState(int c, long long o): cvid(c), order(o) { }
+};
+
+class FlowSetData {
+public:
+    std::unordered_map<int, FlowState> flows; // flow_id -> state
+    std::unordered_map<int, std::vector<int>> edge2flows; // edge id -> flow_ids
+    long long next_order = 0;
+
+    void update(int flow_id, int cvid, std::vector<int>& edges) {
+        std::sort(edges.begin(), edges.end());
+        edges.erase(std::unique(edges.begin(), edges.end()), edges.end());
+
+        auto found = flows.find(flow_id);
+        if (found == flows.end()) {
+            found = flows.emplace(flow_id, FlowState(cvid, next_order++)).first;
+        }
+        FlowState& flow = found->second;
+        flow.cvid = cvid;
+
+        // edges no longer used by the flow
+        std::vector<int> removed, added;
+        std::set_difference(flow.edges.begin(), flow.edges.end(), 
+                            edges.begin(), edges.end(), std::back_inserter(removed));
+        for (int e : removed) {
+            std::vector<int>& users = edge2flows[e];
+            users.erase(std::find(users.begin(), users.end(), flow_id));
+            for (int other : users) {
+                std::unordered_map<int, int>& other_adj = flows.at(other).adj;
+                if (--flow.adj[other] == 0) {
+                    flow.adj.erase(other);
+                    other_adj.erase(flow_id);
+                } else {
+                    --other_adj[flow_id];
                 }
-                e.push_back(PyLong_AsLong(vo));
-                Py_DECREF(vo);
             }
-            assert(e.size() == 2);
-            edges.insert(std::make_pair(e[0], e[1]));
-            Py_DECREF(l);
-            Py_DECREF(eo);
+            if (users.empty()) {
+                edge2flows.erase(e);
+            }
         }
-        Py_DECREF(k);
-        Py_DECREF(pyedges);
-        
-        Flow flow(flow_id, edges);
-        flows.push_back(flow);
 
-        Py_DECREF(j);
-        Py_DECREF(ftuple);
+        // edges newly used by the flow
+        std::set_difference(edges.begin(), edges.end(), 
+                            flow.edges.begin(), flow.edges.end(), std::back_inserter(added));
+        for (int e : added) {
+            std::vector<int>& users = edge2flows[e];
+            for (int other : users) {
+                ++flow.adj[other];
+                ++flows.at(other).adj[flow_id];
+            }
+            users.push_back(flow_id);
+        }
+
+        flow.edges.swap(edges);
     }
-    Py_DECREF(i);
 
-    // create crossing flow_id set
-    std::unordered_set<int> crossings;
-    std::vector<Flow>::iterator iter;
-    for (iter = flows.begin(); iter != flows.end(); ++iter) {
-        if (target_flow->cvid != iter->cvid) {
-            std::set<std::pair<int, int>> intersection_set;
-            std::set_intersection((target_flow->edges).begin(), (target_flow->edges).end(), 
-                                  (iter->edges).begin(), (iter->edges).end(), 
-                                  std::inserter(intersection_set, intersection_set.end()));
-            if (intersection_set.size()) {
-                crossings.insert(iter->cvid);
+    void remove(int flow_id) {
+        std::vector<int> empty;
+        update(flow_id, flows.at(flow_id).cvid, empty);
+        flows.erase(flow_id);
+    }
+
+    // conflict graph of cvids (indexed in the order of the flows)
+    std::vector<std::vector<int>> cvid_graph(std::vector<int>& cvids) const {
+        std::unordered_map<int, int> cvid2vertex;
+        for (int flow_id : ordered_flow_ids()) {
+            int cvid = flows.at(flow_id).cvid;
+            if (cvid2vertex.emplace(cvid, cvids.size()).second) {
+                cvids.push_back(cvid);
+            }
+        }
+
+        // adjacency lists of cvids
+        std::vector<std::vector<int>> graph(cvids.size());
+        for (const auto& item : flows) {
+            int v = cvid2vertex[item.second.cvid];
+            for (const auto& adj_item : item.second.adj) {
+                int w = cvid2vertex[flows.at(adj_item.first).cvid];
+                if (v != w) {
+                    graph[v].push_back(w);
+                }
             }
         }
+        for (auto& adj : graph) {
+            std::sort(adj.begin(), adj.end());
+            adj.erase(std::unique(adj.begin(), adj.end()), adj.end());
+        }
+        return graph;
     }
 
-    return Py_BuildValue("i", crossings.size());
+    // flow_ids sorted by the order
+    std::vector<int> ordered_flow_ids() const {
+        std::vector<std::pair<long long, int>> items;
+        for (const auto& item : flows) {
+            items.push_back(std::make_pair(item.second.order, item.first));
+        }
+        std::sort(items.begin(), items.end());
+        std::vector<int> flow_ids;
+        for (const auto& item : items) {
+            flow_ids.push_back(item.second);
+        }
+        return flow_ids;
+    }
+};
+
+// the data is read without the GIL under a shared lock of mutex
+// and modified with the GIL under an exclusive lock of it
+typedef struct {
+    PyObject_HEAD
+    FlowSetData* data;
+    std::shared_mutex* mutex;
+} FlowSetObject;
+
+typedef std::shared_lock<std::shared_mutex> ReadLock;
+typedef std::unique_lock<std::shared_mutex> WriteLock;
+
+static int parse_int_list(PyObject* iterable, std::vector<int>& values) {
+    PyObject* it = PyObject_GetIter(iterable);
+    if (it == NULL) {
+        return -1;
+    }
+    PyObject* item;
+    while ((item = PyIter_Next(it))) {
+        long value = PyLong_AsLong(item);
+        Py_DECREF(item);
+        if (value == -1 && PyErr_Occurred()) {
+            Py_DECREF(it);
+            return -1;
+        }
+        values.push_back(value);
+    }
+    Py_DECREF(it);
+    return PyErr_Occurred() ? -1 : 0;
 }
 
-static PyObject* cpp_slot_allocation(PyObject*, PyObject* args) {
-    PyObject* flow_tuples = NULL;
-    if (!PyArg_ParseTuple(args, "O", &flow_tuples)) {
+static PyObject* FlowSet_new(PyTypeObject* type, PyObject*, PyObject*) {
+    FlowSetObject* self = (FlowSetObject*)type->tp_alloc(type, 0);
+    if (self != NULL) {
+        self->data = new FlowSetData();
+        self->mutex = new std::shared_mutex();
+    }
+    return (PyObject*)self;
+}
+
+static void FlowSet_dealloc(FlowSetObject* self) {
+    PyTypeObject* type = Py_TYPE(self);
+    delete self->data;
+    delete self->mutex;
+    type->tp_free((PyObject*)self);
+    Py_DECREF(type);
+}
+
+static FlowState* FlowSet_get(FlowSetObject* self, int flow_id) {
+    auto found = self->data->flows.find(flow_id);
+    if (found == self->data->flows.end()) {
+        PyObject* key = PyLong_FromLong(flow_id);
+        PyErr_SetObject(PyExc_KeyError, key);
+        Py_XDECREF(key);
         return NULL;
     }
+    return &found->second;
+}
 
-    // make flows
-    std::vector<Flow> flows;
-    if (flow_tuples == NULL) {
-        PyErr_SetString(PyExc_TypeError, "no flows");
+static PyObject* FlowSet_update(FlowSetObject* self, PyObject* args) {
+    int flow_id, cvid;
+    PyObject* pyedges;
+    if (!PyArg_ParseTuple(args, "iiO", &flow_id, &cvid, &pyedges)) {
         return NULL;
     }
-    PyObject* i = PyObject_GetIter(flow_tuples);
-    if (i == NULL) {
+    std::vector<int> edges;
+    if (parse_int_list(pyedges, edges) < 0) {
         return NULL;
     }
-    PyObject* ftuple;
-    while ((ftuple = PyIter_Next(i))) {
-        PyObject* j = PyObject_GetIter(ftuple);
-        if (j == NULL) {
+    WriteLock lock(*self->mutex);
+    self->data->update(flow_id, cvid, edges);
+    Py_RETURN_NONE;
+}
+
+static PyObject* FlowSet_set_cvid(FlowSetObject* self, PyObject* args) {
+    int flow_id, cvid;
+    if (!PyArg_ParseTuple(args, "ii", &flow_id, &cvid)) {
+        return NULL;
+    }
+    FlowState* flow = FlowSet_get(self, flow_id);
+    if (flow == NULL) {
+        return NULL;
+    }
+    WriteLock lock(*self->mutex);
+    flow->cvid = cvid;
+    Py_RETURN_NONE;
+}
+
+static PyObject* FlowSet_remove(FlowSetObject* self, PyObject* args) {
+    int flow_id;
+    if (!PyArg_ParseTuple(args, "i", &flow_id)) {
+        return NULL;
+    }
+    if (FlowSet_get(self, flow_id) == NULL) {
+        return NULL;
+    }
+    WriteLock lock(*self->mutex);
+    self->data->remove(flow_id);
+    Py_RETURN_NONE;
+}
+
+static PyObject* FlowSet_neighbors(FlowSetObject* self, PyObject* args) {
+    int flow_id;
+    if (!PyArg_ParseTuple(args, "i", &flow_id)) {
+        return NULL;
+    }
+    FlowState* flow = FlowSet_get(self, flow_id);
+    if (flow == NULL) {
+        return NULL;
+    }
+    PyObject* result = PyList_New(0);
+    if (result == NULL) {
+        return NULL;
+    }
+    for (const auto& item : flow->adj) {
+        PyObject* other = PyLong_FromLong(item.first);
+        if (other == NULL || PyList_Append(result, other) < 0) {
+            Py_XDECREF(other);
+            Py_DECREF(result);
             return NULL;
         }
+        Py_DECREF(other);
+    }
+    return result;
+}
 
-        int flow_id;
-        PyObject* fid = PyIter_Next(j);
-        if (!PyLong_Check(fid)) {
-            Py_DECREF(fid);
-            PyErr_SetString(PyExc_TypeError, "invalid flow_id");
+static PyObject* FlowSet_crossings_for_a_flow(FlowSetObject* self, PyObject* args) {
+    int flow_id;
+    if (!PyArg_ParseTuple(args, "i", &flow_id)) {
+        return NULL;
+    }
+    FlowState* flow = FlowSet_get(self, flow_id);
+    if (flow == NULL) {
+        return NULL;
+    }
+
+    // the number of cvids whose flows share an edge with the flow
+    std::vector<int> cvids;
+    for (const auto& item : flow->adj) {
+        cvids.push_back(self->data->flows.at(item.first).cvid);
+    }
+    std::sort(cvids.begin(), cvids.end());
+    long count = std::unique(cvids.begin(), cvids.end()) - cvids.begin();
+    return PyLong_FromLong(count);
+}
+
+// (crossings, # of edges) of the flow for each candidate (without the GIL under a 
+// shared lock); false if the flow is not in the data
+static bool score_candidates(const FlowSetData& data, 
+                             int flow_id, 
+                             bool default_base, 
+                             std::vector<int>& base, 
+                             const std::vector<std::vector<int>>& candidates, 
+                             std::vector<std::pair<long, long>>& results) {
+    auto found = data.flows.find(flow_id);
+    if (found == data.flows.end()) {
+        return false;
+    }
+    if (default_base) {
+        base = found->second.edges;
+    }
+    std::sort(base.begin(), base.end());
+    base.erase(std::unique(base.begin(), base.end()), base.end());
+    std::unordered_set<int> base_set(base.begin(), base.end());
+
+    // cvids of the other flows sharing the edges (sorted without duplication)
+    auto crossing_cvids = [&data, flow_id](const std::vector<int>& edges, 
+                                           std::vector<int>& cvids) {
+        cvids.clear();
+        for (int e : edges) {
+            auto users = data.edge2flows.find(e);
+            if (users == data.edge2flows.end()) {
+                continue;
+            }
+            for (int other : users->second) {
+                if (other != flow_id) {
+                    cvids.push_back(data.flows.at(other).cvid);
+                }
+            }
+        }
+        std::sort(cvids.begin(), cvids.end());
+        cvids.erase(std::unique(cvids.begin(), cvids.end()), cvids.end());
+    };
+    std::vector<int> base_cvids;
+    crossing_cvids(base, base_cvids);
+
+    std::vector<int> added, cvids;
+    for (const auto& candidate : candidates) {
+        // the edges of the flow if the candidate is taken
+        added.clear();
+        for (int e : candidate) {
+            if (!base_set.count(e)) {
+                added.push_back(e);
+            }
+        }
+        std::sort(added.begin(), added.end());
+        added.erase(std::unique(added.begin(), added.end()), added.end());
+        long edge_num = base.size() + added.size();
+
+        // crossings with the base edges and with the added edges
+        crossing_cvids(added, cvids);
+        long crossings = base_cvids.size();
+        for (int cvid : cvids) {
+            if (!std::binary_search(base_cvids.begin(), base_cvids.end(), cvid)) {
+                ++crossings;
+            }
+        }
+        results.push_back(std::make_pair(crossings, edge_num));
+    }
+    return true;
+}
+
+static PyObject* FlowSet_score_candidates(FlowSetObject* self, PyObject* args) {
+    int flow_id;
+    PyObject* pycandidates;
+    PyObject* pybase = Py_None;
+    if (!PyArg_ParseTuple(args, "iO|O", &flow_id, &pycandidates, &pybase)) {
+        return NULL;
+    }
+
+    // edges of the flow other than the candidates (default: the registered edges)
+    bool default_base = (pybase == Py_None);
+    std::vector<int> base;
+    if (!default_base && parse_int_list(pybase, base) < 0) {
+        return NULL;
+    }
+    std::vector<std::vector<int>> candidates;
+    PyObject* it = PyObject_GetIter(pycandidates);
+    if (it == NULL) {
+        return NULL;
+    }
+    PyObject* item;
+    while ((item = PyIter_Next(it))) {
+        candidates.emplace_back();
+        int error = parse_int_list(item, candidates.back());
+        Py_DECREF(item);
+        if (error < 0) {
+            Py_DECREF(it);
             return NULL;
         }
-        flow_id = PyLong_AsLong(fid);
-        Py_DECREF(fid);
+    }
+    Py_DECREF(it);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+
+    // the flow is looked up under the lock (it may be removed while the GIL is released)
+    std::vector<std::pair<long, long>> results;
+    bool found;
+    Py_BEGIN_ALLOW_THREADS
+    ReadLock lock(*self->mutex);
+    found = score_candidates(*self->data, flow_id, default_base, base, candidates, results);
+    lock.unlock(); // before taking the GIL again
+    Py_END_ALLOW_THREADS
+    if (!found) {
+        PyObject* key = PyLong_FromLong(flow_id);
+        PyErr_SetObject(PyExc_KeyError, key);
+        Py_XDECREF(key);
+        return NULL;
+    }
 
-        std::set<std::pair<int, int>> edges;
-        PyObject* pyedges = PyIter_Next(j);
-        PyObject* k = PyObject_GetIter(pyedges);
-        if (k == NULL) {
+    PyObject* scores = PyList_New(results.size());
+    if (scores == NULL) {
+        return NULL;
+    }
+    for (size_t k = 0; k < results.size(); ++k) {
+        PyObject* score = Py_BuildValue("(ll)", results[k].first, results[k].second);
+        if (score == NULL) {
+            Py_DECREF(scores);
             return NULL;
         }
-        PyObject* eo;
-        while ((eo = PyIter_Next(k))) {
-            PyObject* l = PyObject_GetIter(eo);
-            if (l == NULL) {
-                return NULL;
-            }
-            std::vector<int> e;
-            PyObject* vo;
-            while ((vo = PyIter_Next(l))) {
-                if (!PyLong_Check(vo)) {
-                    Py_DECREF(vo);
-                    PyErr_SetString(PyExc_TypeError, "invalid graph");
-                    return NULL;
-                }
-                e.push_back(PyLong_AsLong(vo));
-                Py_DECREF(vo);
+        PyList_SET_ITEM(scores, k, score);
+    }
+    return scores;
+}
+
+static PyObject* FlowSet_crossing_flows(FlowSetObject* self, PyObject*) {
+    // (cvid0, cvid1) such that the flow of cvid0 was added before that of cvid1
+    std::vector<std::pair<int, int>> pairs;
+    Py_BEGIN_ALLOW_THREADS
+    ReadLock lock(*self->mutex);
+    for (const auto& item : self->data->flows) {
+        const FlowState& flow = item.second;
+        for (const auto& adj_item : flow.adj) {
+            const FlowState& other = self->data->flows.at(adj_item.first);
+            if (flow.order < other.order) {
+                pairs.push_back(std::make_pair(flow.cvid, other.cvid));
             }
-            assert(e.size() == 2);
-            edges.insert(std::make_pair(e[0], e[1]));
-            Py_DECREF(l);
-            Py_DECREF(eo);
         }
-        Py_DECREF(k);
-        Py_DECREF(pyedges);
-        
-        Flow flow(flow_id, edges);
-        flows.push_back(flow);
+    }
+    lock.unlock(); // before taking the GIL again
+    Py_END_ALLOW_THREADS
 
-        Py_DECREF(j);
-        Py_DECREF(ftuple);
+    PyObject* crossings = PySet_New(NULL);
+    if (crossings == NULL) {
+        return NULL;
     }
-    Py_DECREF(i);
+    for (const auto& p : pairs) {
+        PyObject* edge = Py_BuildValue("(ii)", p.first, p.second);
+        if (edge == NULL || PySet_Add(crossings, edge) < 0) {
+            Py_XDECREF(edge);
+            Py_DECREF(crossings);
+            return NULL;
+        }
+        Py_DECREF(edge);
+    }
+    return crossings;
+}
 
-    // create graph
-    std::unordered_map<int, std::unordered_set<int>> graph;
-    std::vector<Flow>::iterator i_iter, j_iter;
-    for (i_iter = flows.begin(); i_iter != flows.end(); ++i_iter) {
-        for (j_iter = std::next(i_iter); j_iter != flows.end(); ++j_iter) {
-            // make adj set if null
-            if (graph.find(i_iter->cvid) == graph.end()) {
-                std::unordered_set<int> empty_set{};
-                graph.emplace(i_iter->cvid, empty_set);
-            }
-            if (graph.find(j_iter->cvid) == graph.end()) {
-                std::unordered_set<int> empty_set{};
-                graph.emplace(j_iter->cvid, empty_set);
-            }
-
-            // if crossing, set value to adj list
-            std::set<std::pair<int, int>> intersection_set, i_set, j_set;
-            i_set = i_iter->edges;
-            j_set = j_iter->edges;
-            std::set_intersection(i_set.begin(), i_set.end(), 
-                                  j_set.begin(), j_set.end(), 
-                                  std::inserter(intersection_set, intersection_set.end()));
-            if (intersection_set.size()) {
-                // for i_iter
-                graph[i_iter->cvid].insert(j_iter->cvid);
-                // for j_iter
-                graph[j_iter->cvid].insert(i_iter->cvid);
-            }
-        }
-    }
-
-    // make vertex index list sorted by degree
-    std::vector<Vdeg> vdeg_list;
-    std::unordered_map<int, std::unordered_set<int>>::iterator iter;
-    for (iter = graph.begin(); iter != graph.end(); ++iter) {
-        Vdeg v(iter->first, (iter->second).size());
-        vdeg_list.push_back(v);
-    }
-    std::sort(vdeg_list.rbegin(), vdeg_list.rend());
-
-    // Welsh-Powell graph coloring algorithm
-    std::unordered_map<int, int> coloring;
-    std::vector<Vdeg>::iterator vdeg_iter;
-    for (vdeg_iter = vdeg_list.begin(); vdeg_iter != vdeg_list.end(); ++vdeg_iter) {
-        std::unordered_set<int> neighbour_colors;
-        std::unordered_set<int> adj = graph[vdeg_iter->index];
-        std::unordered_set<int>::iterator viter;
-        for (viter = adj.begin(); viter != adj.end(); ++viter) {
-            if (coloring.find(*viter) != coloring.end()) {
-                neighbour_colors.insert(coloring[*viter]);
-            }
-        }
-        int color_id;
-        for (color_id = 0; ; ++color_id) {
-            if (neighbour_colors.find(color_id) == neighbour_colors.end()) {
-                break;
+static PyObject* FlowSet_slot_allocation(FlowSetObject* self, 
+                                         PyObject* args, 
+                                         PyObject* kwargs) {
+    static const char* keywords[] = {"strategy", "trials", "seed", NULL};
+    const char* strategy = "welsh_powell";
+    int trials = 16;
+    unsigned long seed = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|sik", (char**)keywords, 
+                                     &strategy, &trials, &seed)) {
+        return NULL;
+    }
+    int strategy_id = parse_strategy(strategy, trials);
+    if (strategy_id < 0) {
+        return NULL;
+    }
+    std::vector<int> cvids, coloring;
+    double seconds;
+    Py_BEGIN_ALLOW_THREADS
+    ReadLock lock(*self->mutex);
+    std::vector<std::vector<int>> graph = self->data->cvid_graph(cvids);
+    lock.unlock(); // before taking the GIL again
+    seconds = color_graph(graph, strategy_id, trials, seed, coloring);
+    Py_END_ALLOW_THREADS
+
+    record_coloring(strategy_names[strategy_id], seconds, coloring);
+    return coloring_to_dict(cvids, coloring);
+}
+
+static PyObject* FlowSet_exact_slot_allocation(FlowSetObject* self, 
+                                               PyObject* args, 
+                                               PyObject* kwargs) {
+    static const char* keywords[] = {"time_limit", "node_limit", NULL};
+    double time_limit = 0.0;
+    long long node_limit = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|dL", (char**)keywords, 
+                                     &time_limit, &node_limit)) {
+        return NULL;
+    }
+    std::vector<int> cvids;
+    ExactResult result;
+    Py_BEGIN_ALLOW_THREADS
+    ReadLock lock(*self->mutex);
+    std::vector<std::vector<int>> graph = self->data->cvid_graph(cvids);
+    lock.unlock(); // before taking the GIL again
+    result = exact_coloring(graph, time_limit, node_limit);
+    Py_END_ALLOW_THREADS
+
+    return exact_result(cvids, result);
+}
+
+static PyObject* FlowSet_copy(FlowSetObject* self, PyObject*) {
+    PyTypeObject* type = Py_TYPE(self);
+    FlowSetObject* copied = (FlowSetObject*)type->tp_alloc(type, 0);
+    if (copied != NULL) {
+        copied->data = new FlowSetData(*self->data);
+        copied->mutex = new std::shared_mutex();
+    }
+    return (PyObject*)copied;
+}
+
+static PyObject* FlowSet_deepcopy(FlowSetObject* self, PyObject*) {
+    return FlowSet_copy(self, NULL);
+}
+
+static PyObject* FlowSet_reduce(FlowSetObject* self, PyObject*) {
+    // state: [(flow_id, cvid, edge ids), ...] in the order of the flows
+    PyObject* state = PyList_New(0);
+    if (state == NULL) {
+        return NULL;
+    }
+    for (int flow_id : self->data->ordered_flow_ids()) {
+        const FlowState& flow = self->data->flows.at(flow_id);
+        PyObject* edges = PyTuple_New(flow.edges.size());
+        if (edges == NULL) {
+            Py_DECREF(state);
+            return NULL;
+        }
+        for (size_t k = 0; k < flow.edges.size(); ++k) {
+            PyObject* edge = PyLong_FromLong(flow.edges[k]);
+            if (edge == NULL) {
+                Py_DECREF(edges);
+                Py_DECREF(state);
+                return NULL;
             }
+            PyTuple_SET_ITEM(edges, k, edge);
+        }
+        PyObject* item = Py_BuildValue("(iiO)", flow_id, flow.cvid, edges);
+        Py_DECREF(edges);
+        if (item == NULL || PyList_Append(state, item) < 0) {
+            Py_XDECREF(item);
+            Py_DECREF(state);
+            return NULL;
         }
-        coloring.emplace(vdeg_iter->index, color_id);
+        Py_DECREF(item);
     }
+    PyObject* reduced = Py_BuildValue("(O()O)", (PyObject*)Py_TYPE(self), state);
+    Py_DECREF(state);
+    return reduced;
+}
 
-    // convert to PyObject
-    PyObject* pycoloring = PyDict_New();
-    std::unordered_map<int, int>::iterator citer;
-    for (citer = coloring.begin(); citer != coloring.end(); ++citer) {
-        PyDict_SetItem(pycoloring, Py_BuildValue("i", citer->first), Py_BuildValue("i", citer->second));
+static PyObject* FlowSet_setstate(FlowSetObject* self, PyObject* state) {
+    FlowSetData* data = new FlowSetData();
+    PyObject* it = PyObject_GetIter(state);
+    if (it == NULL) {
+        delete data;
+        return NULL;
+    }
+    PyObject* item;
+    while ((item = PyIter_Next(it))) {
+        int flow_id, cvid;
+        PyObject* pyedges;
+        std::vector<int> edges;
+        if (!PyArg_ParseTuple(item, "iiO", &flow_id, &cvid, &pyedges) 
+            || parse_int_list(pyedges, edges) < 0) {
+            Py_DECREF(item);
+            Py_DECREF(it);
+            delete data;
+            return NULL;
+        }
+        data->update(flow_id, cvid, edges);
+        Py_DECREF(item);
+    }
+    Py_DECREF(it);
+    if (PyErr_Occurred()) {
+        delete data;
+        return NULL;
     }
+    WriteLock lock(*self->mutex);
+    delete self->data;
+    self->data = data;
+    Py_RETURN_NONE;
+}
 
-    return pycoloring;
+static Py_ssize_t FlowSet_len(FlowSetObject* self) {
+    return self->data->flows.size();
+}
+
+static int FlowSet_contains(FlowSetObject* self, PyObject* key) {
+    long flow_id = PyLong_AsLong(key);
+    if (flow_id == -1 && PyErr_Occurred()) {
+        PyErr_Clear();
+        return 0;
+    }
+    return self->data->flows.count(flow_id) ? 1 : 0;
 }
 
+static PyMethodDef FlowSet_methods[] = {
+    {"update", (PyCFunction)FlowSet_update, METH_VARARGS, 
+     "update(flow_id, cvid, edge_ids): add the flow or replace its cvid and edges"},
+    {"set_cvid", (PyCFunction)FlowSet_set_cvid, METH_VARARGS, 
+     "set_cvid(flow_id, cvid)"},
+    {"remove", (PyCFunction)FlowSet_remove, METH_VARARGS, 
+     "remove(flow_id)"},
+    {"neighbors", (PyCFunction)FlowSet_neighbors, METH_VARARGS, 
+     "neighbors(flow_id): flow_ids sharing at least one edge with the flow"},
+    {"crossings_for_a_flow", (PyCFunction)FlowSet_crossings_for_a_flow, METH_VARARGS, 
+     "crossings_for_a_flow(flow_id): # of cvids crossing the flow"},
+    {"score_candidates", (PyCFunction)FlowSet_score_candidates, METH_VARARGS, 
+     "score_candidates(flow_id, candidates, base_edge_ids=None): "
+     "[(# of crossing cvids, # of edges), ...] of the flow for each candidate "
+     "(edge ids added to base_edge_ids, or to the registered edges of the flow)"},
+    {"crossing_flows", (PyCFunction)FlowSet_crossing_flows, METH_NOARGS, 
+     "crossing_flows(): set of crossing (cvid, cvid)"},
+    {"slot_allocation", (PyCFunction)(void(*)(void))FlowSet_slot_allocation, 
+     METH_VARARGS | METH_KEYWORDS, 
+     "slot_allocation(strategy='welsh_powell', trials=16, seed=0): "
+     "coloring {cvid: color} (see cpp_modules.slot_allocation)"},
+    {"exact_slot_allocation", (PyCFunction)(void(*)(void))FlowSet_exact_slot_allocation, 
+     METH_VARARGS | METH_KEYWORDS, 
+     "exact_slot_allocation(time_limit=0.0, node_limit=0): see the module function"},
+    {"copy", (PyCFunction)FlowSet_copy, METH_NOARGS, NULL},
+    {"__deepcopy__", (PyCFunction)FlowSet_deepcopy, METH_O, NULL},
+    {"__reduce__", (PyCFunction)FlowSet_reduce, METH_NOARGS, NULL},
+    {"__setstate__", (PyCFunction)FlowSet_setstate, METH_O, NULL},
+    {NULL},
+};
+
+static PyType_Slot FlowSet_slots[] = {
+    {Py_tp_new, (void*)FlowSet_new},
+    {Py_tp_dealloc, (void*)FlowSet_dealloc},
+    {Py_tp_methods, (void*)FlowSet_methods},
+    {Py_sq_length, (void*)FlowSet_len},
+    {Py_sq_contains, (void*)FlowSet_contains},
+    {Py_tp_doc, (void*)"Conflict graph of flows kept resident across calls.\n"
+                       "Flows are added and updated by their edge ids."},
+    {0, NULL},
+};
+
+static PyType_Spec FlowSet_spec = {
+    "cpp_modules.FlowSet",
+    sizeof(FlowSetObject),
+    0,
+    Py_TPFLAGS_DEFAULT,
+    FlowSet_slots,
+};
+
 static PyMethodDef mod_methods[] = {
     {"crossing_flows", cpp_crossing_flows, METH_VARARGS},
     {"crossings_for_a_flow", cpp_crossings_for_a_flow, METH_VARARGS},
-    {"slot_allocation", cpp_slot_allocation, METH_VARARGS},
+    {"slot_allocation", (PyCFunction)(void(*)(void))cpp_slot_allocation, 
+     METH_VARARGS | METH_KEYWORDS, 
+     "slot_allocation(flows, strategy='welsh_powell', trials=16, seed=0): "
+     "coloring {cvid: color} of the crossing graph. strategy is 'welsh_powell', "
+     "'dsatur', 'rlf' or 'random' (the best of Welsh-Powell and trials - 1 random "
+     "orders)"},
+    {"exact_slot_allocation", (PyCFunction)(void(*)(void))cpp_exact_slot_allocation, 
+     METH_VARARGS | METH_KEYWORDS, 
+     "exact_slot_allocation(flows, time_limit=0.0, node_limit=0): "
+     "({cvid: color}, proven, lower_bound) by branch and bound with DSATUR branching. "
+     "The best coloring found within time_limit seconds and node_limit search nodes "
+     "(<= 0: unlimited) is returned, proven is True if it is optimal and lower_bound "
+     "is the size of the clique used as the lower bound"},
+    {"slot_allocation_stats", cpp_slot_allocation_stats, METH_VARARGS, 
+     "slot_allocation_stats(reset=False): {strategy: (calls, seconds, total colors)}"},
+    {"crossing_flows_csr", cpp_crossing_flows_csr, METH_VARARGS, 
+     "crossing_flows_csr(cvids, flow_offsets, edge_ids): int32 array (m, 2) of the "
+     "crossing cvid pairs. The edge ids of the i-th flow are "
+     "edge_ids[flow_offsets[i]:flow_offsets[i+1]] (all int32 buffers)"},
+    {"crossings_for_a_flow_csr", cpp_crossings_for_a_flow_csr, METH_VARARGS, 
+     "crossings_for_a_flow_csr(target_cvid, target_edge_ids, cvids, flow_offsets, "
+     "edge_ids): the number of cvids crossing the target flow"},
+    {"slot_allocation_csr", (PyCFunction)(void(*)(void))cpp_slot_allocation_csr, 
+     METH_VARARGS | METH_KEYWORDS, 
+     "slot_allocation_csr(cvids, flow_offsets, edge_ids, strategy='welsh_powell', "
+     "trials=16, seed=0): int32 array of the color of each flow"},
     {NULL},
 };
 
@@ -425,5 +1639,15 @@ static struct PyModuleDef mod_def = {
 //module creator
 PyMODINIT_FUNC PyInit_cpp_modules(void)
 {
-    return PyModule_Create(&mod_def);
+    PyObject* module = PyModule_Create(&mod_def);
+    if (module == NULL) {
+        return NULL;
+    }
+    PyObject* flow_set_type = PyType_FromSpec(&FlowSet_spec);
+    if (flow_set_type == NULL || PyModule_AddObject(module, "FlowSet", flow_set_type) < 0) {
+        Py_XDECREF(flow_set_type);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
 }
\ No newline at end of file
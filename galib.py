@@ -5,7 +5,7 @@ import collections
 import numpy
 from functools import partial
 import multiprocessing
-from typing import Callable, Iterable, Any
+from typing import Callable, Iterable, Any, Optional
 
 from deap import tools
 from deap import base
@@ -226,12 +226,16 @@ def mate_or_mutate(parent0: Individual,
 
 #----------------------------------------------------------------------------------------
 class GA:
-    def __init__(self, seed: AllocatorUnit | bytes | str):
+    def __init__(self, 
+                 seed: AllocatorUnit | bytes | str, 
+                 slot_strategy: Optional[str] = None):
         self.toolbox = base.Toolbox()
 
         # toolbox settings
         self.toolbox.register("empty_individual", Individual, seed)
         self._ind_seed = self.toolbox.empty_individual()
+        # coloring strategy of the slot allocation (inherited by every individual)
+        self._ind_seed.set_slot_strategy(slot_strategy)
         self.toolbox.register("individual", oplib.generate_initial_solution, self._ind_seed)
         self.toolbox.register("population", tools.initRepeat, list, self.toolbox.individual)
         self.toolbox.register("evaluate", Evaluator.evaluate)
@@ -249,4 +253,14 @@ class GA:
         self.logbook = tools.Logbook()
         self.logbook.header = ["gen", "evals", "dups", "hofs"] + Evaluator.eval_list()
         for eval_name in Evaluator.eval_list():
-            self.logbook.chapters[eval_name].header = "min", "avg", "max"
\ No newline at end of file
+            self.logbook.chapters[eval_name].header = "min", "avg", "max"
+
+        # lower bound of avg # of slots (the search stops when it is reached)
+        self.slot_lower_bound = self._ind_seed.slot_lower_bound()
+
+    ##-----------------------------------------------------------------------------------
+    def reached_lower_bound(self, pop: Iterable[Individual]) -> bool:
+        if 'avg # of slots' not in Evaluator.eval_list():
+            return False
+        i = Evaluator.eval_list().index('avg # of slots')
+        return min(ind.fitness.values[i] for ind in pop) <= self.slot_lower_bound
\ No newline at end of file
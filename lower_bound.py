@@ -0,0 +1,84 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import networkx as nx
+
+if TYPE_CHECKING:
+    from allocatorunit import AllocatorUnit
+
+#----------------------------------------------------------------------------------------
+def forced_conflict_graph(au: AllocatorUnit) -> nx.Graph:
+    '''
+    Graph of the allocating flows (flow_ids) which share an edge wherever they are
+    allocated: flows from the same vNode share its injection edge, and flows to the
+    same vNode share its ejection edge (unless the ejection edges are multi-ejection).
+    '''
+    multi_ejection = any(multi for _, _, multi
+                         in au.topology.edges(data="multi_ejection", default=False))
+    vNode2flow_ids: dict[tuple[str, int], set[int]] = dict()
+    for pair in au.allocating_pair_list:
+        vNode2flow_ids.setdefault(('src', pair.src_vNode.vNode_id), set()) \
+                      .add(pair.flow_id)
+        if not multi_ejection:
+            vNode2flow_ids.setdefault(('dst', pair.dst_vNode.vNode_id), set()) \
+                          .add(pair.flow_id)
+
+    graph = nx.Graph()
+    graph.add_nodes_from(flow.flow_id for flow in au.allocating_flow_list)
+    for flow_ids in vNode2flow_ids.values():
+        flow_ids = sorted(flow_ids)
+        graph.add_edges_from((f, g) for i, f in enumerate(flow_ids)
+                             for g in flow_ids[i + 1:])
+    return graph
+
+#----------------------------------------------------------------------------------------
+def clique_number(graph: nx.Graph) -> int:
+    return max((len(clique) for clique in nx.find_cliques(graph)), default=0)
+
+#----------------------------------------------------------------------------------------
+def avg_slot_lower_bound(au: AllocatorUnit) -> float:
+    '''
+    A lower bound of get_avg_slot_num(). The switch of the rNode of a vNode is passed
+    by the flows from and to the vNode, so that it gets at least as many slots as the
+    clique number of them in forced_conflict_graph(), in addition to the slots fixed
+    by the applied flows. If every core node has its own switch, the vNodes are put on
+    distinct switches of the free rNodes in the way that adds the fewest slots.
+    '''
+    # slots fixed by the applied flows
+    fixed = dict.fromkeys(au.switch_nodes, 0)
+    for flow in au.flow_dict.values():
+        if flow.allocating or flow.slot_id is None:
+            continue
+        for pair in flow.pair_list:
+            for node in (pair.path or ()):
+                if node in fixed:
+                    fixed[node] = max(fixed[node], flow.slot_id + 1)
+
+    # slots needed around each vNode
+    graph = forced_conflict_graph(au)
+    bounds = sorted((clique_number(graph.subgraph({pair.flow_id 
+                                                   for pair in vNode.pair_list}))
+                     for vNode in au.allocating_vNode_list), reverse=True)
+    
+    core2switches = {core: set(au.topology.successors(core)) for core in au.core_nodes}
+    own_switch = all(len(switches) == 1 for switches in core2switches.values()) \
+                 and len(set().union(*core2switches.values())) == len(core2switches)
+    if not bounds:
+        extra = 0
+    elif own_switch:
+        # the largest bounds on the switches with the most fixed slots
+        applied_rNode_ids = {vNode.rNode_id for vNode in au.vNode_dict.values()
+                             if not vNode.allocating}
+        free = sorted((fixed[switch] for core, switches in core2switches.items() 
+                       if core not in applied_rNode_ids for switch in switches), 
+                      reverse=True)
+        extra = sum(max(0, b - a) for b, a in zip(bounds, free))
+    else:
+        extra = max(0, bounds[0] - max(fixed.values()))
+    
+    return (sum(fixed.values()) + extra) / len(au.switch_nodes)
+
+#----------------------------------------------------------------------------------------
+def slot_lower_bound(au: AllocatorUnit) -> float:
+    # the best cheap lower bound of the objective (get_avg_slot_num()) of the optimizers
+    return avg_slot_lower_bound(au)
@@ -1,24 +1,115 @@
 from __future__ import annotations
+from collections import OrderedDict
+from typing import Optional
 
 import networkx as nx
 
 #----------------------------------------------------------------------------------------
-def mcc(graph: nx.Graph, best_slot_num: int | float = float('inf')) -> list[set[int]]:
+class _CoverCache:
+    '''
+    Bounded LRU cache of the sub-results of mcc() keyed by the remaining vertices.
+    A value is (cover, lower_bound): cover is a minimum clique cover (None if it is not
+    known) and lower_bound is a known lower bound of the size of the covers.
+    '''
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items: OrderedDict[frozenset[int], tuple[Optional[list[set[int]]], int]] \
+        = OrderedDict()
+
+    ##-----------------------------------------------------------------------------------
+    def get(self, nodes: frozenset[int]) -> tuple[Optional[list[set[int]]], int]:
+        value = self.items.get(nodes)
+        if value is None:
+            return None, 0
+        self.items.move_to_end(nodes)
+        return value
+
+    ##-----------------------------------------------------------------------------------
+    def put(self, nodes: frozenset[int], cover: Optional[list[set[int]]], lower_bound: int):
+        self.items[nodes] = (cover, lower_bound)
+        self.items.move_to_end(nodes)
+        if len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+#----------------------------------------------------------------------------------------
+def _independent_set_size(graph: nx.Graph) -> int:
+    # a greedy independent set (each clique of a cover contains at most one of it)
+    size = 0
+    candidates = set(graph.nodes)
+    for v in sorted(graph.nodes, key=graph.degree):
+        if v in candidates:
+            size += 1
+            candidates.discard(v)
+            candidates.difference_update(graph[v])
+    return size
+
+#----------------------------------------------------------------------------------------
+def _greedy_cover(graph: nx.Graph) -> list[set[int]]:
+    # add each vertex to the first clique all of whose vertices are adjacent to it
+    cover: list[set[int]] = list()
+    for v in sorted(graph.nodes, key=graph.degree, reverse=True):
+        for clique in cover:
+            if clique <= graph[v].keys():
+                clique.add(v)
+                break
+        else:
+            cover.append({v})
+    return cover
+
+#----------------------------------------------------------------------------------------
+def _mcc(graph: nx.Graph,
+         nodes: frozenset[int],
+         best_slot_num: int | float,
+         cache: _CoverCache) -> Optional[list[set[int]]]:
+    # a minimum clique cover of nodes if its size is less than best_slot_num
+    if not nodes:
+        return list() if best_slot_num > 0 else None
+    cover, lower_bound = cache.get(nodes)
+    if cover is not None:
+        return [set(clique) for clique in cover] if len(cover) < best_slot_num else None
+    if lower_bound >= best_slot_num:
+        return None
+
+    # bounds
+    subgraph = graph.subgraph(nodes)
+    lower_bound = max(lower_bound, _independent_set_size(subgraph))
+    if lower_bound >= best_slot_num:
+        cache.put(nodes, None, lower_bound)
+        return None
     answer = None
-    cliques = reversed(list(nx.enumerate_all_cliques(graph)))
-
-    for clique in cliques:
-        clique_node_set = set(clique)
-        if -(-graph.number_of_nodes() // len(clique_node_set)) >= best_slot_num:
-            break
-        new_graph: nx.Graph = graph.copy()
-        new_graph.remove_nodes_from(clique_node_set)
-        result = mcc(new_graph, best_slot_num - 1)
-        if result is not None:
-            answer = [clique_node_set] + result
-            best_slot_num = len(answer)
-    
-    if graph.number_of_nodes() < best_slot_num:
-        answer = [{n} for n in graph.nodes()]
-
-    return answer
\ No newline at end of file
+    greedy = _greedy_cover(subgraph)
+    if len(greedy) < best_slot_num:
+        answer = greedy
+        best_slot_num = len(greedy)
+
+    # Some clique of a cover contains v, and it can be extended to a maximal clique,
+    # so that only the maximal cliques containing v are tried (larger ones first).
+    if answer is None or len(answer) > lower_bound:
+        v = min(nodes, key=subgraph.degree)
+        cliques = sorted(nx.find_cliques(subgraph, [v]), key=len, reverse=True)
+        for clique in cliques:
+            if best_slot_num <= lower_bound:
+                break
+            clique_node_set = set(clique)
+            result = _mcc(graph, nodes - clique_node_set, best_slot_num - 1, cache)
+            if result is not None:
+                answer = [clique_node_set] + result
+                best_slot_num = len(answer)
+
+    # best_slot_num is the minimum if answer is None (nothing better was found)
+    if answer is None:
+        cache.put(nodes, None, best_slot_num)
+    else:
+        cache.put(nodes, [set(clique) for clique in answer], len(answer))
+    return answer
+
+#----------------------------------------------------------------------------------------
+def mcc(graph: nx.Graph,
+        best_slot_num: int | float = float('inf'),
+        cache_size: int = 1 << 16) -> Optional[list[set[int]]]:
+    '''
+    A minimum clique cover of graph if its size is less than best_slot_num (or None).
+    The sub-results for the remaining vertices are memoized in an LRU cache of
+    cache_size entries.
+    '''
+    return _mcc(graph, frozenset(graph.nodes), best_slot_num, _CoverCache(cache_size))
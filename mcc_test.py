@@ -1,9 +1,75 @@
+from __future__ import annotations
 import networkx as nx
+import random
 import time
 
 from allocatorunit import AllocatorUnit, App, Pair, VNode, Flow
 import mcc
 
+#--------------------------------------------------------------
+def min_cover_size(graph: nx.Graph) -> int:
+    # the size of a minimum clique cover by trying all the partitions into cliques
+    nodes = list(graph.nodes)
+    best = len(nodes)
+    def search(i: int, cover: list[set[int]]):
+        nonlocal best
+        if len(cover) >= best:
+            return
+        if i == len(nodes):
+            best = len(cover)
+            return
+        v = nodes[i]
+        for clique in cover:
+            if clique <= graph[v].keys():
+                clique.add(v)
+                search(i + 1, cover)
+                clique.remove(v)
+        cover.append({v})
+        search(i + 1, cover)
+        cover.pop()
+    search(0, [])
+    return best
+
+#--------------------------------------------------------------
+def is_clique_cover(graph: nx.Graph, cover: list[set[int]]) -> bool:
+    return sorted(v for clique in cover for v in clique) == sorted(graph.nodes) \
+           and all(graph.has_edge(u, v) for clique in cover for u in clique
+                   for v in clique if u != v)
+
+#--------------------------------------------------------------
+def test_mcc():
+    # minimum clique covers of random graphs (with and without best_slot_num)
+    rand = random.Random(0)
+    for _ in range(60):
+        graph = nx.gnp_random_graph(rand.randint(0, 9), rand.random(), rand.getrandbits(32))
+        size = min_cover_size(graph)
+        for cache_size in (1 << 16, 4, 0):
+            cover = mcc.mcc(graph, cache_size=cache_size)
+            assert is_clique_cover(graph, cover) and len(cover) == size
+            assert mcc.mcc(graph, size, cache_size) is None
+            cover = mcc.mcc(graph, size + 1, cache_size)
+            assert is_clique_cover(graph, cover) and len(cover) == size
+
+#--------------------------------------------------------------
+def test_cache_bound():
+    # the least recently used sub-results are dropped beyond max_size
+    cache = mcc._CoverCache(3)
+    for i in range(5):
+        cache.put(frozenset([i]), [{i}], 1)
+        assert len(cache.items) <= 3
+    assert cache.get(frozenset([0])) == (None, 0)
+    assert cache.get(frozenset([2])) == ([{2}], 1)
+    cache.put(frozenset([5]), None, 2)
+    assert list(cache.items) == [frozenset([4]), frozenset([2]), frozenset([5])]
+
+    # the search keeps at most cache_size sub-results
+    graph = nx.gnp_random_graph(16, 0.5, 0)
+    for cache_size in (1, 16, 1 << 16):
+        cache = mcc._CoverCache(cache_size)
+        cover = mcc._mcc(graph, frozenset(graph.nodes), float('inf'), cache)
+        assert len(cache.items) <= cache_size
+        assert is_clique_cover(graph, cover) and len(cover) == len(mcc.mcc(graph))
+
 #--------------------------------------------------------------
 if __name__ == '__main__':
     au = AllocatorUnit.load('sample.pickle')
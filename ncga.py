@@ -24,8 +24,9 @@ class NCGA(GA):
                  mutation_pb: float = 0.5, 
                  archive_size: int = 40, 
                  offspring_size: Optional[int] = None, 
-                 sort_method: str = 'cyclic'):
-        super().__init__(seed)
+                 sort_method: str = 'cyclic', 
+                 slot_strategy: Optional[str] = None):
+        super().__init__(seed, slot_strategy)
         self.toolbox.register("select", tools.selSPEA2)
         self.mate_pb = mate_pb
         self.mutation_pb = mutation_pb
@@ -78,7 +79,8 @@ class NCGA(GA):
                   for i, eval_name in enumerate(Evaluator.eval_list())}
         self.logbook.record(gen=0, evals=len(invalid_ind), **record)
 
-        while time.time() - start_time < exectution_time:
+        while (time.time() - start_time < exectution_time) \
+              and not self.reached_lower_bound(pop):
             # uppdate generation number
             gen += 1
 
@@ -23,8 +23,9 @@ class NSGA2(GA):
                  mate_pb: float = 0.8, 
                  mutation_pb: float = 0.2, 
                  archive_size: int = 40, 
-                 offspring_size: Optional[int] = None):
-        super().__init__(seed)
+                 offspring_size: Optional[int] = None, 
+                 slot_strategy: Optional[str] = None):
+        super().__init__(seed, slot_strategy)
         self.toolbox.register("select", tools.selNSGA2)
         self.mate_pb = mate_pb
         self.mutation_pb = mutation_pb
@@ -82,7 +83,8 @@ class NSGA2(GA):
         self.logbook.record(gen=0, evals=len(invalid_ind), dups='N/A', hofs='N/A', **record)
         print(self.logbook.stream)
 
-        while time.time() - start_time < exectution_time:
+        while (time.time() - start_time < exectution_time) \
+              and not self.reached_lower_bound(pop):
             # uppdate generation number
             gen += 1
 
@@ -1,11 +1,14 @@
 from __future__ import annotations
 import random
 import copy
-from typing import Optional
+import time
+import multiprocessing
+from functools import partial
+from typing import Optional, Callable
 import networkx as nx
 
-from allocatorunit import AllocatorUnit, Pair, Flow
-from cpp_modules import crossings_for_a_flow
+from allocatorunit import AllocatorUnit, Pair, Flow, bit_count
+from evaluator import Evaluator
 
 #----------------------------------------------------------------------------------------
 def generate_initial_solution(au: AllocatorUnit, _ = None) -> AllocatorUnit:
@@ -47,24 +50,13 @@ def initialize_by_assist(au: AllocatorUnit, _ = None) -> AllocatorUnit:
         return len(au.st_path_table[src][dst][0])
     pairs.sort(key=pair_hops)
 
-    # reconstruct flow graphs
-    for flow in au.flow_dict.values():
-        if flow.allocating:
-            flow.make_flow_graph(None_acceptance=True)
-
     for pair, flow_id in pairs:
         src = pair.src_vNode.rNode_id
         dst = pair.dst_vNode.rNode_id
 
         # calculate score for each path
-        result = dict()
-        for path in au.st_path_table[src][dst]:
-            au.pair_allocation(pair.pair_id, path)
-            au.flow_dict[flow_id].make_flow_graph(True)
-            fg = au.flow_dict[flow_id].flow_graph
-            flows = [(f.cvid, f.flow_graph.edges) for f in au.flow_dict.values()]
-            score = crossings_for_a_flow((flow_id, fg.edges), flows)
-            result[path] = (score, fg.number_of_edges())
+        paths = list(au.st_path_table[src][dst])
+        result = dict(zip(paths, au.score_paths(pair.pair_id, paths)))
 
         # select the best path
         best_score = min(result.values(), key=lambda item: item[0])[0]
@@ -75,7 +67,6 @@ def initialize_by_assist(au: AllocatorUnit, _ = None) -> AllocatorUnit:
 
         # apply the best path
         au.pair_allocation(pair.pair_id, path)
-        au.flow_dict[flow_id].make_flow_graph(True)
     
     # slot allocation
     au.greedy_slot_allocation()
@@ -83,9 +74,12 @@ def initialize_by_assist(au: AllocatorUnit, _ = None) -> AllocatorUnit:
     return au
 
 #----------------------------------------------------------------------------------------
-def update_all_paths_of_a_random_node(au: AllocatorUnit) -> AllocatorUnit:
-    # copy au
-    au = copy.deepcopy(au)
+def update_all_paths_of_a_random_node(au: AllocatorUnit, 
+                                      inplace: bool = False
+                                      ) -> AllocatorUnit:
+    # copy au (or modify au itself in a transaction, see AllocatorUnit.begin())
+    if not inplace:
+        au = copy.deepcopy(au)
 
     # select a temporary allocated rNode_id
     temp_allocated_rNode_list = list(au.temp_allocated_rNode_dict.keys())
@@ -99,17 +93,14 @@ def update_all_paths_of_a_random_node(au: AllocatorUnit) -> AllocatorUnit:
     au.node_allocation(vNode_id, rNode_id)
 
     # slot allocation
-    au.greedy_slot_allocation()
+    au.slot_allocation()
 
     return au
 
 #----------------------------------------------------------------------------------------
-def node_swap(au: AllocatorUnit, 
-              target_vNode_id: Optional[int] = None
-              ) -> AllocatorUnit: 
-    # copy au
-    au = copy.deepcopy(au)
-
+def _select_swap(au: AllocatorUnit, 
+                 target_vNode_id: Optional[int] = None
+                 ) -> tuple[int, int]:
     # select a temporary allocated rNode_id
     temp_allocated_rNode_list = list(au.temp_allocated_rNode_dict.keys())
     if target_vNode_id is None:
@@ -118,11 +109,25 @@ def node_swap(au: AllocatorUnit,
         rNode_id0 = au.vNode_dict[target_vNode_id].rNode_id
 
     # select swapped rNode_id
-    candidate_list = list(au.empty_rNode_set) + temp_allocated_rNode_list
+    candidate_list = au.empty_rNode_list + temp_allocated_rNode_list
     rNode_id1 = random.choice(candidate_list)
 
+    return au.temp_allocated_rNode_dict[rNode_id0], rNode_id1
+
+#----------------------------------------------------------------------------------------
+def node_swap(au: AllocatorUnit, 
+              target_vNode_id: Optional[int] = None, 
+              inplace: bool = False
+              ) -> AllocatorUnit: 
+    # copy au (or modify au itself in a transaction, see AllocatorUnit.begin())
+    if not inplace:
+        au = copy.deepcopy(au)
+
+    # select vNode_id0 and the rNode_id1 to which it moves
+    vNode_id0, rNode_id1 = _select_swap(au, target_vNode_id)
+    rNode_id0 = au.vNode_dict[vNode_id0].rNode_id
+
     # deallocate rNode_id0
-    vNode_id0 = au.temp_allocated_rNode_dict[rNode_id0]
     au.node_deallocation(vNode_id0)
 
     # if rNode_id1 has a vNode, deallocate vNode_id1 and allocate it to rNode_id0
@@ -138,17 +143,137 @@ def node_swap(au: AllocatorUnit,
     au.node_allocation(vNode_id0, rNode_id1)
 
     # slot allocation
-    au.greedy_slot_allocation()
+    au.slot_allocation()
 
     return au
 
+#----------------------------------------------------------------------------------------
+def node_swap_delta(au: AllocatorUnit, 
+                    target_vNode_id: Optional[int] = None
+                    ) -> tuple[float, int]:
+    '''
+    node_swap() on au itself evaluated by AllocatorUnit.swap_delta() (only the flows of
+    the swapped vNodes are re-slotted). Return the deltas of (avg # of slots, # of 
+    flows' edges). au should be in a transaction to reject the move.
+    '''
+    vNode_id0, rNode_id1 = _select_swap(au, target_vNode_id)
+    return au.swap_delta(vNode_id0, rNode_id1)
+
+#----------------------------------------------------------------------------------------
+def _best_path(au: AllocatorUnit, 
+               pair: Pair, 
+               src: int, 
+               dst: int) -> tuple[tuple[int, int], tuple[int]]:
+    # the path from src to dst with the best AllocatorUnit.score_paths() and its score
+    paths = au.st_path_table[src][dst]
+    scores = au.score_paths(pair.pair_id, paths)
+    i = min(range(len(scores)), key=scores.__getitem__)
+    return scores[i], paths[i]
+
+#----------------------------------------------------------------------------------------
+def scan_node_swaps(au: AllocatorUnit, 
+                    vNode_id: int, 
+                    k: int = 1, 
+                    max_candidates: Optional[int] = 4
+                    ) -> list[tuple[float, int, int, dict[int, tuple[int]]]]:
+    '''
+    Best-improvement scan of the swaps of vNode_id with every other rNode (empty or 
+    temporarily allocated). Return the k best moves (delta of avg # of slots, delta of 
+    # of flows' edges, rNode_id, paths), which is reproduced by 
+    au.swap_delta(vNode_id, rNode_id, paths).
+
+    For each rNode, each pair of the moved vNodes takes the path with the best 
+    AllocatorUnit.score_paths() (crossings and edges of its flow against the current 
+    flows), so that the rNodes are scored by one native FlowSet.score_candidates() 
+    call per moved pair (O(# of rNodes * # of moved pairs) calls, each scoring all 
+    the shortest paths of the pair without the GIL). Only the max_candidates best 
+    rNodes by the sum of those scores (None: all) are evaluated exactly by 
+    AllocatorUnit.swap_delta() in a transaction of au, which costs a slot allocation 
+    (see AllocatorUnit.slot_allocation()) each.
+    '''
+    rNode_id0 = au.vNode_dict[vNode_id].rNode_id
+    candidates = [rNode_id for rNode_id in au.empty_rNode_list 
+                  + list(au.temp_allocated_rNode_dict.keys()) if rNode_id != rNode_id0]
+
+    # batched scores and paths of the candidates
+    scored = list()
+    for rNode_id in candidates:
+        moved = {vNode_id: rNode_id}
+        other = au.temp_allocated_rNode_dict.get(rNode_id)
+        if other is not None:
+            moved[other] = rNode_id0
+        pairs = {pair.pair_id: pair for vid in moved for pair in au.vNode_dict[vid].pair_list}
+        crossings, edges, paths = 0, 0, dict()
+        for pair_id, pair in pairs.items():
+            src = moved.get(pair.src_vNode.vNode_id, pair.src_vNode.rNode_id)
+            dst = moved.get(pair.dst_vNode.vNode_id, pair.dst_vNode.rNode_id)
+            score, paths[pair_id] = _best_path(au, pair, src, dst)
+            crossings += score[0]
+            edges += score[1]
+        scored.append(((crossings, edges), rNode_id, paths))
+    scored.sort(key=lambda item: item[0])
+    if max_candidates is not None:
+        scored = scored[:max_candidates]
+
+    # exact deltas of the best candidates
+    moves = list()
+    for _, rNode_id, paths in scored:
+        au.begin()
+        delta_slots, delta_edges = au.swap_delta(vNode_id, rNode_id, paths)
+        au.rollback()
+        moves.append((delta_slots, delta_edges, rNode_id, paths))
+    moves.sort(key=lambda move: move[:2])
+    return moves[:k]
+
+#----------------------------------------------------------------------------------------
+def scan_flow_paths(au: AllocatorUnit, 
+                    flow_id: int, 
+                    k: int = 1, 
+                    max_candidates: Optional[int] = 4
+                    ) -> list[tuple[float, int, int, tuple[int]]]:
+    '''
+    Best-improvement scan of every other path of every pair of the flow. Return the 
+    k best moves (delta of avg # of slots, delta of # of flows' edges, pair_id, path), 
+    which is reproduced by au.path_delta(pair_id, path).
+
+    All the paths of a pair are scored by AllocatorUnit.score_paths() in one native 
+    FlowSet.score_candidates() call (crossings and edges of the flow, without the GIL), 
+    so that this costs one call per pair. Only the max_candidates best paths of the 
+    flow by those scores (None: all) are evaluated exactly by 
+    AllocatorUnit.path_delta() in a transaction of au, which costs a slot allocation 
+    (see AllocatorUnit.slot_allocation()) each.
+    '''
+    # batched scores of the paths of each pair
+    scored = list()
+    for pair in au.flow_dict[flow_id].pair_list:
+        src = pair.src_vNode.rNode_id
+        dst = pair.dst_vNode.rNode_id
+        paths = [path for path in au.st_path_table[src][dst] if path != pair.path]
+        scored += [(score, pair.pair_id, path) 
+                   for score, path in zip(au.score_paths(pair.pair_id, paths), paths)]
+    scored.sort(key=lambda item: item[0])
+    if max_candidates is not None:
+        scored = scored[:max_candidates]
+
+    # exact deltas of the best candidates
+    moves = list()
+    for _, pair_id, path in scored:
+        au.begin()
+        delta_slots, delta_edges = au.path_delta(pair_id, path)
+        au.rollback()
+        moves.append((delta_slots, delta_edges, pair_id, path))
+    moves.sort(key=lambda move: move[:2])
+    return moves[:k]
+
 #----------------------------------------------------------------------------------------
 def break_and_repair(au: AllocatorUnit, 
                      target_num: int, 
-                     target: str='node'
+                     target: str='node', 
+                     inplace: bool = False
                      ) -> AllocatorUnit:
-    # copy au
-    au = copy.deepcopy(au)
+    # copy au (or modify au itself in a transaction, see AllocatorUnit.begin())
+    if not inplace:
+        au = copy.deepcopy(au)
 
     if target not in ['node', 'pair']:
         raise ValueError("'{}' is invalid.".format(target))
@@ -184,13 +309,17 @@ def break_and_repair(au: AllocatorUnit,
             au.random_pair_allocation(pair.pair_id)
     
     # slot allocation
-    au.greedy_slot_allocation()
+    au.slot_allocation()
     
     return au
 
 #----------------------------------------------------------------------------------------
-def break_a_maximal_clique_and_repair(au: AllocatorUnit) -> AllocatorUnit:
-    au = copy.deepcopy(au)
+def break_a_maximal_clique_and_repair(au: AllocatorUnit, 
+                                      inplace: bool = False
+                                      ) -> AllocatorUnit:
+    # copy au (or modify au itself in a transaction, see AllocatorUnit.begin())
+    if not inplace:
+        au = copy.deepcopy(au)
 
     # find maximal cliques (size >= 2)
     maximals = [c for c in au.find_maximal_cliques_of_slot_graph() if len(c) > 1]
@@ -221,29 +350,13 @@ def break_a_maximal_clique_and_repair(au: AllocatorUnit) -> AllocatorUnit:
     for pair, _ in break_pairs:
         au.pair_deallocation(pair.pair_id)
     
-    # reconstruct selected nodes' flow graphs
-    for cvid in selected:
-        if not Flow.is_encrypted_cvid(cvid):
-            au.flow_dict[cvid].make_flow_graph(None_acceptance=True)
-    
-    print(len(break_pairs))
-    lolololo = 0
     for pair, flow_id in break_pairs:
-        print(lolololo)
-        lolololo += 1
         src = pair.src_vNode.rNode_id
         dst = pair.dst_vNode.rNode_id
-        result = dict()
 
         # calculate score for each path
-        for path in au.st_path_table[src][dst]:
-            au.pair_allocation(pair.pair_id, path)
-            au.flow_dict[flow_id].make_flow_graph(None_acceptance=True)
-            fg = au.flow_dict[flow_id].flow_graph
-            score = len({f.cvid for i, f in au.flow_dict.items()
-                         if (fg.edges & f.flow_graph.edges != set())
-                         and (i != flow_id)})
-            result[path] = (score, fg.number_of_edges())
+        paths = list(au.st_path_table[src][dst])
+        result = dict(zip(paths, au.score_paths(pair.pair_id, paths)))
         
         # select the best path
         best_score = min(result.values(), key=lambda item: item[0])[0]
@@ -254,16 +367,19 @@ def break_a_maximal_clique_and_repair(au: AllocatorUnit) -> AllocatorUnit:
 
         # apply the best path
         au.pair_allocation(pair.pair_id, path)
-        au.flow_dict[flow_id].make_flow_graph(True)
     
     # slot allocation
-    au.greedy_slot_allocation()
+    au.slot_allocation()
     
     return au
 
 #----------------------------------------------------------------------------------------
-def break_and_repair2(au: AllocatorUnit) -> AllocatorUnit:
-    au = copy.deepcopy(au)
+def break_and_repair2(au: AllocatorUnit, 
+                      inplace: bool = False
+                      ) -> AllocatorUnit:
+    # copy au (or modify au itself in a transaction, see AllocatorUnit.begin())
+    if not inplace:
+        au = copy.deepcopy(au)
 
     selected_flow = random.choice([flow for flow in au.flow_dict.values() if flow.allocating])
 
@@ -280,23 +396,13 @@ def break_and_repair2(au: AllocatorUnit) -> AllocatorUnit:
     for pair in pairs:
         au.pair_deallocation(pair.pair_id)
     
-    # reconstruct selected nodes' flow graphs
-    selected_flow.make_flow_graph(None_acceptance=True)
-    
     for pair in pairs:
         src = pair.src_vNode.rNode_id
         dst = pair.dst_vNode.rNode_id
-        result = dict()
 
         # calculate score for each path
-        for path in au.st_path_table[src][dst]:
-            au.pair_allocation(pair.pair_id, path)
-            selected_flow.make_flow_graph(None_acceptance=True)
-            fg = selected_flow.flow_graph
-            score = len({f.cvid for i, f in au.flow_dict.items()
-                         if (fg.edges & f.flow_graph.edges != set())
-                         and (i != selected_flow.flow_id)})
-            result[path] = (score, fg.number_of_edges())
+        paths = list(au.st_path_table[src][dst])
+        result = dict(zip(paths, au.score_paths(pair.pair_id, paths)))
         
         # select the best path
         best_score = min(result.values(), key=lambda item: item[0])[0]
@@ -307,10 +413,9 @@ def break_and_repair2(au: AllocatorUnit) -> AllocatorUnit:
 
         # apply the best path
         au.pair_allocation(pair.pair_id, path)
-        selected_flow.make_flow_graph(True)
     
     # slot allocation
-    au.greedy_slot_allocation()
+    au.slot_allocation()
     
     return au
 
@@ -346,9 +451,9 @@ def initialize_by_avg_slot_assist(au: AllocatorUnit, _ = None) -> AllocatorUnit:
         # calculate score for each path
         for path in au.st_path_table[src][dst]:
             au.pair_allocation(pair.pair_id, path)
-            au.greedy_slot_allocation(True)
+            au.slot_allocation(True)
             score = au.get_avg_slot_num()
-            result[path] = (score, pair.owner.flow_graph.number_of_edges())
+            result[path] = (score, bit_count(pair.owner.edge_bits))
         
         # select the best path
         best_score = min(result.values(), key=lambda item: item[0])[0]
@@ -366,8 +471,12 @@ def initialize_by_avg_slot_assist(au: AllocatorUnit, _ = None) -> AllocatorUnit:
     return au
 
 #----------------------------------------------------------------------------------------
-def break_nodes_and_repair(au: AllocatorUnit) -> AllocatorUnit:
-    au = copy.deepcopy(au)
+def break_nodes_and_repair(au: AllocatorUnit, 
+                           inplace: bool = False
+                           ) -> AllocatorUnit:
+    # copy au (or modify au itself in a transaction, see AllocatorUnit.begin())
+    if not inplace:
+        au = copy.deepcopy(au)
 
     # select vNodes to be broken
     selected_vNodes = random.sample(au.allocating_vNode_list, random.randint(1, len(au.allocating_vNode_list)))
@@ -406,9 +515,9 @@ def break_nodes_and_repair(au: AllocatorUnit) -> AllocatorUnit:
         # calculate score for each path
         for path in au.st_path_table[src][dst]:
             au.pair_allocation(pair.pair_id, path)
-            au.greedy_slot_allocation(True)
+            au.slot_allocation(True)
             score = au.get_avg_slot_num()
-            result[path] = (score, pair.owner.flow_graph.number_of_edges())
+            result[path] = (score, bit_count(pair.owner.edge_bits))
         
         # select the best path
         best_score = min(result.values(), key=lambda item: item[0])[0]
@@ -421,6 +530,72 @@ def break_nodes_and_repair(au: AllocatorUnit) -> AllocatorUnit:
         au.pair_allocation(pair.pair_id, path)
     
     # slot allocation
-    au.greedy_slot_allocation()
+    au.slot_allocation()
+    
+    return au
+
+#----------------------------------------------------------------------------------------
+_pool_au: Optional[AllocatorUnit] = None # au of the workers of multi_start()
+
+#----------------------------------------------------------------------------------------
+def _set_pool_au(au: AllocatorUnit):
+    # au is passed to each worker once instead of with every start
+    global _pool_au
+    _pool_au = au
+
+#----------------------------------------------------------------------------------------
+def _seeded_initializer(initializer: Callable[[AllocatorUnit], AllocatorUnit], 
+                        deadline: Optional[float], 
+                        seed: int) -> Optional[AllocatorUnit]:
+    # the workers of a pool are forked with the same random state, and the starts 
+    # after the deadline are skipped (None)
+    if (deadline is not None) and (time.time() >= deadline):
+        return None
+    random.seed(seed)
+    return initializer(_pool_au)
+
+#----------------------------------------------------------------------------------------
+def multi_start(au: AllocatorUnit, 
+                initializer: Callable[[AllocatorUnit], AllocatorUnit], 
+                start_num: int, 
+                time_slice: float, 
+                process_num: int = 1, 
+                k: int = 1) -> list[AllocatorUnit]:
+    '''
+    Run initializer(au) start_num times (in a pool of process_num processes) while 
+    time_slice seconds have not passed (at least one is finished), and return the k 
+    best solutions by the Evaluator. Solutions with the same rNode_ids are counted 
+    once while there are enough others, so that the top-k is diverse.
+
+    In a pool, the starts after time_slice are skipped by the workers and every 
+    start is waited for, so that the pool is never terminated while it is sending 
+    the remaining starts.
+    '''
+    deadline = time.time() + time_slice
+    solutions: list[AllocatorUnit] = list()
+    if process_num == 1:
+        while (len(solutions) < start_num) \
+              and ((not solutions) or (time.time() < deadline)):
+            solutions.append(initializer(au))
+    else:
+        starts = [(None if i == 0 else deadline, random.getrandbits(64)) 
+                  for i in range(start_num)]
+        with multiprocessing.Pool(process_num, _set_pool_au, (au,)) as pool:
+            solutions = [sol for sol in pool.starmap(partial(_seeded_initializer, 
+                                                             initializer), starts)
+                         if sol is not None]
     
-    return au
\ No newline at end of file
+    # sort by the evaluation (lexicographically, better first)
+    weights = Evaluator.weights()
+    solutions.sort(key=lambda sol: [-w * v for w, v in zip(weights, Evaluator.evaluate(sol))])
+
+    # the best of each placement first
+    placements = set()
+    diverse, others = list(), list()
+    for sol in solutions:
+        if sol.node_zobrist_hash in placements:
+            others.append(sol)
+        else:
+            placements.add(sol.node_zobrist_hash)
+            diverse.append(sol)
+    return (diverse + others)[:k]
\ No newline at end of file
@@ -10,7 +10,8 @@ from allocatorunit import AllocatorUnit
 #----------------------------------------------------------------------------------------
 def sa(au: AllocatorUnit, 
           max_execution_time: float, 
-          enable_log: bool = True) -> AllocatorUnit:
+          enable_log: bool = True, 
+          delta_evaluation: bool = True) -> AllocatorUnit:
     # probability changer
     p_range = 2 # normalization value
 
@@ -29,41 +30,51 @@ def sa(au: AllocatorUnit,
     best = oplib.generate_initial_solution(au)
     best_slot_num = best.get_avg_slot_num()
     best_total_hops = best.get_total_communication_flow_edges()
+    lower_bound = best.slot_lower_bound() # stop when best_slot_num reaches it
 
-    while time.time() - start_time < max_execution_time:
+    while (time.time() - start_time < max_execution_time) \
+          and (best_slot_num > lower_bound):
         loops += 1
 
-        # execute node_swap
-        au = oplib.node_swap(best)
+        # execute node_swap (only the swapped flows are evaluated if delta_evaluation)
+        best.begin()
+        if delta_evaluation:
+            delta_slots, delta_hops = oplib.node_swap_delta(best)
+        else:
+            au = oplib.node_swap(best, inplace=True)
+            delta_slots = au.get_avg_slot_num() - best_slot_num
+            delta_hops = au.get_total_communication_flow_edges() - best_total_hops
 
         # evaluation
-        slot_num = au.get_avg_slot_num()
-        total_hops = au.get_total_communication_flow_edges()
-        if slot_num < best_slot_num:
+        slot_num = best_slot_num + delta_slots
+        total_hops = best_total_hops + delta_hops
+        if delta_slots < 0:
             print("{:>6}th loop: update for slot decrease (slots: {} -> {}, "
                              "hops: {} -> {})".format(loops, best_slot_num, slot_num, 
                                                       best_total_hops, total_hops))
-            best = au
-            best_slot_num = slot_num
+            best.commit()
+            best_slot_num = best.get_avg_slot_num()
             best_total_hops = total_hops
             cnt_slot_change += 1
-        elif (slot_num == best_slot_num) and (total_hops < best_total_hops):
+        elif (delta_slots == 0) and (delta_hops < 0):
             print("{:>6}th loop: update for total hops decrease "
                              "(slots: {} -> {}, hops: {} -> {})"
                              .format(loops, best_slot_num, slot_num, 
                                      best_total_hops, total_hops))
-            best = au
-            best_slot_num = slot_num
+            best.commit()
+            best_slot_num = best.get_avg_slot_num()
             best_total_hops = total_hops
             cnt_total_hops_change += 1
-        elif random.random() < math.exp(-((slot_num - best_slot_num) + abs(total_hops - best_total_hops) * (0.1 ** max(len(str(total_hops)), len(str(best_total_hops)))))/ t):
+        elif random.random() < math.exp(-(delta_slots + abs(delta_hops) * (0.1 ** max(len(str(total_hops)), len(str(best_total_hops)))))/ t):
             print("{:>6}th loop: transition by probability "
                              "(slots: {} -> {}, hops: {} -> {})"
                              .format(loops, best_slot_num, slot_num, 
                                      best_total_hops, total_hops))
-            best = au
-            best_slot_num = slot_num
+            best.commit()
+            best_slot_num = best.get_avg_slot_num()
             best_total_hops = total_hops
+        else:
+            best.rollback()
 
         t = t * 0.99
         if t < 0.000000001:
@@ -74,6 +85,8 @@ def sa(au: AllocatorUnit,
     # logs
     if enable_log:
         print("# of loops: {}".format(loops))
+        print("lower bound of slots: {}{}".format(
+              lower_bound, " (reached)" if best_slot_num <= lower_bound else ""))
         print("# of updates for slot decrease: {}".format(cnt_slot_change))
         print("# of updates for total slot decrease: {}".format(cnt_total_hops_change))
         print("# of slots: {}".format(best.get_max_slot_num()))
@@ -0,0 +1,205 @@
+from __future__ import annotations
+from collections import deque
+from collections.abc import Mapping, Sequence
+from typing import Optional, Iterator
+
+import networkx as nx
+
+#----------------------------------------------------------------------------------------
+class DestinationDAG:
+    '''
+    Shortest-path DAG toward a destination made by BFS from the destination.
+    succ[v] is the list of the next nodes of v on shortest paths and count[v] is
+    the number of shortest paths from v to the destination.
+    '''
+    def __init__(self, topology: nx.DiGraph, dst: int):
+        self.dst = dst
+        self.dist: dict[int, int] = {dst: 0}
+        self.succ: dict[int, tuple[int]] = dict()
+        self.count: dict[int, int] = {dst: 1}
+
+        # BFS on the reversed graph
+        order = [dst]
+        queue = deque([dst])
+        while queue:
+            v = queue.popleft()
+            for u in topology.predecessors(v):
+                if u not in self.dist:
+                    self.dist[u] = self.dist[v] + 1
+                    order.append(u)
+                    queue.append(u)
+
+        # successors and the number of paths (in increasing order of distance)
+        for v in order[1:]:
+            self.succ[v] = tuple(w for w in topology.successors(v)
+                                 if self.dist.get(w) == self.dist[v] - 1)
+            self.count[v] = sum(self.count[w] for w in self.succ[v])
+
+    ##-----------------------------------------------------------------------------------
+    def unrank(self, src: int, rank: int) -> list[int]:
+        # the rank-th path from src in the DFS order of succ
+        path = [src]
+        v = src
+        while v != self.dst:
+            for w in self.succ[v]:
+                if rank < self.count[w]:
+                    v = w
+                    break
+                rank -= self.count[w]
+            path.append(v)
+        return path
+
+    ##-----------------------------------------------------------------------------------
+    def rank(self, path: Iterator[int]) -> int:
+        # inverse of unrank() (ValueError if path is not a shortest path)
+        rank = 0
+        v = None
+        for w in path:
+            if v is not None:
+                try:
+                    succ = self.succ[v]
+                    i = succ.index(w)
+                except (KeyError, ValueError):
+                    raise ValueError("not a shortest path") from None
+                rank += sum(self.count[u] for u in succ[:i])
+            v = w
+        if v != self.dst:
+            raise ValueError("not a shortest path")
+        return rank
+
+#----------------------------------------------------------------------------------------
+class PathList(Sequence):
+    '''
+    Lazy sequence of the shortest paths from src to dst.
+    The paths are made from the DAG on demand, so that len(), indexing and
+    random.choice() cost O(hops). If max_paths is given, only max_paths paths
+    evenly spread over all the shortest paths are contained.
+    '''
+    def __init__(self,
+                 dag: DestinationDAG,
+                 src: int,
+                 multi_ejection: bool,
+                 max_paths: Optional[int] = None):
+        self.dag = dag
+        self.src = src
+        self.multi_ejection = multi_ejection # the last node (dst) is omitted if True
+        self.total = dag.count[src]
+        self.length = self.total if max_paths is None else min(self.total, max_paths)
+
+    ##-----------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return self.length
+
+    ##-----------------------------------------------------------------------------------
+    def __getitem__(self, i: int | slice) -> tuple[int] | tuple[tuple[int]]:
+        if isinstance(i, slice):
+            return tuple(self[j] for j in range(*i.indices(self.length)))
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("path index out of range")
+        path = self.dag.unrank(self.src, i * self.total // self.length)
+        if self.multi_ejection:
+            path.pop()
+        return tuple(path)
+
+    ##-----------------------------------------------------------------------------------
+    def __iter__(self) -> Iterator[tuple[int]]:
+        for i in range(self.length):
+            yield self[i]
+
+    ##-----------------------------------------------------------------------------------
+    def index(self, path: tuple[int]) -> int:
+        if self.multi_ejection:
+            path = path + (self.dag.dst,)
+        if len(path) == 0 or path[0] != self.src:
+            raise ValueError("{} is not in the list".format(path))
+        rank = self.dag.rank(path)
+        i = -(-rank * self.length // self.total)
+        if i * self.total // self.length != rank:
+            raise ValueError("{} is not in the list".format(path))
+        return i
+
+    ##-----------------------------------------------------------------------------------
+    def __contains__(self, path: tuple[int]) -> bool:
+        try:
+            self.index(path)
+        except ValueError:
+            return False
+        return True
+
+#----------------------------------------------------------------------------------------
+class PathRow(Mapping):
+    '''
+    st_path_table[src]: dst |-> PathList
+    '''
+    def __init__(self, table: ShortestPathTable, src: int):
+        self.table = table
+        self.src = src
+
+    ##-----------------------------------------------------------------------------------
+    def __getitem__(self, dst: int) -> PathList:
+        return self.table.paths(self.src, dst)
+
+    ##-----------------------------------------------------------------------------------
+    def __iter__(self) -> Iterator[int]:
+        return (dst for dst in self.table.core_nodes if dst != self.src)
+
+    ##-----------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.table.core_nodes) - 1
+
+#----------------------------------------------------------------------------------------
+class ShortestPathTable(Mapping):
+    '''
+    st_path_table[src][dst] = PathList of the shortest paths from src to dst.
+    The DAG toward each destination is made when it is used first.
+    '''
+    def __init__(self,
+                 topology: nx.DiGraph,
+                 core_nodes: set[int],
+                 max_paths: Optional[int] = None):
+        if (max_paths is not None) and (max_paths < 1):
+            raise ValueError("max_paths must be a natural number.")
+        self.topology = topology
+        self.core_nodes = core_nodes
+        self.max_paths = max_paths
+        self.dags: dict[int, DestinationDAG] = dict()
+        self.path_lists: dict[tuple[int, int], PathList] = dict()
+
+    ##-----------------------------------------------------------------------------------
+    def paths(self, src: int, dst: int) -> PathList:
+        try:
+            return self.path_lists[(src, dst)]
+        except KeyError:
+            pass
+        if (src not in self.core_nodes) or (dst not in self.core_nodes) or (src == dst):
+            raise KeyError((src, dst))
+
+        dag = self.dags.get(dst)
+        if dag is None:
+            dag = DestinationDAG(self.topology, dst)
+            self.dags[dst] = dag
+        if src not in dag.count:
+            raise nx.NetworkXNoPath("No path between {} and {}.".format(src, dst))
+
+        # the last edge of every path is the ejection to dst
+        last_sw = dag.unrank(src, 0)[-2]
+        multi_ejection = self.topology.edges[last_sw, dst].get("multi_ejection", False)
+        path_list = PathList(dag, src, multi_ejection, self.max_paths)
+        self.path_lists[(src, dst)] = path_list
+        return path_list
+
+    ##-----------------------------------------------------------------------------------
+    def __getitem__(self, src: int) -> PathRow:
+        if src not in self.core_nodes:
+            raise KeyError(src)
+        return PathRow(self, src)
+
+    ##-----------------------------------------------------------------------------------
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.core_nodes)
+
+    ##-----------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.core_nodes)
@@ -0,0 +1,80 @@
+import random
+
+import networkx as nx
+
+from board_allocator import BoardAllocator
+from shortest_paths import ShortestPathTable
+
+TOPOLOGY_FILE = 'fic-topo-file-cross.txt'
+
+#----------------------------------------------------------------------------------------
+def all_shortest_paths(topology: nx.DiGraph, src: int, dst: int) -> list[tuple[int]]:
+    # the paths of the eager st_path_table (the last node is omitted by multi_ejection)
+    return [tuple(p[:-1]) if topology.edges[p[-2], p[-1]].get("multi_ejection", False)
+            else tuple(p)
+            for p in nx.all_shortest_paths(topology, src, dst)]
+
+#----------------------------------------------------------------------------------------
+def check_path_list(table: ShortestPathTable, src: int, dst: int,
+                    expected: set[tuple[int]]):
+    path_list = table[src][dst]
+    paths = list(path_list)
+    assert len(paths) == len(path_list) == min(len(expected), table.max_paths or len(expected))
+    assert len(set(paths)) == len(paths) and set(paths) <= expected
+    if table.max_paths is None:
+        assert set(paths) == expected
+
+    # index() is the inverse of indexing
+    for i, path in enumerate(paths):
+        assert path_list.index(path) == i and path in path_list
+        assert path_list[i - len(paths)] == path
+    assert path_list[1:3] == tuple(paths[1:3])
+    for path in expected - set(paths):
+        assert path not in path_list
+    try:
+        path_list[len(paths)]
+    except IndexError:
+        pass
+    else:
+        assert False, "an index out of range is not rejected"
+
+    # the DAG ranks all the shortest paths in the order of unrank()
+    dag = path_list.dag
+    for rank in range(dag.count[src]):
+        assert dag.rank(dag.unrank(src, rank)) == rank
+
+#----------------------------------------------------------------------------------------
+def test_path_lists():
+    # the lazy path lists agree with nx.all_shortest_paths (with and without a cap)
+    for multi_ejection in (False, True):
+        topology = BoardAllocator(TOPOLOGY_FILE, multi_ejection).au.topology
+        core_nodes = {i for i, module in topology.nodes(data="module") if module == "core"}
+        tables = [ShortestPathTable(topology, core_nodes, max_paths)
+                  for max_paths in (None, 1, 3)]
+        for src in core_nodes:
+            for dst in core_nodes - {src}:
+                expected = set(all_shortest_paths(topology, src, dst))
+                assert all(len(path) == len(next(iter(expected))) for path in expected)
+                for table in tables:
+                    check_path_list(table, src, dst, expected)
+
+        # a path that is not a shortest path
+        src, dst = random.Random(0).sample(sorted(core_nodes), 2)
+        path = tables[0][src][dst][0]
+        detour = path[:2] + path # src -> switch -> src -> ...
+        assert detour not in tables[0][src][dst]
+        try:
+            tables[0][src][dst].index(detour)
+        except ValueError:
+            pass
+        else:
+            assert False, "a detour is not rejected"
+
+#----------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            print("===Checking {}===".format(name[len('test_'):]))
+            test()
+            print("Successed!")
+            print()
@@ -21,8 +21,9 @@ class SPEA2(GA):
                  mate_pb:float = 1, 
                  mutation_pb: float = 0.3, 
                  archive_size: int = 40,
-                 offspring_size: Optional[int] = None):
-        super().__init__(seed)
+                 offspring_size: Optional[int] = None, 
+                 slot_strategy: Optional[str] = None):
+        super().__init__(seed, slot_strategy)
         self.toolbox.register("select", tools.selSPEA2)
         self.mate_pb = mate_pb
         self.mutation_pb = mutation_pb
@@ -73,7 +74,8 @@ class SPEA2(GA):
                   for i, eval_name in enumerate(Evaluator.eval_list())}
         self.logbook.record(gen=0, evals=len(invalid_ind), **record)
 
-        while time.time() - start_time < exectution_time:
+        while (time.time() - start_time < exectution_time) \
+              and not self.reached_lower_bound(pop):
             # uppdate generation number
             gen += 1
 
@@ -1,6 +1,28 @@
 from cpp_modules import crossing_flows, crossings_for_a_flow, slot_allocation
+from cpp_modules import FlowSet, exact_slot_allocation
+from cpp_modules import crossing_flows_csr, crossings_for_a_flow_csr, slot_allocation_csr
+
+import copy
+import pickle
+import random
+import sys
+import threading
+import itertools
+import time
 
 import networkx as nx
+import numpy as np
+
+failures = 0
+def check(result, correct):
+    global failures
+    if (result == correct):
+        print("Successed!")
+    else:
+        failures += 1
+        print("Failed.")
+        print("result: {}, correct: {}".format(result, correct))
+    print()
 
 flows = [(0, {(0, 1), (0, 2)}), (1, {(0, 1), (1, 2)}), (2, {(1, 2)}), (3, {(0, 1)}), (0, {(1, 2)}), (4, {(3, 4)})]
 
@@ -44,4 +66,264 @@ if (result == correct):
 else:
     print("Failed.")
     print("result: {}, correct: {}".format(result, correct))
-print()
\ No newline at end of file
+print()
+
+print("===Checking crossing functions on random flows===")
+# the edge->flows index against brute force (cvids may be shared by several flows)
+random.seed(1)
+def random_flows(flow_num, edge_num, cvid_num):
+    return [(random.randrange(cvid_num), 
+             {(random.randrange(edge_num), random.randrange(edge_num)) 
+              for _ in range(random.randrange(1, 6))}) 
+            for _ in range(flow_num)]
+def brute_crossing_flows(flows):
+    return {(fi[0], fj[0]) for i, fi in enumerate(flows) for fj in flows[i + 1:] 
+            if fi[1] & fj[1]}
+def brute_crossings_for_a_flow(target, flows):
+    return len({f[0] for f in flows if f[0] != target[0] and f[1] & target[1]})
+def valid_coloring(coloring, cvids, crossings):
+    # every cvid is colored and crossing cvids have different colors
+    return set(coloring) == set(cvids) \
+           and all(coloring[c0] != coloring[c1] for c0, c1 in crossings if c0 != c1)
+result, correct = list(), list()
+for _ in range(200):
+    flows = random_flows(random.randrange(1, 40), 8, 30)
+    crossings = crossing_flows(flows)
+    coloring = slot_allocation(flows)
+    graph = nx.Graph()
+    graph.add_nodes_from(f[0] for f in flows)
+    graph.add_edges_from((c0, c1) for c0, c1 in crossings if c0 != c1)
+    result.append((crossings, 
+                   [crossings_for_a_flow(f, flows) for f in flows], 
+                   valid_coloring(coloring, [f[0] for f in flows], crossings), 
+                   len(set(coloring.values()))))
+    correct.append((brute_crossing_flows(flows), 
+                    [brute_crossings_for_a_flow(f, flows) for f in flows], 
+                    True, 
+                    len(set(nx.coloring.greedy_color(graph, 'largest_first').values()))))
+check(result, correct)
+
+print("===Checking slot allocation strategies===")
+# every strategy gives a valid coloring (on the flows and on a FlowSet of them)
+strategies = ['welsh_powell', 'dsatur', 'rlf', 'random']
+result, correct = list(), list()
+for _ in range(100):
+    flows = random_flows(random.randrange(1, 40), 8, 30)
+    crossings = crossing_flows(flows)
+    flow_set = FlowSet()
+    for flow_id, (cvid, edges) in enumerate(flows):
+        flow_set.update(flow_id, cvid, [u * 8 + v for u, v in edges])
+    for strategy in strategies:
+        seed = random.getrandbits(32)
+        for coloring in (slot_allocation(flows, strategy, seed=seed), 
+                         flow_set.slot_allocation(strategy, seed=seed)):
+            result.append((strategy, valid_coloring(coloring, [f[0] for f in flows], 
+                                                    crossings)))
+            correct.append((strategy, True))
+check(result, correct)
+
+print("===Checking CSR variants===")
+# the CSR buffers of random flows against the tuple functions
+def to_csr(flows):
+    edge2id = dict()
+    edge_lists = [[edge2id.setdefault(e, len(edge2id)) for e in edges] for _, edges in flows]
+    offsets = np.zeros(len(flows) + 1, dtype=np.int32)
+    np.cumsum([len(edges) for edges in edge_lists], out=offsets[1:])
+    return (np.array([cvid for cvid, _ in flows], dtype=np.int32), offsets, 
+            np.array([e for edges in edge_lists for e in edges], dtype=np.int32), 
+            edge_lists)
+result, correct = list(), list()
+for _ in range(100):
+    flows = random_flows(random.randrange(1, 40), 8, 30)
+    cvids, offsets, edge_ids, edge_lists = to_csr(flows)
+    crossings = crossing_flows(flows)
+    slots = slot_allocation_csr(cvids, offsets, edge_ids, 'dsatur')
+    result.append(({tuple(c) for c in crossing_flows_csr(cvids, offsets, edge_ids).tolist()}, 
+                   [crossings_for_a_flow_csr(cvid, np.array(edges, dtype=np.int32), 
+                                             cvids, offsets, edge_ids) 
+                    for cvid, edges in zip(cvids.tolist(), edge_lists)], 
+                   slots.dtype, 
+                   valid_coloring(dict(zip(cvids.tolist(), slots.tolist())), 
+                                  cvids.tolist(), crossings), 
+                   slots.tolist() == [slot_allocation(flows, 'dsatur')[cvid] 
+                                      for cvid in cvids.tolist()]))
+    correct.append((crossings, 
+                    [crossings_for_a_flow(f, flows) for f in flows], 
+                    np.int32, 
+                    True, 
+                    True))
+check(result, correct)
+
+print("===Checking CSR argument errors===")
+cvids, offsets, edge_ids, _ = to_csr([(0, {(0, 1)}), (1, {(0, 1), (1, 2)})])
+result = list()
+for args in [(cvids.astype(np.int64), offsets, edge_ids), 
+             (cvids, offsets[:-1], edge_ids), 
+             (cvids, offsets[::-1].copy(), edge_ids)]:
+    try:
+        crossing_flows_csr(*args)
+    except (TypeError, ValueError) as e:
+        result.append(type(e))
+    else:
+        result.append(None)
+correct = [TypeError, ValueError, ValueError]
+check(result, correct)
+
+print("===Checking FlowSet===")
+# random updates and removals against the brute-force conflict graph
+random.seed(0)
+flow_set = FlowSet()
+flow_edges = dict() # flow_id |-> (cvid, edge ids)
+order = list() # flow_ids in the order they were added first
+for step in range(2000):
+    flow_id = random.randrange(30)
+    if (flow_id in flow_edges) and (random.random() < 0.2):
+        flow_set.remove(flow_id)
+        del flow_edges[flow_id]
+        order.remove(flow_id)
+        continue
+    cvid = flow_id if random.random() < 0.8 else -random.randrange(1, 4)
+    edges = [random.randrange(40) for _ in range(random.randrange(6))]
+    flow_set.update(flow_id, cvid, edges)
+    if flow_id not in flow_edges:
+        order.append(flow_id)
+    flow_edges[flow_id] = (cvid, set(edges))
+
+def brute_neighbors(flow_id):
+    return {f for f, (_, edges) in flow_edges.items() 
+            if f != flow_id and edges & flow_edges[flow_id][1]}
+result = (len(flow_set), 
+          all(flow_id in flow_set for flow_id in flow_edges), 
+          {flow_id: set(flow_set.neighbors(flow_id)) for flow_id in flow_edges}, 
+          {flow_id: flow_set.crossings_for_a_flow(flow_id) for flow_id in flow_edges}, 
+          flow_set.crossing_flows())
+correct = (len(flow_edges), 
+           True, 
+           {flow_id: brute_neighbors(flow_id) for flow_id in flow_edges}, 
+           {flow_id: len({flow_edges[f][0] for f in brute_neighbors(flow_id)}) 
+            for flow_id in flow_edges}, 
+           {(flow_edges[f][0], flow_edges[g][0]) for i, f in enumerate(order) 
+            for g in order[i + 1:] if flow_edges[f][1] & flow_edges[g][1]})
+check(result, correct)
+
+print("===Checking FlowSet copy and pickle===")
+state = lambda fs: ({flow_id: sorted(fs.neighbors(flow_id)) for flow_id in flow_edges}, 
+                    fs.crossing_flows())
+correct = state(flow_set)
+copied = copy.deepcopy(flow_set)
+loaded = pickle.loads(pickle.dumps(flow_set))
+flow_set.update(order[0], 0, range(40)) # the copies are independent of the original
+flow_edges[order[0]] = (0, set(range(40)))
+result = (state(copied), state(loaded))
+correct = (correct, correct)
+check(result, correct)
+
+print("===Checking FlowSet score_candidates===")
+# the scores against brute force (with the registered edges and with given base edges)
+def brute_score(flow_id, base, candidate):
+    edges = set(base) | set(candidate)
+    return (len({cvid for f, (cvid, other) in flow_edges.items() 
+                 if f != flow_id and other & edges}), len(edges))
+result, correct = list(), list()
+for flow_id in flow_edges:
+    candidates = [[random.randrange(40) for _ in range(random.randrange(6))] 
+                  for _ in range(5)]
+    base = [random.randrange(40) for _ in range(3)]
+    result.append((flow_set.score_candidates(flow_id, candidates), 
+                   flow_set.score_candidates(flow_id, candidates, base)))
+    correct.append(([brute_score(flow_id, flow_edges[flow_id][1], c) for c in candidates], 
+                    [brute_score(flow_id, base, c) for c in candidates]))
+check(result, correct)
+
+print("===Checking FlowSet score_candidates of a missing flow===")
+missing = max(flow_edges) + 1
+try:
+    flow_set.score_candidates(missing, [[0]])
+except KeyError as e:
+    result = e.args
+else:
+    result = None
+correct = (missing,)
+check(result, correct)
+
+print("===Checking FlowSet score_candidates in threads===")
+# scoring without the GIL while the flows are removed and added again
+errors = list()
+def score_repeatedly():
+    candidates = [list(range(k, k + 5)) for k in range(30)]
+    for _ in range(300):
+        for flow_id in range(30):
+            try:
+                scores = flow_set.score_candidates(flow_id, candidates)
+            except KeyError:
+                continue
+            if len(scores) != len(candidates):
+                errors.append(scores)
+threads = [threading.Thread(target=score_repeatedly) for _ in range(4)]
+for thread in threads:
+    thread.start()
+for _ in range(3000):
+    flow_id = random.randrange(30)
+    if flow_id in flow_set:
+        flow_set.remove(flow_id)
+    else:
+        flow_set.update(flow_id, flow_id, [random.randrange(40) for _ in range(4)])
+for thread in threads:
+    thread.join()
+result = errors
+correct = []
+check(result, correct)
+
+print("===Checking exact slot allocation===")
+# optimal and proven on small graphs (against the chromatic number by brute force)
+def graph_flows(graph):
+    # a flow for each vertex, which shares an edge with the flows of its neighbours
+    return [(v, {(min(v, w), max(v, w)) for w in graph[v]} | {(v, -1)}) for v in graph]
+def chromatic_number(graph):
+    for k in range(1, len(graph) + 1):
+        for colors in itertools.product(range(k), repeat=len(graph)):
+            coloring = dict(zip(graph, colors))
+            if all(coloring[v] != coloring[w] for v, w in graph.edges):
+                return k
+def mycielski(k):
+    # triangle-free graph whose chromatic number is k
+    return nx.convert_node_labels_to_integers(nx.mycielski_graph(k))
+result, correct = list(), list()
+graphs = [(graph, chromatic_number(graph)) 
+          for graph in (nx.gnp_random_graph(random.randrange(1, 8), random.random(), seed=i) 
+                        for i in range(40))] + [(mycielski(4), 4)]
+for graph, colors in graphs:
+    flows = graph_flows(graph)
+    for coloring, proven, lower_bound in (exact_slot_allocation(flows), 
+                                          exact_slot_allocation(flows, 10.0, 10 ** 6)):
+        result.append((valid_coloring(coloring, list(graph), graph.edges), proven, 
+                       len(set(coloring.values())), lower_bound <= len(set(coloring.values()))))
+        correct.append((True, True, colors, True))
+check(result, correct)
+
+print("===Checking exact slot allocation of a FlowSet===")
+graph = mycielski(4)
+flow_set = FlowSet()
+for cvid, edges in graph_flows(graph):
+    flow_set.update(cvid, cvid, [(u + 1) * 100 + v for u, v in edges])
+coloring, proven, lower_bound = flow_set.exact_slot_allocation()
+result = (valid_coloring(coloring, list(graph), graph.edges), proven, 
+          len(set(coloring.values())), lower_bound)
+correct = (True, True, 4, 2)
+check(result, correct)
+
+print("===Checking exact slot allocation budgets===")
+# the best coloring found is returned (not proven) when the budget runs out
+flows = graph_flows(mycielski(5))
+coloring, proven, lower_bound = exact_slot_allocation(flows, node_limit=1)
+result = [(valid_coloring(coloring, [f[0] for f in flows], crossing_flows(flows)), proven)]
+flows = graph_flows(nx.gnp_random_graph(150, 0.5, seed=0))
+start = time.time()
+coloring, proven, lower_bound = exact_slot_allocation(flows, time_limit=0.2)
+result.append((valid_coloring(coloring, [f[0] for f in flows], crossing_flows(flows)), 
+               proven, time.time() - start < 2.0))
+correct = [(True, False), (True, False, True)]
+check(result, correct)
+
+if failures:
+    sys.exit(1)